@@ -1,35 +1,156 @@
 import os
-import threading
-from flask import Flask, render_template, request, redirect, url_for, send_from_directory, session, jsonify
+import shutil
+from flask import Flask, Response, abort, render_template, request, redirect, url_for, send_from_directory, session, jsonify
 from werkzeug.utils import secure_filename
-import pandas as pd
 from markupsafe import Markup,escape
 
 
 # Import your genetic algorithm timetable generation function
-from timetable_generator import generate_timetables
+from timetable_generator import generate_timetables, timetable_grid
+from checkpoint import CHECKPOINT_FILE, SCHEDULE_FILE
+from events import format_sse
+from ga import NUM_GENERATIONS, STAGNATION_GENERATIONS
+from export import WORKBOOK_FILES
+from jobs import JobManager
+from metrics import METRICS_FILE, PROFILE_FILE
+from results_store import RESULTS_FILENAME, RenderCache, ResultStore
+from rooms import RoomInventory
+from timegrid import TimeGrid
+from ingest import read_inputs
+from solvers import SOLVERS
 
 app = Flask(__name__)
 app.secret_key = 'your_secret_key'  # Replace with a secure secret key
 
-# Configure upload and output folders
-UPLOAD_FOLDER = 'uploads'
-OUTPUT_FOLDER = 'outputs'
+# Configure job and cache folders. Every job gets its own uploads/ and
+# outputs/ under JOBS_FOLDER, so concurrent submissions never share files.
+JOBS_FOLDER = 'jobs'
+CACHE_FOLDER = 'cache'  # compiled problems, keyed by the uploaded files' contents
 ALLOWED_EXTENSIONS = {'csv'}
+MAX_CONCURRENT_JOBS = 2
+EVENT_INTERVAL = 0.25  # seconds between convergence updates pushed to the progress page
 
-app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
-app.config['OUTPUT_FOLDER'] = OUTPUT_FOLDER
+app.config['JOBS_FOLDER'] = JOBS_FOLDER
+app.config['CACHE_FOLDER'] = CACHE_FOLDER
+app.config['EVENT_INTERVAL'] = EVENT_INTERVAL
 
-# Ensure the upload and output directories exist
-os.makedirs(UPLOAD_FOLDER, exist_ok=True)
-os.makedirs(OUTPUT_FOLDER, exist_ok=True)
-
-# Global variable to store progress
-progress = {'status': 'idle', 'message': 'Waiting to start...', 'percentage': 0}
+# Map timetable types to their Excel exports and display names
+TIMETABLE_TYPES = {
+    'batch': (WORKBOOK_FILES['batch'], 'Batch Timetables'),
+    'instructor': (WORKBOOK_FILES['instructor'], 'Instructor Timetables'),
+    'student': (WORKBOOK_FILES['student'], 'Student Timetables'),
+}
 
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
+ROOMS_UPLOAD = 'rooms.csv'  # optional room list of a job
+TIME_GRID_UPLOAD = 'time_grid.json'  # optional time-grid config of a job
+
+def run_timetable_generation(job):
+    # Runs on a job worker thread; JobManager records the final status. GA
+    # jobs checkpoint into their folder, which is what resuming them uses.
+    # Profiled jobs leave profile.pstats (and a text summary) there as well.
+    warm_start = os.path.join(job.upload_folder, SCHEDULE_FILE)
+    rooms_path = os.path.join(job.upload_folder, ROOMS_UPLOAD)
+    time_grid_path = os.path.join(job.upload_folder, TIME_GRID_UPLOAD)
+    generate_timetables(
+        os.path.join(job.upload_folder, 'instructors_courses.csv'),
+        os.path.join(job.upload_folder, 'backlog.csv'),
+        os.path.join(job.upload_folder, 'elective.csv'),
+        job.output_folder,
+        job.progress,
+        solver=job.options['solver'],
+        cache_folder=app.config['CACHE_FOLDER'],
+        cancel_event=job.cancel_event,
+        events=job.events,
+        warm_start=warm_start if os.path.exists(warm_start) else None,
+        checkpoint_path=os.path.join(job.folder, CHECKPOINT_FILE),
+        resume=job.options.get('resume', False),
+        time_limit=job.options.get('time_limit'),
+        ga_options=job.options.get('ga_options'),
+        metrics=job.metrics,
+        profile_path=os.path.join(job.folder, PROFILE_FILE) if job.options.get('profile') else None,
+        reschedule=job.options.get('reschedule', False),
+        blackouts=job.options.get('blackouts'),
+        room_allocation=job.options.get('room_allocation', False),
+        rooms_path=rooms_path if os.path.exists(rooms_path) else None,
+        time_grid_path=time_grid_path if os.path.exists(time_grid_path) else None
+    )
+
+# Rendered timetable tables, dropped together with their job
+rendered_tables = RenderCache()
+
+jobs = JobManager(app.config['JOBS_FOLDER'], run_timetable_generation, max_workers=MAX_CONCURRENT_JOBS,
+                  event_interval=app.config['EVENT_INTERVAL'],
+                  on_remove=lambda job: rendered_tables.invalidate(job.id))
+
+def get_job(job_id):
+    job = jobs.get(job_id)
+    if job is None:
+        abort(404)
+    return job
+
+def get_result_store(job):
+    path = os.path.join(job.output_folder, RESULTS_FILENAME)
+    return ResultStore(path) if os.path.exists(path) else None
+
+def get_completed_job(job_id):
+    job = get_job(job_id)
+    if job.progress['status'] != 'completed':
+        return None
+    return job
+
+def warm_start_jobs():
+    # Completed jobs whose schedule can seed a new run
+    return [job for job in jobs.list() if job.progress['status'] == 'completed'
+            and os.path.exists(os.path.join(job.output_folder, SCHEDULE_FILE))]
+
+def _form_number(name, convert, minimum):
+    # Optional positive number field: None when left blank
+    value = request.form.get(name, '').strip()
+    if not value:
+        return None
+    try:
+        number = convert(value)
+    except ValueError:
+        number = None
+    if number is None or number < minimum:
+        raise ValueError(f"{name.replace('_', ' ').capitalize()} must be a number of at least {minimum}.")
+    return number
+
+def run_configuration():
+    # (time limit, GA options) from the upload form; blank fields keep the
+    # solver defaults. Raises ValueError with a message for the form.
+    time_limit = _form_number('time_limit', float, 1)
+    ga_options = {
+        'population_size': _form_number('population_size', int, 10),
+        'num_generations': _form_number('num_generations', int, 1),
+        'stagnation_generations': _form_number('stagnation_generations', int, 0),
+    }
+    ga_options = {name: value for name, value in ga_options.items() if value is not None}
+    ga_options['adaptive'] = 'adaptive' in request.form
+    return time_limit, ga_options
+
+def parse_blackouts(text):
+    # 'Instructor; Day; Time' per line -> [[instructor, day, time], ...];
+    # raises ValueError naming the first malformed line
+    blackouts = []
+    for number, line in enumerate(text.splitlines(), 1):
+        if not line.strip():
+            continue
+        parts = [part.strip() for part in line.split(';')]
+        if len(parts) != 3 or not all(parts):
+            raise ValueError(f"Blackout line {number} must read 'Instructor; Day; Time'.")
+        blackouts.append(parts)
+    return blackouts
+
+def render_index(**context):
+    return render_template('index.html', solvers=SOLVERS, warm_start_jobs=warm_start_jobs(),
+                           selected_warm_start=request.values.get('warm_start_job', ''),
+                           ga_defaults={'num_generations': NUM_GENERATIONS,
+                                        'stagnation_generations': STAGNATION_GENERATIONS}, **context)
+
 @app.route('/', methods=['GET', 'POST'])
 def index():
     if request.method == 'POST':
@@ -42,101 +163,190 @@ def index():
 
         missing_files = [name for name, file in files.items() if file is None or file.filename == '']
         if missing_files:
-            return render_template('index.html', error=f"Missing files: {', '.join(missing_files)}")
-
-        # Save the uploaded files
+            return render_index(error=f"Missing files: {', '.join(missing_files)}")
+
+        solver = request.form.get('solver', 'ga')
+        if solver not in SOLVERS:
+            return render_index(error=f"Unknown solver: {solver}")
+
+        invalid_files = [name for name, file in files.items() if not allowed_file(file.filename)]
+        if invalid_files:
+            return render_index(error=f"Invalid file type for {invalid_files[0]}. Only CSV files are allowed.")
+
+        # Optional warm start: the best schedule of an earlier job
+        warm_start_job = None
+        if request.form.get('warm_start_job'):
+            warm_start_job = jobs.get(request.form['warm_start_job'])
+            if warm_start_job not in warm_start_jobs():
+                return render_index(error="The selected job has no schedule to start from.")
+
+        try:
+            time_limit, ga_options = run_configuration()
+            blackouts = parse_blackouts(request.form.get('blackouts', ''))
+        except ValueError as e:
+            return render_index(error=str(e))
+
+        # Optional room list; uploading one turns on room allocation
+        rooms_file = request.files.get('rooms')
+        if rooms_file is not None and rooms_file.filename:
+            if not allowed_file(rooms_file.filename):
+                return render_index(error="Invalid file type for rooms. Only CSV files are allowed.")
+            try:
+                RoomInventory.from_csv(rooms_file.stream)
+            except ValueError as e:
+                return render_index(error=f"Invalid room list: {e}")
+            rooms_file.stream.seek(0)
+        else:
+            rooms_file = None
+        room_allocation = 'room_allocation' in request.form or rooms_file is not None
+
+        # Optional time-grid config (days, periods, breaks, ...) instead of the MIIT week
+        time_grid_file = request.files.get('time_grid')
+        if time_grid_file is not None and time_grid_file.filename:
+            if not time_grid_file.filename.lower().endswith('.json'):
+                return render_index(error="Invalid file type for the time grid. Only JSON files are allowed.")
+            try:
+                grid = TimeGrid.loads(time_grid_file.stream.read().decode('utf-8'))
+            except ValueError as e:
+                return render_index(error=f"Invalid time grid: {e}")
+            time_grid_file.stream.seek(0)
+        else:
+            time_grid_file = None
+            grid = TimeGrid.from_config()
+
+        # Rescheduling keeps the earlier timetable and only moves what changed
+        reschedule = 'reschedule' in request.form
+        if reschedule and warm_start_job is None:
+            return render_index(error="Rescheduling needs an earlier timetable to start from.")
+        if blackouts and not reschedule:
+            return render_index(error="Instructor blackouts are only applied when rescheduling.")
+
+        # Validate the CSVs before a job is queued: errors send the form back
+        # with the report, warnings go ahead. "Check files" only shows the report.
+        _, report = read_inputs(files['instructors_courses'].stream, files['backlog'].stream,
+                                files['elective'].stream, grid)
+        for file in files.values():
+            file.stream.seek(0)
+        if not report.ok:
+            return render_index(error="The input files have errors; see the report below.", report=report.to_dict())
+        if request.form.get('action') == 'validate':
+            return render_index(report=report.to_dict())
+
+        # Save the uploaded files into a fresh job and queue it
+        job = jobs.create(solver=solver, warm_start_job=warm_start_job and warm_start_job.id,
+                          time_limit=time_limit, ga_options=ga_options, profile='profile' in request.form,
+                          reschedule=reschedule, blackouts=blackouts, room_allocation=room_allocation)
         for name, file in files.items():
-            if file and allowed_file(file.filename):
-                filename = secure_filename(name + '.csv')
-                filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-                file.save(filepath)
-            else:
-                return render_template('index.html', error=f"Invalid file type for {name}. Only CSV files are allowed.")
-
-        # Start the timetable generation in a separate thread
-        thread = threading.Thread(target=run_timetable_generation)
-        thread.start()
-
-        return redirect(url_for('progress_page'))
-
-    return render_template('index.html')
-
-def run_timetable_generation():
-    global progress
-    progress['status'] = 'running'
-    progress['message'] = 'Starting timetable generation...'
-    progress['percentage'] = 0
-
-    try:
-        # Pass the file paths to your timetable generation function
-        instructors_courses_path = os.path.join(app.config['UPLOAD_FOLDER'], 'instructors_courses.csv')
-        backlog_path = os.path.join(app.config['UPLOAD_FOLDER'], 'backlog.csv')
-        elective_path = os.path.join(app.config['UPLOAD_FOLDER'], 'elective.csv')
-
-        generate_timetables(
-            instructors_courses_path,
-            backlog_path,
-            elective_path,
-            app.config['OUTPUT_FOLDER'],
-            progress
-        )
-
-        progress['status'] = 'completed'
-        progress['message'] = 'Timetable generation completed.'
-        progress['percentage'] = 100
-    except Exception as e:
-        progress['status'] = 'error'
-        progress['message'] = f"An error occurred: {str(e)}"
-        progress['percentage'] = 0
-
-@app.route('/progress')
-def progress_page():
-    return render_template('progress.html')
-
-@app.route('/progress_status')
-def progress_status():
-    return jsonify(progress)
-
-@app.route('/timetables')
-def timetables():
-    if progress.get('status') != 'completed':
-        return redirect(url_for('index'))
-
-    # Map timetable types to filenames
-    timetable_files = {
-        'Batch Timetables': 'Batch_Timetables.xlsx',
-        'Instructor Timetables': 'Instructor_Timetables.xlsx',
-        'Student Timetables': 'Elective_Backlog_Timetables.xlsx'
-    }
-
-    return render_template('timetables.html', timetable_files=timetable_files)
-
-@app.route('/view_timetables/<timetable_type>')
-def view_timetables(timetable_type):
-    # Map timetable type to filename and display name
-    if timetable_type == 'batch':
-        filename = 'Batch_Timetables.xlsx'
-        display_name = 'Batch Timetables'
-    elif timetable_type == 'instructor':
-        filename = 'Instructor_Timetables.xlsx'
-        display_name = 'Instructor Timetables'
-    elif timetable_type == 'student':
-        filename = 'Elective_Backlog_Timetables.xlsx'
-        display_name = 'Student Timetables'
-    else:
-        return redirect(url_for('timetables'))
-
-    filepath = os.path.join(app.config['OUTPUT_FOLDER'], filename)
-    if not os.path.exists(filepath):
-        return redirect(url_for('timetables'))
-
-    # Read Excel file sheets
-    timetables = pd.read_excel(filepath, sheet_name=None)
-
-    # Get list of timetable names (sheet names)
-    timetable_names = sorted(timetables.keys())
-
-    return render_template('view_timetables.html', timetable_type=timetable_type, display_name=display_name, timetable_names=timetable_names)
+            filename = secure_filename(name + '.csv')
+            file.save(os.path.join(job.upload_folder, filename))
+        if rooms_file is not None:
+            rooms_file.save(os.path.join(job.upload_folder, ROOMS_UPLOAD))
+        if time_grid_file is not None:
+            time_grid_file.save(os.path.join(job.upload_folder, TIME_GRID_UPLOAD))
+        if warm_start_job is not None:
+            # Copied, so the new job does not depend on the old one being kept
+            shutil.copy(os.path.join(warm_start_job.output_folder, SCHEDULE_FILE), job.upload_folder)
+        jobs.start(job)
+
+        return redirect(url_for('progress_page', job_id=job.id))
+
+    return render_index()
+
+@app.route('/jobs')
+def list_jobs():
+    return render_template('jobs.html', jobs=jobs.list(), solvers=SOLVERS)
+
+@app.route('/jobs/<job_id>')
+def progress_page(job_id):
+    job = get_job(job_id)
+    return render_template('progress.html', job_id=job.id)
+
+@app.route('/jobs/<job_id>/progress')
+def progress_status(job_id):
+    return jsonify(get_job(job_id).progress)
+
+@app.route('/jobs/<job_id>/metrics')
+def job_metrics(job_id):
+    # Span timings and counters: live while the job runs, afterwards as
+    # written next to its outputs (jobs restored after a restart only have
+    # the file)
+    job = get_job(job_id)
+    path = os.path.join(job.output_folder, METRICS_FILE)
+    if job.done and os.path.exists(path):
+        return send_from_directory(job.output_folder, METRICS_FILE, mimetype='application/json')
+    return jsonify(job.metrics.snapshot())
+
+@app.route('/jobs/<job_id>/events')
+def job_events(job_id):
+    # Server-Sent Events: the job's convergence records ('generation', with
+    # ids so a reconnecting browser resumes where it left off) and a
+    # 'progress' event whenever the progress record changes. Ends with the job.
+    job = get_job(job_id)
+    start = request.headers.get('Last-Event-ID', type=int)
+    index = 0 if start is None else start + 1
+    interval = app.config['EVENT_INTERVAL']
+
+    def stream():
+        nonlocal index
+        last_progress = None
+        while True:
+            events, index, closed = job.events.wait(index, timeout=interval)
+            for event_id, kind, data in events:
+                yield format_sse(kind, data, event_id)
+            progress = dict(job.progress)
+            if progress != last_progress:
+                yield format_sse('progress', progress)
+                last_progress = progress
+            if closed:
+                break
+
+    return Response(stream(), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@app.route('/jobs/<job_id>/cancel', methods=['POST'])
+def cancel_job(job_id):
+    job = jobs.cancel(job_id)
+    if job is None:
+        abort(404)
+    return jsonify(job.progress)
+
+@app.route('/jobs/<job_id>/resume', methods=['POST'])
+def resume_job(job_id):
+    # Rerun a cancelled, failed or interrupted job from its last checkpoint
+    job = jobs.resume(job_id)
+    if job is None:
+        abort(404)
+    if job.done:
+        abort(409)
+    return redirect(url_for('progress_page', job_id=job.id))
+
+@app.route('/jobs/<job_id>/timetables')
+def timetables(job_id):
+    job = get_completed_job(job_id)
+    if job is None:
+        return redirect(url_for('progress_page', job_id=job_id))
+
+    timetable_files = {display_name: filename for filename, display_name in TIMETABLE_TYPES.values()}
+
+    return render_template('timetables.html', job_id=job.id, timetable_files=timetable_files)
+
+@app.route('/jobs/<job_id>/view_timetables/<timetable_type>')
+def view_timetables(job_id, timetable_type):
+    job = get_completed_job(job_id)
+    if job is None:
+        return redirect(url_for('progress_page', job_id=job_id))
+    if timetable_type not in TIMETABLE_TYPES:
+        return redirect(url_for('timetables', job_id=job.id))
+    _, display_name = TIMETABLE_TYPES[timetable_type]
+
+    store = get_result_store(job)
+    if store is None:
+        return redirect(url_for('timetables', job_id=job.id))
+
+    # Get list of timetable names from the result index
+    timetable_names = store.names(timetable_type)
+
+    return render_template('view_timetables.html', job_id=job.id, timetable_type=timetable_type, display_name=display_name, timetable_names=timetable_names)
 
 
 def style_table(df):
@@ -164,48 +374,47 @@ def style_table(df):
 
     return html
 
-@app.route('/show_timetable/<timetable_type>/<timetable_name>')
-def show_timetable(timetable_type, timetable_name):
-    # Map timetable type to filename and display name
-    if timetable_type == 'batch':
-        filename = 'Batch_Timetables.xlsx'
-        display_name = 'Batch Timetables'
-    elif timetable_type == 'instructor':
-        filename = 'Instructor_Timetables.xlsx'
-        display_name = 'Instructor Timetables'
-    elif timetable_type == 'student':
-        filename = 'Elective_Backlog_Timetables.xlsx'
-        display_name = 'Student Timetables'
-    else:
-        return redirect(url_for('timetables'))
-
-    filepath = os.path.join(app.config['OUTPUT_FOLDER'], filename)
-    if not os.path.exists(filepath):
-        return redirect(url_for('timetables'))
-
-    # Read the specific sheet (timetable) from the Excel file
-    try:
-        timetable_df = pd.read_excel(filepath, sheet_name=timetable_name, index_col=0)
-    except ValueError:
-        return redirect(url_for('view_timetables', timetable_type=timetable_type))
-
-    # Replace '\n' with '<br>' in the DataFrame
-    timetable_df = timetable_df.applymap(lambda x: x.replace('\n', '<br>') if isinstance(x, str) else x)
-
-    # Apply styling to the DataFrame
-    timetable_html = style_table(timetable_df)
+@app.route('/jobs/<job_id>/show_timetable/<timetable_type>/<path:timetable_name>')
+def show_timetable(job_id, timetable_type, timetable_name):
+    job = get_completed_job(job_id)
+    if job is None:
+        return redirect(url_for('progress_page', job_id=job_id))
+    if timetable_type not in TIMETABLE_TYPES:
+        return redirect(url_for('timetables', job_id=job.id))
+    _, display_name = TIMETABLE_TYPES[timetable_type]
+
+    timetable_html = rendered_tables.get((job.id, timetable_type, timetable_name))
+    if timetable_html is None:
+        store = get_result_store(job)
+        if store is None:
+            return redirect(url_for('timetables', job_id=job.id))
+        entries = store.entries(timetable_type, timetable_name)
+        if entries is None:
+            return redirect(url_for('view_timetables', job_id=job.id, timetable_type=timetable_type))
+        timetable_df = timetable_grid(entries, *store.grid_parameters())
+
+        # Replace '\n' with '<br>' in the DataFrame
+        timetable_df = timetable_df.map(lambda x: x.replace('\n', '<br>') if isinstance(x, str) else x)
+
+        # Apply styling to the DataFrame
+        timetable_html = style_table(timetable_df)
+        rendered_tables.put((job.id, timetable_type, timetable_name), timetable_html)
 
     return render_template(
         'show_timetable.html',
+        job_id=job.id,
         timetable_name=timetable_name,
         timetable_html=Markup(timetable_html),
         display_name=display_name,
         timetable_type=timetable_type
     )
 
-@app.route('/download/<filename>')
-def download_file(filename):
-    return send_from_directory(app.config['OUTPUT_FOLDER'], filename, as_attachment=True)
+@app.route('/jobs/<job_id>/download/<filename>')
+def download_file(job_id, filename):
+    job = get_completed_job(job_id)
+    if job is None:
+        abort(404)
+    return send_from_directory(job.output_folder, filename, as_attachment=True)
 
 if __name__ == '__main__':
     app.run(debug=True)
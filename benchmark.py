@@ -0,0 +1,372 @@
+import argparse
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+from ga import POPULATION_SIZE, NUM_GENERATIONS
+from solvers import SOLVERS, make_solver
+from timetable_generator import load_problem, build_model, compile_problem, build_timetables, write_timetables
+
+# GA run control compared by the 'control' benchmark: the fixed schedule
+# (full population, every generation, constant rates) against the defaults
+# (population sized by the instance, stagnation stop, diversity-driven rates)
+RUN_CONTROLS = {
+    'fixed': dict(population_size=POPULATION_SIZE, num_generations=NUM_GENERATIONS, stagnation_generations=0,
+                  adaptive=False),
+    'adaptive': dict(population_size=None, adaptive=True),
+}
+
+# Instance sizes for the benchmark suite (keyword arguments of write_synthetic_instance)
+SIZES = {
+    'small': dict(num_batches=7, num_instructors=40, num_courses=80, backlog_students=25,
+                  backlog_density=0.05, elective_students=30, elective_density=0.05),
+    'medium': dict(num_batches=7, num_instructors=120, num_courses=240, backlog_students=500,
+                   backlog_density=0.015, elective_students=500, elective_density=0.015),
+    'large': dict(num_batches=7, num_instructors=300, num_courses=600, backlog_students=5000,
+                  backlog_density=0.006, elective_students=3000, elective_density=0.006),
+}
+
+
+def write_synthetic_instance(folder, num_batches=7, num_instructors=40, num_courses=80, lab_fraction=0.2,
+                             backlog_students=25, backlog_density=0.05, elective_students=30,
+                             elective_density=0.15, seed=0):
+    # Write a deterministic random instance in the same CSV schemas as the
+    # bundled Instructors_Courses.csv, Backlog.csv and Elective.csv. Batches
+    # are BE-2016, BE-2017, ... so that the built-in regular students apply.
+    rng = random.Random(seed)
+    os.makedirs(folder, exist_ok=True)
+    batches = [f'BE-{2016 + i}' for i in range(num_batches)]
+    instructors = [f'Instructor {i} (I{i})' for i in range(num_instructors)]
+    rooms = [str(100 + i) for i in range(max(1, num_courses // 4))]
+
+    courses = []
+    for i in range(num_courses):
+        is_lab = rng.random() < lab_fraction
+        program = rng.choice(['CSE', 'ECE', 'CSE and ECE'])
+        prefix = 'ECE' if program == 'ECE' else 'CSE'
+        courses.append({
+            '#': i + 1,
+            'Batch': batches[i % num_batches],
+            'Course Number': f'{prefix} {1000 + i}',
+            'Course Name': f'Course {i}',
+            'Program': program,
+            'Instructor-in-Charge': rng.choice(instructors),
+            'Section Number': '',
+            'Lecture Hours': 0 if is_lab else rng.randint(2, 4),
+            'Lab Hours': rng.choice([2, 4]) if is_lab else 0,
+            'Credits': 3,
+            'Remarks': '',
+            'ROOM': rng.choice(rooms),
+            'CombinedProgram': program == 'CSE and ECE',
+            'CombinedSection': False,
+        })
+    course_numbers = [course['Course Number'] for course in courses]
+    pd.DataFrame(courses).to_csv(os.path.join(folder, 'Instructors_Courses.csv'), index=False)
+
+    def student_sheet(num_students, density, first_no):
+        rows = []
+        for k in range(num_students):
+            year = 2015 + rng.randrange(num_batches)
+            row = {'No': k + 1, 'RollNumber': f"{year}-MIIT-{rng.choice(['CSE', 'ECE'])}-{first_no + k:04d}",
+                   'Name': f'Student {first_no + k}'}
+            for number in course_numbers:
+                row[number] = 1.0 if rng.random() < density else np.nan
+            rows.append(row)
+        return pd.DataFrame(rows, columns=['No', 'RollNumber', 'Name'] + course_numbers)
+
+    student_sheet(backlog_students, backlog_density, 1).to_csv(os.path.join(folder, 'Backlog.csv'), index=False)
+    student_sheet(elective_students, elective_density, 1 + backlog_students).to_csv(
+        os.path.join(folder, 'Elective.csv'), index=False)
+    return tuple(os.path.join(folder, name) for name in ('Instructors_Courses.csv', 'Backlog.csv', 'Elective.csv'))
+
+
+def _timed(func, *args, **kwargs):
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+def run_size(name, params, population_size=200, num_generations=30, seed=0):
+    # Benchmark every stage on one synthetic instance. Runs in a fresh process
+    # (see run_suite) so that peak RSS belongs to this size alone.
+    from ga import run_ga
+
+    random.seed(seed)
+    np.random.seed(seed)
+    with tempfile.TemporaryDirectory() as folder:
+        paths = write_synthetic_instance(folder, seed=seed, **params)
+        result = {'size': name, 'params': params}
+
+        _, result['csv_read_seconds'] = _timed(lambda: [pd.read_csv(path) for path in paths])
+        problem, result['load_problem_seconds'] = _timed(load_problem, *paths)
+        model, result['compile_model_seconds'] = _timed(build_model, problem)
+        result['num_sessions'] = model.num_sessions
+        result['num_students'] = model.num_students
+        result['num_student_groups'] = model.num_student_groups
+
+        # Compiled-problem cache: first run stores the entry, re-runs load it
+        cache_folder = os.path.join(folder, 'cache')
+        _, result['cache_store_seconds'] = _timed(compile_problem, *paths, cache_folder=cache_folder)
+        _, result['cache_load_seconds'] = _timed(compile_problem, *paths, cache_folder=cache_folder)
+
+        # Evaluation throughput of the batched conflict model
+        population = np.random.randint(0, model.num_time_slots, size=(population_size, model.num_sessions))
+        model.score(population)
+        repeats = 5
+        _, elapsed = _timed(lambda: [model.score(population) for _ in range(repeats)])
+        result['evaluations_per_second'] = population_size * repeats / elapsed
+
+        # GA convergence: generations until no instructor, room or student clash remains
+        history = []
+
+        def on_generation(gen, pop, record):
+            best = pop[0]
+            hard = sum(best.penalty_counters.get(key, 0)
+                       for key in ('instructor_conflicts', 'room_conflicts', 'student_conflicts'))
+            history.append((gen + 1, int(record['min']), hard))
+            return False
+
+        best, result['ga_seconds'] = _timed(run_ga, model, {}, population_size=population_size,
+                                            num_generations=num_generations, on_generation=on_generation,
+                                            verbose=False)
+        result['ga_generations'] = len(history)
+        result['ga_best_penalty'] = int(best.fitness.values[0])
+        result['generations_to_feasible'] = next((gen for gen, _, hard in history if hard == 0), None)
+
+        timetables, result['build_timetables_seconds'] = _timed(build_timetables, problem, best)
+        _, result['excel_export_seconds'] = _timed(write_timetables, *timetables, problem['days'],
+                                                   problem['times'], folder)
+
+    result['peak_rss_mb'] = peak_rss_mb()
+    return result
+
+
+def peak_rss_mb():
+    # Peak resident set size of this process in MB, or None where the
+    # resource module is missing (Windows). ru_maxrss is in kilobytes on
+    # Linux but in bytes on macOS.
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 1024 ** 2 if sys.platform == 'darwin' else peak / 1024
+
+
+def run_suite(sizes=None, population_size=200, num_generations=30, seed=0):
+    results = []
+    for name in sizes or list(SIZES):
+        with ProcessPoolExecutor(max_workers=1) as executor:
+            future = executor.submit(run_size, name, SIZES[name], population_size, num_generations, seed)
+            start = time.perf_counter()
+            result = future.result()
+            result['wall_seconds'] = time.perf_counter() - start
+        results.append(result)
+    return {'meta': _metadata(), 'results': results}
+
+
+def _metadata():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {'commit': commit, 'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'python': platform.python_version(), 'numpy': np.__version__, 'pandas': pd.__version__,
+            'cpu_count': os.cpu_count()}
+
+
+def compare_results(baseline, current):
+    # Print the ratio current/baseline of every numeric metric per size
+    baseline_by_size = {result['size']: result for result in baseline['results']}
+    for result in current['results']:
+        old = baseline_by_size.get(result['size'])
+        if old is None:
+            continue
+        print(f"[{result['size']}] {baseline['meta'].get('commit')} -> {current['meta'].get('commit')}")
+        for key, value in result.items():
+            if isinstance(value, (int, float)) and isinstance(old.get(key), (int, float)) and old[key]:
+                print(f"  {key:>28}: {old[key]:>12.4g} -> {value:>12.4g}  ({value / old[key]:.2f}x)")
+
+
+def compare_solvers(problem, solver_names=None, time_limit=60, target_penalty=0, repeats=1, seed=0):
+    # Run every backend on the same compiled problem and report how long each
+    # took to reach target_penalty (None if it never did) and where it ended
+    model = build_model(problem)
+    results = []
+    for name in solver_names or list(SOLVERS):
+        for run in range(repeats):
+            solver = make_solver(name, model, time_limit=time_limit, target_penalty=target_penalty,
+                                 seed=seed + run)
+            start = time.perf_counter()
+            try:
+                best = solver.solve({})
+            except RuntimeError as e:
+                results.append({'solver': name, 'run': run, 'error': str(e),
+                                'wall_time': time.perf_counter() - start})
+                continue
+            results.append({
+                'solver': name,
+                'run': run,
+                'time_to_target': solver.time_to_target(),
+                'best_penalty': int(best.fitness.values[0]),
+                'penalty_counters': best.penalty_counters,
+                'wall_time': time.perf_counter() - start,
+                'history': [(round(t, 4), int(p)) for t, p in solver.history],
+            })
+    return results
+
+
+def compare_run_control(model, controls=None, repeats=1, seed=0):
+    # Run the GA under each run control and report wall time, generations,
+    # time until no instructor, room or student clash remains (None if never)
+    # and time until the best penalty of the fixed schedule was reached
+    from ga import run_ga
+
+    results = []
+    for name in controls or list(RUN_CONTROLS):
+        for run in range(repeats):
+            random.seed(seed + run)
+            np.random.seed(seed + run)
+            history = []
+            start = time.perf_counter()
+
+            def on_generation(gen, pop, record):
+                hard = sum(pop[0].penalty_counters.get(key, 0)
+                           for key in ('instructor_conflicts', 'room_conflicts', 'student_conflicts'))
+                history.append((round(time.perf_counter() - start, 4), int(record['min']), hard))
+                return False
+
+            best = run_ga(model, {}, on_generation=on_generation, verbose=False, **RUN_CONTROLS[name])
+            results.append({
+                'control': name,
+                'run': run,
+                'wall_time': time.perf_counter() - start,
+                'generations': len(history),
+                'best_penalty': int(best.fitness.values[0]),
+                'time_to_feasible': next((t for t, _, hard in history if hard == 0), None),
+                'history': history,
+            })
+    fixed = [result['best_penalty'] for result in results if result['control'] == 'fixed']
+    for result in results:
+        result['time_to_fixed_best'] = next((t for t, penalty, _ in result['history'] if penalty <= min(fixed)),
+                                            None) if fixed else None
+    return results
+
+
+def _print_control_results(results):
+    def seconds(value):
+        return f"{value:.2f}s" if value is not None else 'not reached'
+
+    for result in results:
+        print(f"{result['control']:>8}  generations: {result['generations']:>4}  "
+              f"best penalty: {result['best_penalty']:>5}  feasible: {seconds(result['time_to_feasible']):>12}  "
+              f"fixed best: {seconds(result['time_to_fixed_best']):>12}  wall: {result['wall_time']:.2f}s")
+
+
+def _print_solver_results(results):
+    for result in results:
+        if 'error' in result:
+            print(f"{result['solver']:>6}  error: {result['error']}")
+        else:
+            reached = result['time_to_target']
+            reached = f"{reached:.2f}s" if reached is not None else 'not reached'
+            print(f"{result['solver']:>6}  target: {reached:>12}  best penalty: {result['best_penalty']:>5}  "
+                  f"wall: {result['wall_time']:.2f}s")
+
+
+def _write_json(data, path):
+    if path:
+        with open(path, 'w') as f:
+            json.dump(data, f, indent=2)
+
+
+def main(argv=None, prog=None):
+    parser = argparse.ArgumentParser(prog=prog, description="Timetable generator benchmarks.")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    suite = subparsers.add_parser('suite', help="benchmark every stage on synthetic instances")
+    suite.add_argument('--sizes', nargs='+', choices=list(SIZES), default=list(SIZES))
+    suite.add_argument('--population-size', type=int, default=200)
+    suite.add_argument('--generations', type=int, default=30)
+    suite.add_argument('--seed', type=int, default=0)
+    suite.add_argument('--output', help="write results as JSON to this file")
+    suite.add_argument('--baseline', help="JSON results of an earlier run to compare against")
+
+    solvers = subparsers.add_parser('solvers', help="compare time-to-target penalty across solver backends")
+    solvers.add_argument('--instructors-courses', default='Instructors_Courses.csv')
+    solvers.add_argument('--backlog', default='Backlog.csv')
+    solvers.add_argument('--elective', default='Elective.csv')
+    solvers.add_argument('--solvers', nargs='+', choices=list(SOLVERS), default=list(SOLVERS))
+    solvers.add_argument('--time-limit', type=float, default=60)
+    solvers.add_argument('--target-penalty', type=int, default=0)
+    solvers.add_argument('--repeats', type=int, default=1)
+    solvers.add_argument('--output', help="write results as JSON to this file")
+
+    control = subparsers.add_parser('control', help="compare the fixed GA schedule with adaptive run control")
+    control.add_argument('--size', choices=list(SIZES), help="use a synthetic instance instead of the CSVs")
+    control.add_argument('--instructors-courses', default='Instructors_Courses.csv')
+    control.add_argument('--backlog', default='Backlog.csv')
+    control.add_argument('--elective', default='Elective.csv')
+    control.add_argument('--controls', nargs='+', choices=list(RUN_CONTROLS), default=list(RUN_CONTROLS))
+    control.add_argument('--repeats', type=int, default=1)
+    control.add_argument('--seed', type=int, default=0)
+    control.add_argument('--output', help="write results as JSON to this file")
+
+    synth = subparsers.add_parser('synthetic', help="write a synthetic instance as CSV files")
+    synth.add_argument('folder')
+    synth.add_argument('--size', choices=list(SIZES), default='small')
+    synth.add_argument('--seed', type=int, default=0)
+
+    compare = subparsers.add_parser('compare', help="compare two suite result files")
+    compare.add_argument('baseline')
+    compare.add_argument('current')
+
+    args = parser.parse_args(argv)
+    if args.command == 'suite':
+        data = run_suite(args.sizes, args.population_size, args.generations, args.seed)
+        for result in data['results']:
+            peak = result['peak_rss_mb']
+            print(f"{result['size']:>7}: {result['num_sessions']} sessions, "
+                  f"{result['evaluations_per_second']:.0f} evals/s, "
+                  f"feasible after {result['generations_to_feasible']} generations, "
+                  f"{result['wall_seconds']:.1f}s wall, "
+                  f"{f'{peak:.0f} MB' if peak is not None else 'unknown'} peak RSS")
+        _write_json(data, args.output)
+        if args.baseline:
+            with open(args.baseline) as f:
+                compare_results(json.load(f), data)
+    elif args.command == 'solvers':
+        problem = load_problem(args.instructors_courses, args.backlog, args.elective)
+        results = compare_solvers(problem, args.solvers, args.time_limit, args.target_penalty, args.repeats)
+        _print_solver_results(results)
+        _write_json(results, args.output)
+    elif args.command == 'control':
+        if args.size:
+            with tempfile.TemporaryDirectory() as folder:
+                problem = load_problem(*write_synthetic_instance(folder, seed=args.seed, **SIZES[args.size]))
+        else:
+            problem = load_problem(args.instructors_courses, args.backlog, args.elective)
+        results = compare_run_control(build_model(problem), args.controls, args.repeats, args.seed)
+        _print_control_results(results)
+        _write_json(results, args.output)
+    elif args.command == 'synthetic':
+        for path in write_synthetic_instance(args.folder, seed=args.seed, **SIZES[args.size]):
+            print(path)
+    elif args.command == 'compare':
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        with open(args.current) as f:
+            current = json.load(f)
+        compare_results(baseline, current)
+
+
+if __name__ == '__main__':
+    main()
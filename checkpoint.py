@@ -0,0 +1,96 @@
+import json
+import os
+import pickle
+import random
+from collections import defaultdict, deque
+import numpy as np
+
+# Bump when the checkpoint layout changes; older files are not resumed
+CHECKPOINT_VERSION = 1
+CHECKPOINT_INTERVAL = 5  # generations between two checkpoints
+CHECKPOINT_FILE = 'checkpoint.pkl'
+SCHEDULE_FILE = 'best_schedule.json'  # best slot per session_id, written next to every run's outputs
+
+
+def _replace(path, write, mode):
+    # Write to a temporary file and rename it over path, so a crash mid-write
+    # leaves the previous file intact
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, mode) as f:
+        write(f)
+    os.replace(tmp_path, path)
+
+
+def save_checkpoint(path, model, population, generation, best_penalty=None, last_improvement=None):
+    # GA state after `generation` completed generations: every individual's
+    # genes (fitness is recomputed on resume), both RNG states and the
+    # stagnation state (best penalty so far and the generation it was
+    # reached, which the adaptive rates also follow), so a resumed run
+    # continues exactly where this one stopped
+    state = {
+        'version': CHECKPOINT_VERSION,
+        'generation': generation,
+        'num_sessions': model.num_sessions,
+        'num_time_slots': model.num_time_slots,
+        'population': [list(map(int, ind)) for ind in population],
+        'random_state': random.getstate(),
+        'numpy_state': np.random.get_state(),
+        'best_penalty': None if best_penalty is None else float(best_penalty),
+        'last_improvement': last_improvement,
+    }
+    _replace(path, lambda f: pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL), 'wb')
+
+
+def load_checkpoint(path, model):
+    # Checkpoint written by save_checkpoint for the same model, or None when
+    # there is none; raises ValueError if it belongs to another problem
+    if not os.path.exists(path):
+        return None
+    with open(path, 'rb') as f:
+        state = pickle.load(f)
+    if state.get('version') != CHECKPOINT_VERSION:
+        return None
+    if (state['num_sessions'], state['num_time_slots']) != (model.num_sessions, model.num_time_slots):
+        raise ValueError("Checkpoint does not match the current inputs.")
+    return state
+
+
+def restore_random_state(state):
+    random.setstate(state['random_state'])
+    np.random.set_state(state['numpy_state'])
+
+
+def save_schedule(path, problem, genes):
+    # Best assignment as [session_id, day, time] rows ([session_id, None, None]
+    # when unscheduled). Labels rather than slot indices, so the schedule
+    # survives edits to the course list or the time grid.
+    time_slot_indices = problem['time_slot_indices']
+    rows = []
+    for session_id, slot in zip(problem['course_sessions'].column('session_id'), genes):
+        day, time = time_slot_indices.get(int(slot), (None, None))
+        rows.append([session_id, day, time])
+    _replace(path, lambda f: json.dump({'sessions': rows}, f), 'w')
+
+
+def load_schedule(path):
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)['sessions']
+
+
+def remap_schedule(rows, problem):
+    # {session index: slot index} for the sessions of problem that appear in
+    # a saved schedule with a slot that still exists. Repeated session_ids are
+    # matched in order of appearance; new sessions are left out for the
+    # solver to place.
+    slot_by_label = {slot: idx for idx, slot in problem['time_slot_indices'].items()}
+    saved = defaultdict(deque)
+    for session_id, day, time in rows:
+        saved[session_id].append((day, time))
+    assignment = {}
+    for index, session_id in enumerate(problem['course_sessions'].column('session_id')):
+        queue = saved.get(session_id)
+        if queue:
+            slot = slot_by_label.get(tuple(queue.popleft()))
+            if slot is not None:
+                assignment[index] = slot
+    return assignment
@@ -0,0 +1,181 @@
+import argparse
+import json
+import os
+import sys
+from export import EXPORT_FORMATS
+
+# Only the standard library (and export's constants) is imported up front so
+# that --help, cron-driven runs and worker processes start quickly; each
+# subcommand imports pandas, NumPy, DEAP and the solvers when it needs them.
+SOLVER_NAMES = ('ga', 'sa', 'tabu', 'cpsat')  # solvers.SOLVERS, checked in generate
+
+
+def ga_options(args):
+    # GA run configuration given on the command line; unset options keep
+    # GASolver's defaults
+    options = {
+        'population_size': args.population_size,
+        'num_generations': args.generations,
+        'stagnation_generations': args.stagnation,
+        'crossover_prob': args.crossover_prob,
+        'mutation_prob': args.mutation_prob,
+    }
+    options = {name: value for name, value in options.items() if value is not None}
+    if args.fixed_rates:
+        options['adaptive'] = False
+    return options
+
+
+def generate(args):
+    from solvers import SOLVERS
+    from timetable_generator import generate_timetables
+
+    if args.solver not in SOLVERS:
+        raise ValueError(f"Unknown solver '{args.solver}'. Choose from: {', '.join(SOLVERS)}")
+    progress = {'status': 'running', 'message': 'Starting timetable generation...', 'percentage': 0}
+    os.makedirs(args.output, exist_ok=True)
+    generate_timetables(
+        args.instructors_courses,
+        args.backlog,
+        args.elective,
+        args.output,
+        progress,
+        solver=args.solver,
+        time_limit=args.time_limit,
+        workers=args.workers or None,
+        islands=args.islands,
+        cache_folder=args.cache,
+        export_formats=args.formats,
+        warm_start=args.warm_start,
+        checkpoint_path=args.checkpoint,
+        resume=args.resume,
+        ga_options=ga_options(args),
+        profile_path=args.profile,
+        reschedule=args.reschedule,
+        blackouts=args.blackout,
+        room_allocation=args.allocate_rooms or args.rooms is not None,
+        rooms_path=args.rooms,
+        time_grid_path=args.time_grid,
+    )
+
+
+def validate(args):
+    # Check the input files without solving; exit status 1 when they have errors
+    from ingest import read_inputs
+    from timegrid import TimeGrid
+
+    _, report = read_inputs(args.instructors_courses, args.backlog, args.elective, TimeGrid.load(args.time_grid))
+    if args.json:
+        print(json.dumps(report.to_dict(), indent=2))
+    else:
+        for label, problems in (('Error', report.errors), ('Warning', report.warnings)):
+            for sheet, message in problems:
+                print(f"{label}: {sheet}: {message}")
+        print(f"{len(report.errors)} errors, {len(report.warnings)} warnings")
+    return 0 if report.ok else 1
+
+
+def run_benchmark(argv):
+    import benchmark
+
+    benchmark.main(argv, prog='python -m cli benchmark')
+
+
+def export(args):
+    # Write a finished run's timetables (its results store) in other formats
+    from export import export_timetables
+    from results_store import RESULTS_FILENAME, ResultStore
+
+    path = os.path.join(args.run_folder, RESULTS_FILENAME)
+    if not os.path.exists(path):
+        raise ValueError(f"No {RESULTS_FILENAME} in {args.run_folder}; is it the output folder of a run?")
+    store = ResultStore(path)
+    days, times = store.grid_parameters()
+    output = args.output or args.run_folder
+    os.makedirs(output, exist_ok=True)
+    for path in export_timetables(*store.timetables(), days, times, output, formats=args.formats):
+        print(path)
+
+
+def add_input_arguments(parser):
+    parser.add_argument('--instructors-courses', default='Instructors_Courses.csv')
+    parser.add_argument('--backlog', default='Backlog.csv')
+    parser.add_argument('--elective', default='Elective.csv')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m cli', description="MIIT timetable generator")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    gen = subparsers.add_parser('generate', help="generate timetables from the three input CSVs")
+    add_input_arguments(gen)
+    gen.add_argument('--output', default='outputs', help="folder for the generated Excel files")
+    gen.add_argument('--solver', choices=SOLVER_NAMES, default='ga')
+    gen.add_argument('--time-limit', type=float, help="stop searching after this many seconds")
+    gen.add_argument('--workers', type=int, default=1, help="GA evaluation processes (0: all cores)")
+    gen.add_argument('--islands', type=int, default=1, help="GA island sub-populations")
+    gen.add_argument('--cache', metavar='FOLDER',
+                     help="reuse compiled inputs from this folder when the CSV contents are unchanged")
+    gen.add_argument('--formats', nargs='+', choices=EXPORT_FORMATS, default=['xlsx'],
+                     help="output formats (xlsx: the three workbooks, csv/json: one flat file each)")
+    gen.add_argument('--warm-start', metavar='SCHEDULE',
+                     help="start from an earlier run's best_schedule.json (matched by session_id)")
+    gen.add_argument('--reschedule', action='store_true',
+                     help="keep the --warm-start schedule and only move the sessions the changes affect")
+    gen.add_argument('--blackout', nargs=3, action='append', metavar=('INSTRUCTOR', 'DAY', 'TIME'),
+                     help="with --reschedule: keep INSTRUCTOR free at DAY TIME (repeatable)")
+    gen.add_argument('--allocate-rooms', action='store_true',
+                     help="assign rooms after scheduling instead of using the ROOM column as given")
+    gen.add_argument('--rooms', metavar='FILE',
+                     help="room list (Room, Capacity, Type) for room allocation; implies --allocate-rooms")
+    gen.add_argument('--time-grid', metavar='FILE',
+                     help="JSON time grid (days, periods, breaks, reserved, lab_starts, lecture_duration, "
+                          "lab_duration) instead of the MIIT week")
+    gen.add_argument('--checkpoint', metavar='FILE', help="save GA checkpoints to this file")
+    gen.add_argument('--resume', action='store_true', help="continue from --checkpoint if it exists")
+    gen.add_argument('--profile', metavar='FILE',
+                     help="cProfile the run into FILE (summary in FILE.txt); timings always go to metrics.json")
+    ga = gen.add_argument_group("GA run configuration")
+    ga.add_argument('--population-size', type=int, help="default: twice the number of sessions, 100 to 1000")
+    ga.add_argument('--generations', type=int, help="maximum number of generations (default: 100)")
+    ga.add_argument('--stagnation', type=int, metavar='GENERATIONS',
+                    help="stop after this many generations without improvement (default: 20, 0: never)")
+    ga.add_argument('--crossover-prob', type=float, help="base crossover probability (default: 0.9)")
+    ga.add_argument('--mutation-prob', type=float, help="base mutation probability (default: 0.3)")
+    ga.add_argument('--fixed-rates', action='store_true',
+                    help="keep the rates fixed instead of adapting them to population diversity")
+    gen.set_defaults(func=generate)
+
+    val = subparsers.add_parser('validate', help="check the input CSVs without generating anything")
+    add_input_arguments(val)
+    val.add_argument('--time-grid', metavar='FILE', help="JSON time grid the sessions must fit")
+    val.add_argument('--json', action='store_true', help="print the report as JSON")
+    val.set_defaults(func=validate)
+
+    # Options after 'benchmark' go to benchmark.py's own parser
+    subparsers.add_parser('benchmark', add_help=False, help="run benchmark.py (see: benchmark --help)")
+
+    exp = subparsers.add_parser('export', help="write a finished run's timetables in other formats")
+    exp.add_argument('run_folder', help="output folder of an earlier run (holding its timetables.sqlite)")
+    exp.add_argument('--formats', nargs='+', choices=EXPORT_FORMATS, default=list(EXPORT_FORMATS))
+    exp.add_argument('--output', metavar='FOLDER', help="write the files here instead of the run folder")
+    exp.set_defaults(func=export)
+
+    args, extra = parser.parse_known_args(argv)
+    if args.command == 'benchmark':
+        return run_benchmark(extra)
+    if extra:
+        parser.error(f"unrecognized arguments: {' '.join(extra)}")
+    if args.command == 'generate' and args.reschedule and not args.warm_start:
+        parser.error("--reschedule requires --warm-start")
+    if args.command == 'generate' and args.blackout and not args.reschedule:
+        parser.error("--blackout only applies with --reschedule")
+    try:
+        return args.func(args)
+    except (OSError, ValueError) as e:
+        # Missing or bad inputs (files, time grid, blackouts): a message, not a traceback
+        parser.exit(1, f"{parser.prog}: error: {e}\n")
+
+
+if __name__ == '__main__':
+    sys.exit(main())
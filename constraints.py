@@ -0,0 +1,151 @@
+import heapq
+import random
+import numpy as np
+from collections import defaultdict
+from fitness import PENALTY_WEIGHTS
+from timegrid import mask_of, slot_words
+
+
+class SessionDomains:
+    # Start slots each session may take without breaking a hard constraint:
+    # its whole duration fits before a break or the end of the day, labs
+    # start in a lab period, and its footprint touches no reserved slot (the
+    # time grid's and reserved_slots, (day, time) pairs). blocked: {session:
+    # slot indices} the session must not touch either (e.g. its instructor is
+    # unavailable); a session blocked everywhere keeps its unblocked domain
+    # and is listed in unblockable, so callers can report it.
+
+    def __init__(self, model, reserved_slots=(), blocked=None):
+        n_slots = model.num_time_slots
+        slot_by_day_time = {slot: idx for idx, slot in model.time_slot_indices.items()}
+        reserved = model.reserved_words | slot_words(mask_of(slot_by_day_time[tuple(day_time)]
+                                                             for day_time in reserved_slots or ()
+                                                             if tuple(day_time) in slot_by_day_time), n_slots)
+
+        # mask[session, slot]: slot is allowed; the extra last column (invalid
+        # gene values are clipped onto it) is never allowed
+        start_ok = np.ones((model.num_sessions, n_slots + 1), dtype=bool)
+        start_ok[model.is_lab] = model.lab_start_ok
+        start_ok[:, n_slots] = False
+        free = model.block_fits & ~np.any(model.footprints & reserved, axis=2)
+        self.mask = start_ok & free[model.session_shape]
+        # Sessions that fit nowhere fall back to any start they may take
+        stuck = ~self.mask.any(axis=1)
+        self.mask[stuck] = start_ok[stuck]
+        self.slots = [np.flatnonzero(row).tolist() for row in self.mask]
+        self.unblockable = []
+        for session, slots in sorted((blocked or {}).items()):
+            unavailable = slot_words(mask_of(slots), n_slots)
+            footprints = model.footprints[model.session_shape[session]]
+            allowed = self.mask[session] & ~np.any(footprints & unavailable, axis=1)
+            if allowed.any():
+                self.mask[session] = allowed
+                self.slots[session] = np.flatnonzero(allowed).tolist()
+            else:
+                self.unblockable.append(session)
+        self.num_time_slots = n_slots
+
+    def sample(self, session):
+        return random.choice(self.slots[session])
+
+    def violations(self, genes):
+        # Positions whose gene lies outside the session's domain
+        genes = np.minimum(np.asarray(genes, dtype=np.int64), self.num_time_slots)
+        return np.flatnonzero(~self.mask[np.arange(len(genes)), genes]).tolist()
+
+
+def conflict_graph(model):
+    # Sessions that can clash with each other: they share an instructor, a
+    # room or at least one student class
+    members = defaultdict(set)
+    for session, instructor in enumerate(model.instructor_idx.tolist()):
+        members[('instructor', instructor)].add(session)
+    for session, room in zip(model.room_sessions.tolist(), model.room_idx.tolist()):
+        members[('room', room)].add(session)
+    for session, group in zip(model.student_sessions.tolist(), model.student_group_idx.tolist()):
+        members[('group', group)].add(session)
+
+    neighbours = [set() for _ in range(model.num_sessions)]
+    for sessions in members.values():
+        for session in sessions:
+            neighbours[session] |= sessions
+    for session, adjacent in enumerate(neighbours):
+        adjacent.discard(session)
+    return neighbours
+
+
+def greedy_individual(model, domains, neighbours, rng=random, fixed=None):
+    # DSATUR-style construction: repeatedly place the session whose placed
+    # neighbours already use the most distinct slots (ties: highest degree),
+    # at the cheapest slot of its domain under the penalty model. Ties between
+    # equally cheap slots are broken at random so seeds stay diverse.
+    # fixed: {session: slot} placed as given before the rest (warm starts);
+    # slots outside the session's domain are ignored. Busy slots of every
+    # instructor, room and student class are kept as bitmask words, so the
+    # clashes of a candidate start are the bits its footprint shares with them.
+    n_slots = model.num_time_slots
+    num_words = model.footprints.shape[2]
+    instructors = np.zeros((model.num_instructors, num_words), dtype=np.uint64)
+    rooms = np.zeros((model.num_rooms, num_words), dtype=np.uint64)
+    groups = np.zeros((model.num_student_groups, num_words), dtype=np.uint64)
+    course_days = np.zeros((model.num_courses, model.num_days + 1), dtype=np.int64)
+    w_instructor = PENALTY_WEIGHTS['instructor_conflicts']
+    w_room = PENALTY_WEIGHTS['room_conflicts']
+    w_student = PENALTY_WEIGHTS['student_conflicts']
+    w_same_day = PENALTY_WEIGHTS['multiple_sessions_same_day']
+
+    genes = [0] * model.num_sessions
+    placed = [False] * model.num_sessions
+    saturation = [set() for _ in range(model.num_sessions)]
+    degree = [len(adjacent) for adjacent in neighbours]
+    heap = []
+
+    def place(s, slot):
+        genes[s] = slot
+        placed[s] = True
+        footprint = model.footprints[model.session_shape[s], slot]
+        instructors[model.instructor_idx[s]] |= footprint
+        room = model.session_room[s]
+        if room >= 0:
+            rooms[room] |= footprint
+        groups[model.session_groups[s]] |= footprint
+        used = [t for t in model.cover[:, model.session_shape[s], slot].tolist() if t < n_slots]
+        course_days[model.course_idx[s], model.slot_day[slot]] += 1
+
+        for u in neighbours[s]:
+            if not placed[u]:
+                saturation[u].update(used)
+                heapq.heappush(heap, (-len(saturation[u]), -degree[u], rng.random(), u))
+
+    for s, slot in (fixed or {}).items():
+        if domains.mask[s, slot]:
+            place(s, int(slot))
+    for s in range(model.num_sessions):
+        if not placed[s]:
+            heapq.heappush(heap, (-len(saturation[s]), -degree[s], rng.random(), s))
+
+    while heap:
+        neg_saturation, _, _, s = heapq.heappop(heap)
+        if placed[s] or -neg_saturation != len(saturation[s]):
+            continue  # stale heap entry
+
+        candidates = np.array(domains.slots[s], dtype=np.int64)
+        footprints = model.footprints[model.session_shape[s], candidates]
+        room = model.session_room[s]
+        session_groups = model.session_groups[s]
+        cost = w_instructor * _clashes(instructors[model.instructor_idx[s]], footprints)
+        if room >= 0:
+            cost += w_room * _clashes(rooms[room], footprints)
+        if len(session_groups):
+            busy = _clashes(groups[session_groups][:, None, :], footprints[None, :, :])
+            cost += w_student * (model.student_group_sizes[session_groups] @ busy)
+        cost += w_same_day * (course_days[model.course_idx[s], model.slot_day[candidates]] > 0)
+
+        best = candidates[cost == cost.min()]
+        place(s, int(best[rng.randrange(len(best))]))
+    return genes
+
+
+def _clashes(busy, footprints):
+    # Slots each footprint shares with the busy bitmask words
+    return np.bitwise_count(busy & footprints).sum(axis=-1, dtype=np.int64)
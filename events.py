@@ -0,0 +1,79 @@
+import json
+import threading
+import time
+
+# Per-job event bus defaults
+EVENT_INTERVAL = 0.25  # seconds between two events of the same throttled kind
+MAX_EVENTS = 2000  # events kept for late or reconnecting listeners
+
+
+class EventBus:
+    # Append-only log of (kind, data) events that any number of listeners
+    # follow by index. Throttled kinds (e.g. per-generation records) are
+    # published at most once per min_interval; in between only the latest one
+    # is kept, and it is flushed once the interval has passed or on close().
+    def __init__(self, min_interval=EVENT_INTERVAL, max_events=MAX_EVENTS, throttled=('generation',)):
+        self.min_interval = min_interval
+        self.max_events = max_events
+        self.throttled = set(throttled)
+        self.events = []
+        self.offset = 0  # index of events[0] in the whole log
+        self.closed = False
+        self.last_published = {}
+        self.pending = {}
+        self.condition = threading.Condition()
+
+    def publish(self, kind, data):
+        with self.condition:
+            if self.closed:
+                return
+            if kind in self.throttled:
+                if time.monotonic() - self.last_published.get(kind, float('-inf')) < self.min_interval:
+                    self.pending[kind] = data
+                    return
+                self.pending.pop(kind, None)
+            self._append(kind, data)
+
+    def close(self):
+        # No more events; listeners drain what is left and stop
+        with self.condition:
+            for kind, data in list(self.pending.items()):
+                self._append(kind, data)
+            self.pending.clear()
+            self.closed = True
+            self.condition.notify_all()
+
+    def wait(self, index, timeout=None):
+        # Block until there are events after index (or timeout). Returns
+        # (events as (index, kind, data), next index, closed)
+        with self.condition:
+            self._flush_due()
+            if index >= self.offset + len(self.events) and not self.closed:
+                self.condition.wait(timeout)
+                self._flush_due()
+            index = max(index, self.offset)
+            new = [(i, kind, data) for i, (kind, data) in enumerate(self.events[index - self.offset:], index)]
+            return new, self.offset + len(self.events), self.closed
+
+    def _flush_due(self):
+        now = time.monotonic()
+        for kind in [kind for kind in self.pending if now - self.last_published[kind] >= self.min_interval]:
+            self._append(kind, self.pending.pop(kind))
+
+    def _append(self, kind, data):
+        self.events.append((kind, data))
+        self.last_published[kind] = time.monotonic()
+        if len(self.events) > self.max_events:
+            # Forget the oldest half; listeners that far behind skip ahead
+            drop = len(self.events) // 2
+            del self.events[:drop]
+            self.offset += drop
+        self.condition.notify_all()
+
+
+def format_sse(kind, data, event_id=None):
+    # One Server-Sent Events message
+    message = f'event: {kind}\ndata: {json.dumps(data)}\n'
+    if event_id is not None:
+        message = f'id: {event_id}\n' + message
+    return message + '\n'
@@ -0,0 +1,167 @@
+import csv
+import json
+import os
+import re
+import textwrap
+from concurrent.futures import ThreadPoolExecutor
+
+# Output file names per timetable kind
+WORKBOOK_FILES = {
+    'batch': 'Batch_Timetables.xlsx',
+    'instructor': 'Instructor_Timetables.xlsx',
+    'student': 'Elective_Backlog_Timetables.xlsx',
+}
+CSV_FILE = 'Timetables.csv'
+JSON_FILE = 'Timetables.json'
+EXPORT_FORMATS = ('xlsx', 'csv', 'json')
+
+CSV_COLUMNS = ['kind', 'timetable', 'day', 'time', 'course_id', 'session_id', 'course_name', 'instructor',
+               'batch', 'program', 'section', 'room']
+
+# Characters Excel does not allow in sheet names
+_INVALID_SHEET_CHARS = re.compile(r'[\[\]:*?/\\]')
+
+
+def batch_timetable_name(key):
+    batch, program, section = key
+    section_str = f"_Section_{section}" if section else ""
+    return f"{batch}_{program}{section_str}"
+
+
+def named_timetables(batch_timetables, instructor_timetables, student_timetables):
+    # (kind, name, schedule) for every timetable, in output order. Batch
+    # timetables are keyed by (batch, program, section), or by their name
+    # when read back from a results store.
+    for key, schedule in batch_timetables.items():
+        yield 'batch', key if isinstance(key, str) else batch_timetable_name(key), schedule
+    for instructor, schedule in instructor_timetables.items():
+        yield 'instructor', instructor, schedule
+    for student, schedule in student_timetables.items():
+        yield 'student', str(student), schedule
+
+
+def timetable_cells(schedule_entries, days, times):
+    # Times x days list of wrapped cell texts for one timetable
+    day_index = {day: i for i, day in enumerate(days)}
+    time_index = {time: i for i, time in enumerate(times)}
+    cells = [[''] * len(days) for _ in times]
+    for entry in schedule_entries:
+        column = day_index[entry['day']]
+        for time in entry['times']:
+            content = f"{entry['course_id']}\n{entry['course_name']}\n{entry['room']}"
+            row = cells[time_index[time]]
+            row[column] = row[column] + "\n" + content if row[column] else content
+    for row in cells:
+        for column, text in enumerate(row):
+            if text:
+                row[column] = "\n".join(textwrap.wrap(text, width=30))
+    return cells
+
+
+def _sheet_name(name, used):
+    # Excel sheet names: at most 31 characters, no []:*?/\ nor apostrophes
+    # at either end, unique ignoring case
+    base = _INVALID_SHEET_CHARS.sub('_', name)[:31].strip("'") or 'Sheet'
+    sheet_name, suffix = base, 1
+    while sheet_name.lower() in used:
+        suffix += 1
+        tail = f"_{suffix}"
+        sheet_name = base[:31 - len(tail)] + tail
+    used.add(sheet_name.lower())
+    return sheet_name
+
+
+def write_workbook(path, timetables, days, times):
+    # Stream (name, schedule) pairs into one workbook, a sheet each. Rows go
+    # straight to disk (constant_memory) and all sheets share two formats, so
+    # memory does not grow with the number of sheets. xlsxwriter is imported
+    # here so the CSV/JSON exports and the CLI start without it.
+    import xlsxwriter
+
+    workbook = xlsxwriter.Workbook(path, {'constant_memory': True})
+    header_format = workbook.add_format({'bold': True, 'border': 1, 'text_wrap': True, 'align': 'center',
+                                         'valign': 'vcenter'})
+    wrap_format = workbook.add_format({'text_wrap': True, 'align': 'center', 'valign': 'vcenter'})
+    used = set()
+    try:
+        for name, schedule in timetables:
+            worksheet = workbook.add_worksheet(_sheet_name(name, used))
+            worksheet.set_column(0, len(days), 20, wrap_format)
+            worksheet.set_row(0, None, wrap_format)
+            for column, day in enumerate(days, 1):
+                worksheet.write_string(0, column, day, header_format)
+            for row, (time, cells) in enumerate(zip(times, timetable_cells(schedule, days, times)), 1):
+                worksheet.set_row(row, 60, wrap_format)
+                worksheet.write_string(row, 0, time, header_format)
+                for column, text in enumerate(cells, 1):
+                    if text:
+                        worksheet.write_string(row, column, text, wrap_format)
+            # Each constant_memory sheet holds an open temp file until the
+            # workbook is saved; release it so thousands of sheets do not run
+            # into the open file limit (xlsxwriter reopens it when packaging).
+            # _opt_close is private: checked against XlsxWriter 3.2.0 (the
+            # pinned version) and 3.2.9; skipped if a release drops it.
+            if hasattr(worksheet, '_opt_close'):
+                worksheet._opt_close()
+    finally:
+        workbook.close()
+    return path
+
+
+def write_workbooks(batch_timetables, instructor_timetables, student_timetables, days, times, output_folder,
+                    workers=3):
+    # The three workbooks are independent and written concurrently (most of
+    # the time goes to zlib compression, which runs outside the GIL)
+    timetables = {kind: [] for kind in WORKBOOK_FILES}
+    for kind, name, schedule in named_timetables(batch_timetables, instructor_timetables, student_timetables):
+        timetables[kind].append((name, schedule))
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(write_workbook, os.path.join(output_folder, WORKBOOK_FILES[kind]),
+                                   timetables[kind], days, times)
+                   for kind in WORKBOOK_FILES]
+        return [future.result() for future in futures]
+
+
+def _entry_rows(batch_timetables, instructor_timetables, student_timetables):
+    # One flat row per timetable entry and occupied time
+    for kind, name, schedule in named_timetables(batch_timetables, instructor_timetables, student_timetables):
+        for entry in schedule:
+            for time in entry['times']:
+                row = {column: entry.get(column) for column in CSV_COLUMNS}
+                row.update(kind=kind, timetable=name, time=time)
+                yield row
+
+
+def write_csv(batch_timetables, instructor_timetables, student_timetables, output_folder):
+    path = os.path.join(output_folder, CSV_FILE)
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.DictWriter(f, fieldnames=CSV_COLUMNS)
+        writer.writeheader()
+        writer.writerows(_entry_rows(batch_timetables, instructor_timetables, student_timetables))
+    return path
+
+
+def write_json(batch_timetables, instructor_timetables, student_timetables, days, times, output_folder):
+    # {"days": [...], "times": [...], "timetables": {kind: {name: [entries]}}}
+    path = os.path.join(output_folder, JSON_FILE)
+    timetables = {kind: {} for kind in WORKBOOK_FILES}
+    for kind, name, schedule in named_timetables(batch_timetables, instructor_timetables, student_timetables):
+        timetables[kind][name] = schedule
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump({'days': list(days), 'times': list(times), 'timetables': timetables}, f)
+    return path
+
+
+def export_timetables(batch_timetables, instructor_timetables, student_timetables, days, times, output_folder,
+                      formats=('xlsx',)):
+    # Write the requested formats ('xlsx', 'csv', 'json'); returns the paths
+    paths = []
+    if 'xlsx' in formats:
+        paths.extend(write_workbooks(batch_timetables, instructor_timetables, student_timetables, days, times,
+                                     output_folder))
+    if 'csv' in formats:
+        paths.append(write_csv(batch_timetables, instructor_timetables, student_timetables, output_folder))
+    if 'json' in formats:
+        paths.append(write_json(batch_timetables, instructor_timetables, student_timetables, days, times,
+                                output_folder))
+    return paths
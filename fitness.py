@@ -0,0 +1,533 @@
+import copy
+import os
+import tempfile
+import weakref
+import numpy as np
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from timegrid import mask_of, slot_words
+
+# Penalty points per violation, in the order the breakdown is reported
+PENALTY_WEIGHTS = {
+    'invalid_time_slot': 20,
+    'lab_scheduling': 10,  # labs off their start periods, sessions running past a break or the day
+    'instructor_conflicts': 5,
+    'room_conflicts': 2,
+    'student_conflicts': 5,
+    'multiple_sessions_same_day': 1,
+    'missing_sessions': 20,
+}
+PENALTY_KEYS = list(PENALTY_WEIGHTS)
+# Cells (8 bytes each) of the largest temporary table score() builds at
+# once; larger populations are scored a block of individuals at a time
+MAX_SCORE_CELLS = 1 << 22
+
+
+def _intern(values):
+    # Map each value to a dense integer id, in order of first appearance
+    ids = {}
+    return np.array([ids.setdefault(v, len(ids)) for v in values], dtype=np.int64), len(ids)
+
+
+class ConflictModel:
+    # Compiled conflict model: every session is reduced to integer ids for its
+    # instructor, room, course and enrolled students so that a whole population
+    # of schedules can be scored with a handful of bincount passes.
+
+    def __init__(self, course_sessions, batch_students, course_students, grid):
+        self.num_sessions = len(course_sessions)
+        self.num_time_slots = grid.num_slots
+        self.time_slot_indices = grid.slot_indices()
+        n_slots = self.num_time_slots
+
+        # Slot tables carry one extra "trash" entry at index n_slots, used for
+        # sessions that are not scheduled in a given individual
+        self.num_days = len(grid.days)
+        self.slot_day = np.full(n_slots + 1, self.num_days, dtype=np.int64)
+        self.slot_day[:n_slots] = np.arange(n_slots) // len(grid.periods)
+        self.lab_start_ok = np.zeros(n_slots + 1, dtype=bool)
+        self.lab_start_ok[:n_slots] = grid.lab_start_ok()
+
+        # Footprints: sessions of equal duration share a shape. cover[k, shape,
+        # t] is the k-th slot such a session occupies when it starts at t
+        # (n_slots past its end), block_fits[shape, t] whether its whole
+        # duration fits there, and footprints[shape, t] holds the same slots as
+        # bitmask words (timegrid.slot_words) for AND/OR occupancy tests
+        shapes, session_shape = np.unique(course_sessions.duration.astype(np.int64), return_inverse=True)
+        self.session_shape = session_shape.astype(np.int64).reshape(-1)
+        self.shape_duration = shapes
+        width = int(shapes.max()) if len(shapes) else 1
+        num_words = len(slot_words(0, n_slots))
+        self.cover = np.full((width, len(shapes), n_slots + 1), n_slots, dtype=np.int64)
+        self.block_fits = np.zeros((len(shapes), n_slots + 1), dtype=bool)
+        self.footprints = np.zeros((len(shapes), n_slots + 1, num_words), dtype=np.uint64)
+        for shape, duration in enumerate(shapes.tolist()):
+            for t in range(n_slots):
+                block = grid.block(t, duration)
+                self.cover[:len(block), shape, t] = block
+                self.block_fits[shape, t] = len(block) == duration
+                self.footprints[shape, t] = slot_words(grid.footprint(t, duration), n_slots)
+        self.reserved_words = slot_words(mask_of(grid.index[slot] for slot in grid.reserved), n_slots)
+
+        # Session columns are already interned (sessions.SessionTable), so
+        # their codes serve as dense ids
+        codes = course_sessions.codes
+        self.is_lab = course_sessions.is_lab
+        self.course_idx = codes['course_id'].astype(np.int64)
+        self.num_courses = len(course_sessions.labels['course_id'])
+        num_session_ids = len(course_sessions.labels['session_id'])
+        # Sessions sharing a session_id only count once towards the schedule
+        self.session_id_idx = codes['session_id'].astype(np.int64) if num_session_ids < self.num_sessions else None
+        self.num_session_ids = num_session_ids
+
+        # Instructor incidence: every session has exactly one instructor
+        self.instructor_idx = codes['instructor'].astype(np.int64)
+        self.num_instructors = len(course_sessions.labels['instructor'])
+
+        # Room incidence: sessions without a room never conflict
+        has_room = np.array([bool(room) for room in course_sessions.labels['room']], dtype=bool)
+        self.room_sessions = np.flatnonzero(has_room[codes['room']])
+        self.room_idx, self.num_rooms = _intern(codes['room'][self.room_sessions].tolist())
+        self.session_room = np.full(self.num_sessions, -1, dtype=np.int64)
+        self.session_room[self.room_sessions] = self.room_idx
+
+        # Student incidence: students with identical session sets always clash
+        # identically, so conflicts are counted once per enrollment pattern and
+        # weighted by the number of students sharing it
+        groups = group_students(course_sessions, batch_students, course_students)
+        pair_sessions = []
+        pair_groups = []
+        for group_idx, (sessions, _) in enumerate(groups):
+            pair_sessions.extend(sessions)
+            pair_groups.extend([group_idx] * len(sessions))
+        self.student_sessions = np.array(pair_sessions, dtype=np.int64)
+        self.student_group_idx = np.array(pair_groups, dtype=np.int64)
+        self.student_group_sizes = np.array([len(members) for _, members in groups], dtype=np.int64)
+        self.num_student_groups = len(groups)
+        self.num_students = int(self.student_group_sizes.sum())
+
+        # Per-session view of the same incidence, for incremental updates:
+        # the distinct classes attending each session and how often they appear
+        session_groups = [defaultdict(int) for _ in range(self.num_sessions)]
+        for session_idx, group_idx in zip(pair_sessions, pair_groups):
+            session_groups[session_idx][group_idx] += 1
+        self.session_groups = [np.array(list(g.keys()), dtype=np.int64) for g in session_groups]
+        self.session_group_mult = [np.array(list(g.values()), dtype=np.int64) for g in session_groups]
+
+        self.weights = np.array([PENALTY_WEIGHTS[key] for key in PENALTY_KEYS], dtype=np.int64)
+
+    def without_rooms(self):
+        # Copy that ignores rooms, for searches whose rooms are allocated
+        # afterwards (see rooms.allocate_rooms)
+        model = copy.copy(self)
+        model.room_sessions = np.zeros(0, dtype=np.int64)
+        model.room_idx = np.zeros(0, dtype=np.int64)
+        model.num_rooms = 0
+        model.session_room = np.full(self.num_sessions, -1, dtype=np.int64)
+        return model
+
+    def to_arrays(self):
+        # Flatten the compiled tables into NumPy arrays plus JSON-friendly
+        # scalars (the form problem_cache stores). Weights are not stored so a
+        # cached model always scores with the current PENALTY_WEIGHTS.
+        arrays, meta = {}, {}
+        for name, value in vars(self).items():
+            if name == 'weights':
+                continue
+            if isinstance(value, np.ndarray):
+                arrays[name] = value
+            elif isinstance(value, list):
+                # Ragged per-session arrays: concatenated values plus offsets
+                arrays[name + '.offsets'] = np.cumsum([0] + [len(v) for v in value], dtype=np.int64)
+                arrays[name + '.values'] = np.concatenate(value) if value else np.zeros(0, dtype=np.int64)
+            elif name == 'time_slot_indices':
+                meta[name] = [list(value[idx]) for idx in range(len(value))]
+            else:
+                meta[name] = value
+        return arrays, meta
+
+    @classmethod
+    def from_arrays(cls, arrays, meta):
+        # Rebuild a model saved with to_arrays without recompiling it
+        model = cls.__new__(cls)
+        for name, value in meta.items():
+            if name == 'time_slot_indices':
+                value = {idx: tuple(slot) for idx, slot in enumerate(value)}
+            setattr(model, name, value)
+        for name, value in arrays.items():
+            if name.endswith('.offsets'):
+                name = name[:-len('.offsets')]
+                setattr(model, name, np.split(arrays[name + '.values'], value[1:-1]))
+            elif not name.endswith('.values'):
+                setattr(model, name, value)
+        model.weights = np.array([PENALTY_WEIGHTS[key] for key in PENALTY_KEYS], dtype=np.int64)
+        return model
+
+    def score(self, population):
+        # Score a (pop_size x num_sessions) array of slot indices.
+        # Returns the penalty per individual and a (pop_size x len(PENALTY_KEYS))
+        # matrix with the violation counts behind it.
+        X = np.asarray(population, dtype=np.int64).reshape(-1, self.num_sessions)
+        pop_size = X.shape[0]
+        rows = max(1, MAX_SCORE_CELLS // self._cells_per_individual())
+        if pop_size > rows:
+            blocks = [self.score(X[start:start + rows]) for start in range(0, pop_size, rows)]
+            return (np.concatenate([penalties for penalties, _ in blocks]),
+                    np.concatenate([counters for _, counters in blocks]))
+        invalid, bad_start, bad_fit, scheduled, first, cover = self.placements(X)
+
+        counters = np.zeros((pop_size, len(PENALTY_KEYS)), dtype=np.int64)
+        counters[:, 0] = invalid.sum(axis=1)
+        counters[:, 1] = bad_start.sum(axis=1) + bad_fit.sum(axis=1)
+        counters[:, 2] = self._slot_conflicts(cover, None, self.instructor_idx, self.num_instructors)
+        counters[:, 3] = self._slot_conflicts(cover, self.room_sessions, self.room_idx, self.num_rooms)
+        counters[:, 4] = self._slot_conflicts(cover, self.student_sessions, self.student_group_idx,
+                                              self.num_student_groups, self.student_group_sizes)
+        counters[:, 5] = _occupancy_conflicts(self.slot_day[first], self.course_idx,
+                                              self.num_courses, self.num_days)
+        if self.session_id_idx is None:
+            counters[:, 6] = self.num_sessions - scheduled.sum(axis=1)
+        else:
+            groups = np.where(scheduled, self.session_id_idx, self.num_session_ids)
+            offsets = np.arange(pop_size)[:, None] * (self.num_session_ids + 1)
+            seen = np.bincount((groups + offsets).ravel(), minlength=pop_size * (self.num_session_ids + 1))
+            seen = seen.reshape(pop_size, -1)[:, :-1]
+            counters[:, 6] = self.num_sessions - np.count_nonzero(seen, axis=1)
+
+        return counters @ self.weights, counters
+
+    def _cells_per_individual(self):
+        # Size of the largest per-individual table of a score pass: the
+        # (entity, slot) counts of an entity type or its covered slots
+        width = self.num_time_slots + 1
+        entities = max(self.num_instructors, self.num_rooms, self.num_student_groups, 1)
+        pairs = max(self.num_sessions, len(self.student_sessions)) * len(self.cover)
+        return max(entities * width, self.num_courses * (self.num_days + 1), pairs)
+
+    def placements(self, X):
+        # Where every session of every individual lands: which genes are
+        # invalid, which labs start where labs may not (left unscheduled),
+        # which sessions run past a break or the end of the day, which are
+        # scheduled, their first slot and every slot they cover (a list with
+        # one pop_size x num_sessions array per period of the longest
+        # session), num_time_slots meaning "none"
+        n_slots = self.num_time_slots
+        invalid = X >= n_slots
+        slots = np.where(invalid, n_slots, X)
+        bad_start = self.is_lab & ~invalid & ~self.lab_start_ok[slots]
+        scheduled = ~invalid & ~bad_start
+        bad_fit = scheduled & ~self.block_fits[self.session_shape, slots]
+        # Unscheduled sessions start at the trash slot, which covers nothing
+        cells = self.session_shape * (n_slots + 1) + np.where(scheduled, slots, n_slots)
+        cover = [table.reshape(-1)[cells] for table in self.cover]
+        return invalid, bad_start, bad_fit, scheduled, cover[0], cover
+
+    def _slot_conflicts(self, cover, sessions, entities, num_entities, entity_weights=None):
+        # Conflicts for one entity type: every (entity, slot) cell occupied more
+        # than once contributes one conflict per extra occupant, times the
+        # entity's weight when it stands for several identical students
+        if sessions is not None:
+            cover = [slots[:, sessions] for slots in cover]
+        occupied = np.concatenate(cover, axis=1)
+        entities = np.tile(entities, len(cover))
+        return _occupancy_conflicts(occupied, entities, num_entities, self.num_time_slots, entity_weights)
+
+    def evaluate(self, individual):
+        # Drop-in replacement for a single-individual DEAP evaluate function
+        penalties, counters = self.score([individual])
+        individual.penalty_counters = dict(zip(PENALTY_KEYS, counters[0].tolist()))
+        return (int(penalties[0]),)
+
+    def evaluate_population(self, individuals):
+        # Score a list of individuals in one batched pass, attaching the
+        # penalty breakdown to each and returning their fitness tuples
+        if not individuals:
+            return []
+        penalties, counters = self.score(individuals)
+        fits = []
+        for ind, penalty, row in zip(individuals, penalties.tolist(), counters.tolist()):
+            ind.penalty_counters = dict(zip(PENALTY_KEYS, row))
+            fits.append((penalty,))
+        return fits
+
+
+class OccupancyState:
+    # Occupancy tables of one evaluated individual: counts per
+    # (instructor|room|student class, slot), (course, day) and session_id,
+    # the genes they were built from and the resulting violation counters
+    __slots__ = ('genes', 'instructors', 'rooms', 'groups', 'course_days', 'session_ids', 'counters')
+
+
+def occupancy_nbytes(model):
+    # Memory one individual's OccupancyState takes for this model
+    width = model.num_time_slots + 1
+    cells = ((model.num_instructors + model.num_rooms + model.num_student_groups) * width
+             + model.num_courses * (model.num_days + 1) + model.num_sessions + len(PENALTY_KEYS))
+    if model.session_id_idx is not None:
+        cells += model.num_session_ids
+    return 8 * cells
+
+
+class IncrementalEvaluator:
+    # Keeps an OccupancyState on every individual and, when only a few genes
+    # moved since the last evaluation (see operators.py), updates the penalty
+    # from those moves instead of rescoring the whole schedule
+
+    def __init__(self, model):
+        self.model = model
+
+    def build_state(self, individual):
+        m = self.model
+        X = np.asarray(individual, dtype=np.int64).reshape(1, -1)
+        _, _, _, scheduled, first, cover = m.placements(X)
+        first, cover = first[0], [slots[0] for slots in cover]
+        width = m.num_time_slots + 1
+
+        def table(sessions, entities, num_entities):
+            counts = np.zeros((num_entities, width), dtype=np.int64)
+            for slots in cover:
+                np.add.at(counts, (entities, slots[sessions]), 1)
+            counts[:, -1] = 0
+            return counts
+
+        state = OccupancyState()
+        state.genes = X[0].copy()
+        state.instructors = table(np.arange(m.num_sessions), m.instructor_idx, m.num_instructors)
+        state.rooms = table(m.room_sessions, m.room_idx, m.num_rooms)
+        state.groups = table(m.student_sessions, m.student_group_idx, m.num_student_groups)
+        state.course_days = np.zeros((m.num_courses, m.num_days + 1), dtype=np.int64)
+        np.add.at(state.course_days, (m.course_idx, m.slot_day[first]), 1)
+        state.course_days[:, -1] = 0
+        if m.session_id_idx is not None:
+            state.session_ids = np.bincount(m.session_id_idx[scheduled[0]], minlength=m.num_session_ids)
+        else:
+            state.session_ids = None
+        state.counters = m.score(X)[1][0].copy()
+        return state
+
+    def evaluate(self, individual):
+        state = getattr(individual, 'occupancy', None)
+        if state is None or len(state.genes) != len(individual):
+            state = individual.occupancy = self.build_state(individual)
+        else:
+            positions = getattr(individual, 'changed_positions', None)
+            if positions is None:
+                positions = np.flatnonzero(np.asarray(individual) != state.genes).tolist()
+            for position in positions:
+                old, new = int(state.genes[position]), individual[position]
+                if old != new:
+                    self._place(state, position, old, -1)
+                    self._place(state, position, new, 1)
+                    state.genes[position] = new
+        individual.changed_positions = set()
+        individual.penalty_counters = dict(zip(PENALTY_KEYS, state.counters.tolist()))
+        return (int(state.counters @ self.model.weights),)
+
+    def evaluate_population(self, individuals):
+        return [self.evaluate(ind) for ind in individuals]
+
+    def penalty(self, individual):
+        return int(individual.occupancy.counters @ self.model.weights)
+
+    def move(self, individual, position, value):
+        # Local-search step on an already evaluated individual: move one
+        # session to a new slot and return the updated penalty
+        state = individual.occupancy
+        old = int(state.genes[position])
+        if old != value:
+            self._place(state, position, old, -1)
+            self._place(state, position, value, 1)
+            state.genes[position] = value
+            individual[position] = value
+        return self.penalty(individual)
+
+    def _place(self, state, session, slot, sign):
+        # Add (sign=1) or remove (sign=-1) one session at a gene value, keeping
+        # the tables and violation counters in step
+        m = self.model
+        counters = state.counters
+        if slot >= m.num_time_slots:
+            counters[0] += sign
+            return
+        if m.is_lab[session] and not m.lab_start_ok[slot]:
+            counters[1] += sign
+            return
+        shape = m.session_shape[session]
+        if not m.block_fits[shape, slot]:
+            counters[1] += sign
+
+        room = m.session_room[session]
+        groups = m.session_groups[session]
+        for t in m.cover[:, shape, slot].tolist():
+            if t >= m.num_time_slots:
+                break
+            counters[2] += _bump(state.instructors, m.instructor_idx[session], t, sign)
+            if room >= 0:
+                counters[3] += _bump(state.rooms, room, t, sign)
+            if len(groups):
+                before = state.groups[groups, t]
+                after = before + sign * m.session_group_mult[session]
+                state.groups[groups, t] = after
+                excess = np.maximum(after - 1, 0) - np.maximum(before - 1, 0)
+                counters[4] += excess @ m.student_group_sizes[groups]
+        counters[5] += _bump(state.course_days, m.course_idx[session], m.slot_day[slot], sign)
+
+        if state.session_ids is None:
+            counters[6] -= sign
+        else:
+            sid = m.session_id_idx[session]
+            before = state.session_ids[sid]
+            state.session_ids[sid] = before + sign
+            # Missing count only changes when a session_id gains its first or
+            # loses its last scheduled session
+            if min(before, before + sign) == 0:
+                counters[6] -= sign
+
+
+class SharedModel:
+    # A ConflictModel's arrays packed into one file that worker processes
+    # map read-only, so every worker reads the same pages instead of
+    # unpickling a private copy. Only the file path, the array layout and the
+    # scalar metadata are pickled. The creating process calls close().
+    def __init__(self, model, folder=None):
+        arrays, self.meta = model.to_arrays()
+        self.layout = {}
+        fd, self.path = tempfile.mkstemp(suffix='.model', dir=folder)
+        with os.fdopen(fd, 'wb') as f:
+            offset = 0
+            for name, array in arrays.items():
+                array = np.ascontiguousarray(array)
+                padding = -offset % 8
+                f.write(b'\0' * padding)
+                offset += padding
+                self.layout[name] = (offset, array.dtype.str, array.shape)
+                f.write(array.tobytes())
+                offset += array.nbytes
+
+    def load(self):
+        buffer = np.memmap(self.path, dtype=np.uint8, mode='r')
+        arrays = {name: np.ndarray(shape, dtype, buffer, offset)
+                  for name, (offset, dtype, shape) in self.layout.items()}
+        return ConflictModel.from_arrays(arrays, self.meta)
+
+    def close(self):
+        # Workers that already mapped the file keep their mapping
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+# Conflict model of the current pool worker, installed once per process by
+# init_worker so individual tasks only have to ship gene arrays
+_worker_model = None
+
+
+def init_worker(shared):
+    global _worker_model
+    _worker_model = shared.load()
+
+
+def _score_chunk(genes):
+    return _worker_model.score(genes)
+
+
+def evaluate_genes(genes):
+    # Picklable single-individual evaluation for toolbox.map in a worker
+    penalties, counters = _worker_model.score([genes])
+    return (int(penalties[0]),)
+
+
+class ParallelEvaluator:
+    # Spreads batched scoring over a process pool. Each worker maps the
+    # model's arrays once at start-up (SharedModel); every generation the
+    # population is split into one contiguous chunk per worker.
+
+    def __init__(self, model, workers=None):
+        self.model = model
+        self.workers = workers or os.cpu_count() or 1
+        self.shared = SharedModel(model)
+        self.pool = ProcessPoolExecutor(max_workers=self.workers, initializer=init_worker, initargs=(self.shared,))
+        self._finalizer = weakref.finalize(self, _shutdown, self.pool, self.shared)
+
+    def map(self, func, iterable):
+        # toolbox.map replacement; func must be picklable (e.g. evaluate_genes)
+        items = [list(item) for item in iterable]
+        chunksize = max(1, len(items) // (self.workers * 4))
+        return list(self.pool.map(func, items, chunksize=chunksize))
+
+    def evaluate(self, individual):
+        return self.model.evaluate(individual)
+
+    def evaluate_population(self, individuals):
+        if not individuals:
+            return []
+        genes = np.asarray(individuals, dtype=np.int32)
+        chunks = np.array_split(genes, min(self.workers, len(genes)))
+        results = list(self.pool.map(_score_chunk, chunks))
+        penalties = np.concatenate([penalties for penalties, _ in results])
+        counters = np.concatenate([counters for _, counters in results])
+        fits = []
+        for ind, penalty, row in zip(individuals, penalties.tolist(), counters.tolist()):
+            ind.penalty_counters = dict(zip(PENALTY_KEYS, row))
+            fits.append((penalty,))
+        return fits
+
+    def close(self):
+        self._finalizer()
+
+
+def _shutdown(pool, shared):
+    pool.shutdown(cancel_futures=True)
+    shared.close()
+
+
+def _bump(table, entity, slot, sign):
+    # Change one occupancy cell and return the change in its conflict count
+    before = table[entity, slot]
+    table[entity, slot] = before + sign
+    return max(before + sign - 1, 0) - max(before - 1, 0)
+
+
+def _occupancy_conflicts(occupied, entities, num_entities, num_bins, entity_weights=None):
+    # occupied: (pop_size x pairs) bin per pair, with num_bins meaning "unused".
+    # Returns, per individual, the sum over (entity, bin) cells of max(count - 1, 0),
+    # optionally weighted per entity.
+    pop_size = occupied.shape[0]
+    if occupied.shape[1] == 0:
+        return np.zeros(pop_size, dtype=np.int64)
+    width = num_bins + 1
+    cells = (np.arange(pop_size)[:, None] * num_entities + entities[None, :]) * width + occupied
+    counts = np.bincount(cells.ravel(), minlength=pop_size * num_entities * width)
+    counts = counts.reshape(pop_size, num_entities, width)[:, :, :num_bins]
+    if entity_weights is not None:
+        excess = np.maximum(counts - 1, 0).sum(axis=2)
+        return excess @ entity_weights
+    used = (occupied < num_bins).sum(axis=1)
+    return used - np.count_nonzero(counts, axis=(1, 2))
+
+
+def session_students(session, batch_students, course_students):
+    # Every student attending a session: the regular batch (merging sections or
+    # programs for combined classes) plus enrolled backlog/elective students
+    batch = session.batch
+    program = session.program
+    section = session.section
+    if session.combined_section:
+        students = batch_students.get((batch, program, 'Section 1'), []) + batch_students.get((batch, program, 'Section 2'), [])
+    elif session.combined_program:
+        students = batch_students.get((batch, 'CSE', section), []) + batch_students.get((batch, 'ECE', section), [])
+    else:
+        students = batch_students.get((batch, program, section), [])
+    return list(students) + list(course_students.get(session.session_id, ()))
+
+
+def group_students(course_sessions, batch_students, course_students):
+    # Collapse students into equivalence classes by the exact (multi)set of
+    # sessions they attend. Returns a list of (session_indices, members).
+    student_sessions = defaultdict(list)
+    for i, session in enumerate(course_sessions):
+        for student in session_students(session, batch_students, course_students):
+            student_sessions[student].append(i)
+    groups = defaultdict(list)
+    for student, sessions in student_sessions.items():
+        groups[tuple(sessions)].append(student)
+    return [(list(sessions), members) for sessions, members in groups.items()]
@@ -0,0 +1,301 @@
+import random
+import numpy as np
+from deap import base, creator, tools, algorithms
+from checkpoint import CHECKPOINT_INTERVAL, load_checkpoint, restore_random_state, save_checkpoint
+from constraints import SessionDomains, conflict_graph, greedy_individual
+from fitness import IncrementalEvaluator, ParallelEvaluator, PENALTY_KEYS, occupancy_nbytes
+import metrics
+from operators import cx_uniform_tracked, mut_domain, mut_domain_tracked, repair
+
+# DEAP types are created once per process, so repeated runs (and island
+# worker processes) share the same picklable classes
+if not hasattr(creator, 'FitnessMin'):
+    creator.create("FitnessMin", base.Fitness, weights=(-1.0,))
+if not hasattr(creator, 'Individual'):
+    creator.create("Individual", list, fitness=creator.FitnessMin)
+
+# Genetic Algorithm parameters
+POPULATION_SIZE = 1000  # upper bound of the automatic population size
+NUM_GENERATIONS = 100
+CROSSOVER_PROB = 0.9
+MUTATION_PROB = 0.3
+GENE_MUTATION_PROB = 0.2  # chance of each gene being redrawn in a mutated individual
+SEED_FRACTION = 0.1  # share of the initial population built by the greedy heuristic
+WARM_START_FRACTION = 0.1  # share seeded from a previous schedule, when there is one
+WARM_START_RELEASE = 0.05  # share of its sessions each warm seed but the first re-places greedily
+
+# Run control
+MIN_POPULATION_SIZE = 100
+POPULATION_PER_SESSION = 2  # automatic population size, between MIN_POPULATION_SIZE and POPULATION_SIZE
+STAGNATION_GENERATIONS = 20  # stop after this many generations without a better best penalty (0: never)
+DIVERSITY_TARGET = 0.2  # below this diversity, adaptive rates trade crossover for small mutations
+MIN_CROSSOVER_PROB = 0.5
+MAX_MUTATION_PROB = 0.8
+MIN_MUTATED_GENES = 2  # expected genes redrawn per mutation once the population has converged
+STALL_GENERATIONS = 5  # generations without improvement after which adaptive rates are fully shifted
+REPORT_INTERVAL = 10  # generations between penalty breakdowns (and verbose output)
+INCREMENTAL_MEMORY = 512 * 2 ** 20  # bytes of occupancy tables incremental evaluation may keep
+
+
+def make_toolbox(model, evaluation='batch', workers=1, reserved_slots=None, warm_start=None):
+    # Build the DEAP toolbox and the evaluator for a compiled ConflictModel.
+    # warm_start: {session: slot} from an earlier schedule (see
+    # checkpoint.remap_schedule); adds a warm_individual(release) generator.
+    toolbox = base.Toolbox()
+    domains = SessionDomains(model, reserved_slots)
+    neighbours = conflict_graph(model)
+
+    # Attribute generator: Randomly assign each session a slot from its domain
+    def create_individual():
+        return [random.choice(slots) for slots in domains.slots]
+
+    toolbox.register("individual", tools.initIterate, creator.Individual, create_individual)
+    toolbox.register("population", tools.initRepeat, list, toolbox.individual)
+    toolbox.register("seed_individual", tools.initIterate, creator.Individual,
+                     lambda: greedy_individual(model, domains, neighbours))
+    if warm_start:
+        # Keep the earlier slots (less a random `release` share of them) and
+        # place every other session greedily around them
+        def warm_individual(release=0.0):
+            fixed = {s: slot for s, slot in warm_start.items() if random.random() >= release}
+            return creator.Individual(greedy_individual(model, domains, neighbours, fixed=fixed))
+
+        toolbox.register("warm_individual", warm_individual)
+
+    if evaluation == 'incremental':
+        # Offspring carry occupancy tables from their parents and only the genes
+        # touched by mate/mutate are re-scored
+        evaluator = IncrementalEvaluator(model)
+        toolbox.register("mate", cx_uniform_tracked, indpb=0.7)
+        toolbox.register("mutate", mut_domain_tracked, domains=domains, indpb=GENE_MUTATION_PROB)
+        toolbox.register("repair", repair, domains=domains, track=True)
+    else:
+        evaluator = model
+        if workers != 1:
+            # Batched scoring split across a process pool (workers=None: all cores)
+            evaluator = ParallelEvaluator(model, workers)
+            toolbox.register("map", evaluator.map)
+        toolbox.register("mate", tools.cxUniform, indpb=0.7)
+        toolbox.register("mutate", mut_domain, domains=domains, indpb=GENE_MUTATION_PROB)
+        toolbox.register("repair", repair, domains=domains)
+    toolbox.register("evaluate", evaluator.evaluate)
+    toolbox.register("select", tools.selTournament, tournsize=3)
+    return toolbox, evaluator
+
+
+def evaluation_for(model, evaluation, population_size):
+    # Incremental evaluation keeps an OccupancyState on every parent and
+    # offspring (fitness.occupancy_nbytes each); where that would exceed
+    # INCREMENTAL_MEMORY, as on large instances, batch evaluation is used
+    if evaluation == 'incremental':
+        needed = 2 * population_size * occupancy_nbytes(model)
+        if needed > INCREMENTAL_MEMORY:
+            print(f"Warning: incremental evaluation would keep {needed / 2 ** 20:.0f} MB of occupancy tables; "
+                  "using batch evaluation.")
+            return 'batch'
+    return evaluation
+
+
+def init_population(toolbox, population_size, seed_fraction=SEED_FRACTION, warm_fraction=WARM_START_FRACTION):
+    # Greedy conflict-aware seeds plus domain-respecting random individuals;
+    # with a warm start, also the earlier schedule and slight variations of it
+    warm = []
+    if hasattr(toolbox, 'warm_individual'):
+        num_warm = max(1, int(warm_fraction * population_size))
+        warm = [toolbox.warm_individual()]
+        warm += [toolbox.warm_individual(WARM_START_RELEASE) for _ in range(num_warm - 1)]
+    num_seeds = min(int(seed_fraction * population_size), population_size - len(warm))
+    seeds = [toolbox.seed_individual() for _ in range(num_seeds)]
+    return warm + seeds + toolbox.population(n=population_size - len(warm) - num_seeds)
+
+
+def population_size_for(model):
+    # Larger instances need more individuals to keep enough variety per
+    # session; small ones converge as well with far fewer
+    return int(np.clip(POPULATION_PER_SESSION * model.num_sessions, MIN_POPULATION_SIZE, POPULATION_SIZE))
+
+
+def population_diversity(pop):
+    # Mean share of the population whose gene differs from the most common
+    # value at that position: 0 when all individuals are identical
+    genes = np.asarray(pop, dtype=np.int64)
+    if genes.size == 0:
+        return 0.0
+    num_values = int(genes.max()) + 1
+    cells = genes + np.arange(genes.shape[1]) * num_values
+    counts = np.bincount(cells.ravel(), minlength=genes.shape[1] * num_values).reshape(genes.shape[1], num_values)
+    return float(1 - counts.max(axis=1).mean() / len(genes))
+
+
+def adapt_rates(diversity, num_genes, crossover_prob=CROSSOVER_PROB, mutation_prob=MUTATION_PROB,
+                gene_mutation_prob=GENE_MUTATION_PROB, stalled=0):
+    # (crossover, mutation, per-gene mutation) probabilities for the next
+    # generation: the base rates while diversity is at least DIVERSITY_TARGET,
+    # shifting linearly as it falls to 0 towards MIN_CROSSOVER_PROB,
+    # MAX_MUTATION_PROB and MIN_MUTATED_GENES genes per mutation. A converged
+    # population gains little from recombining near-copies, and redrawing a
+    # fifth of an almost optimal schedule never survives selection, so more
+    # individuals get mutated but each only slightly. The same shift happens
+    # over STALL_GENERATIONS once the best penalty has stalled for `stalled`
+    # generations, as a diverse population of poor schedules around a few
+    # good ones improves no better.
+    shortfall = min(max(1 - diversity / DIVERSITY_TARGET, stalled / STALL_GENERATIONS, 0.0), 1.0)
+    min_gene_prob = min(MIN_MUTATED_GENES / max(num_genes, 1), gene_mutation_prob)
+    return (crossover_prob - shortfall * max(crossover_prob - MIN_CROSSOVER_PROB, 0.0),
+            mutation_prob + shortfall * max(MAX_MUTATION_PROB - mutation_prob, 0.0),
+            gene_mutation_prob - shortfall * (gene_mutation_prob - min_gene_prob))
+
+
+def evaluate_invalid(evaluator, individuals):
+    # Score every individual whose fitness was invalidated, in one batch
+    invalid_ind = [ind for ind in individuals if not ind.fitness.valid]
+    with metrics.span('evaluation'):
+        fits = evaluator.evaluate_population(invalid_ind)
+        for fit, ind in zip(fits, invalid_ind):
+            ind.fitness.values = fit
+    metrics.count('evaluations', len(invalid_ind))
+    return len(invalid_ind)
+
+
+def select_survivors(individuals, k):
+    # (best k individuals, their penalties), best first, from one stable sort
+    # of the penalty array; ties keep their order, as with tools.selBest.
+    # The elites are simply the front of the result.
+    penalties = np.fromiter((ind.fitness.values[0] for ind in individuals), dtype=np.float64,
+                            count=len(individuals))
+    chosen = np.argsort(penalties, kind='stable')[:k]
+    return [individuals[index] for index in chosen.tolist()], penalties[chosen]
+
+
+def evolve(pop, toolbox, evaluator, num_generations=NUM_GENERATIONS, progress=None,
+           crossover_prob=CROSSOVER_PROB, mutation_prob=MUTATION_PROB, on_generation=None, verbose=True,
+           start_generation=0, stagnation_generations=STAGNATION_GENERATIONS, adaptive=True,
+           report_interval=REPORT_INTERVAL, best_penalty=None, last_improvement=None):
+    # Elitist generational loop: varAnd offspring, the best of parents +
+    # offspring survive, best first (each once: the old separate elite
+    # selection re-added copies of individuals that had already survived).
+    # on_generation(gen, pop, record) may adjust pop in place and returns
+    # True to stop early; record holds the min/avg/max penalty, the parents'
+    # diversity, the rates used, the best penalty so far and the generation
+    # it was reached ('best_penalty', 'last_improvement') and, on the first
+    # generation and every report_interval-th (0: never), the summed penalty
+    # breakdown ('penalties'), which is also when verbose runs print. A
+    # resumed run passes the number of generations already done as
+    # start_generation, with the best_penalty and last_improvement of the
+    # last one, and returns at once if that generation had ended the run.
+    # Stops early at penalty 0 or after stagnation_generations without
+    # improvement; adaptive (the default, as in solvers.GASolver) derives the
+    # rates from diversity each generation (see adapt_rates), adaptive=False
+    # keeps them fixed. Returns the final population.
+    population_size = len(pop)
+    evaluate_invalid(evaluator, pop)
+    if last_improvement is None:
+        last_improvement = start_generation
+    elif best_penalty == 0 or (stagnation_generations
+                               and start_generation - 1 - last_improvement >= stagnation_generations):
+        return pop
+    mutate = toolbox.mutate
+    for gen in range(start_generation, num_generations):
+        diversity = population_diversity(pop)
+        cxpb, mutpb, indpb = crossover_prob, mutation_prob, mutate.keywords['indpb']
+        if adaptive:
+            cxpb, mutpb, indpb = adapt_rates(diversity, len(pop[0]), crossover_prob, mutation_prob, indpb,
+                                             gen - last_improvement)
+            toolbox.register("mutate", mutate.func, **dict(mutate.keywords, indpb=indpb))
+        with metrics.span('variation'):
+            offspring = algorithms.varAnd(pop, toolbox, cxpb=cxpb, mutpb=mutpb)
+        evaluate_invalid(evaluator, offspring)
+
+        # Elitist replacement: the best of parents and offspring survive
+        combined_population = pop + offspring
+        with metrics.span('selection'):
+            pop, penalties = select_survivors(combined_population, population_size)
+        metrics.count('generations')
+
+        if best_penalty is None or penalties[0] < best_penalty:
+            best_penalty, last_improvement = penalties[0], gen
+        record = {'min': penalties[0], 'avg': penalties.mean(), 'max': penalties[-1], 'diversity': diversity,
+                  'crossover_prob': cxpb, 'mutation_prob': mutpb, 'gene_mutation_prob': indpb,
+                  'best_penalty': best_penalty, 'last_improvement': last_improvement}
+        if report_interval and (gen == start_generation or (gen + 1) % report_interval == 0):
+            # Penalty breakdown summed over parents and offspring
+            record['penalties'] = dict.fromkeys(PENALTY_KEYS, 0)
+            for ind in combined_population:
+                for key, value in getattr(ind, 'penalty_counters', {}).items():
+                    record['penalties'][key] += value
+            if verbose:
+                print(f"Generation {gen + 1}: min {record['min']:g}, avg {record['avg']:.1f}, "
+                      f"max {record['max']:g}, diversity {diversity:.3f}")
+                print("Penalty Contributions:")
+                for key, value in record['penalties'].items():
+                    print(f"  {key}: {value}")
+
+        if on_generation is not None and on_generation(gen, pop, record):
+            break
+
+        # Early stopping if an acceptable solution is found
+        if record['min'] == 0:
+            if verbose:
+                print("Optimal solution found.")
+            break
+
+        # ... or if the best penalty has stopped improving
+        if stagnation_generations and gen - last_improvement >= stagnation_generations:
+            if verbose:
+                print(f"No improvement in {stagnation_generations} generations.")
+            break
+
+        # Update progress
+        if progress is not None:
+            progress['message'] = f'Generation {gen + 1} completed.'
+            progress['percentage'] = int(((gen + 1) / num_generations) * 80) + 10  # Adjust percentage calculation as needed
+
+    toolbox.mutate = mutate  # leave the toolbox as it was given
+    return pop
+
+
+def run_ga(model, progress, evaluation='batch', workers=1, reserved_slots=None,
+           population_size=None, num_generations=NUM_GENERATIONS, on_generation=None, verbose=True,
+           warm_start=None, checkpoint_path=None, checkpoint_interval=CHECKPOINT_INTERVAL, resume=False,
+           **evolve_options):
+    # Single-population GA run; returns the best individual found.
+    # population_size=None sizes the population by the instance (see
+    # population_size_for); evolve_options go to evolve (rates,
+    # stagnation_generations, adaptive, report_interval). With a
+    # checkpoint_path the population, RNG and stagnation state are saved
+    # every checkpoint_interval generations (and when stopped early);
+    # resume=True continues from that checkpoint if there is one.
+    if population_size is None:
+        population_size = population_size_for(model)
+    evaluation = evaluation_for(model, evaluation, population_size)
+    toolbox, evaluator = make_toolbox(model, evaluation, workers, reserved_slots, warm_start)
+    state = load_checkpoint(checkpoint_path, model) if resume and checkpoint_path else None
+    try:
+        if state is None:
+            # Create initial population
+            with metrics.span('init_population'):
+                pop = init_population(toolbox, population_size)
+            start_generation = 0
+            resumed = {}
+            progress['message'] = 'Initializing genetic algorithm...'
+        else:
+            pop = [creator.Individual(genes) for genes in state['population']]
+            start_generation = state['generation']
+            resumed = {key: state[key] for key in ('best_penalty', 'last_improvement') if key in state}
+            restore_random_state(state)
+            progress['message'] = f'Resuming genetic algorithm after generation {start_generation}...'
+        progress['percentage'] = 10
+
+        def on_checkpoint(gen, pop, record):
+            stop = on_generation is not None and on_generation(gen, pop, record)
+            if checkpoint_path is not None and (stop or (gen + 1) % checkpoint_interval == 0):
+                save_checkpoint(checkpoint_path, model, pop, gen + 1, record['best_penalty'],
+                                record['last_improvement'])
+            return stop
+
+        pop = evolve(pop, toolbox, evaluator, num_generations, progress, on_generation=on_checkpoint,
+                     verbose=verbose, start_generation=start_generation, **resumed, **evolve_options)
+    finally:
+        if isinstance(evaluator, ParallelEvaluator):
+            evaluator.close()
+    return tools.selBest(pop, k=1)[0]
@@ -0,0 +1,231 @@
+import importlib.util
+import itertools
+import numpy as np
+import pandas as pd
+
+# Parser for the (possibly large) student sheets: pyarrow when installed,
+# pandas' C parser otherwise
+CSV_ENGINE = 'pyarrow' if importlib.util.find_spec('pyarrow') else 'c'
+
+# Columns of Instructors_Courses.csv the generator reads: kind of value and
+# whether every row needs one. Hours default to 0 and flags to False.
+COURSE_COLUMNS = {
+    'Batch': ('text', True),
+    'Course Number': ('text', True),
+    'Course Name': ('text', True),
+    'Program': ('text', True),
+    'Instructor-in-Charge': ('text', True),
+    'Section Number': ('text', False),
+    'Lecture Hours': ('hours', False),
+    'Lab Hours': ('hours', False),
+    'ROOM': ('text', False),
+    'CombinedProgram': ('flag', False),
+    'CombinedSection': ('flag', False),
+}
+ROLL_COLUMN = 'RollNumber'
+STUDENT_INFO_COLUMNS = ('No', ROLL_COLUMN, 'Name')  # every other column of a student sheet is a course number
+MAX_LISTED = 5  # examples quoted per problem in the report
+
+
+class ValidationReport:
+    # Problems found in the input files, as (sheet, message) pairs. Errors
+    # stop a run before any solver time is spent; warnings are reported and
+    # the run goes on.
+    def __init__(self, errors=(), warnings=()):
+        self.errors = [tuple(item) for item in errors]
+        self.warnings = [tuple(item) for item in warnings]
+
+    def error(self, sheet, message):
+        self.errors.append((sheet, message))
+
+    def warning(self, sheet, message):
+        self.warnings.append((sheet, message))
+
+    @property
+    def ok(self):
+        return not self.errors
+
+    def to_dict(self):
+        return {'errors': [list(item) for item in self.errors], 'warnings': [list(item) for item in self.warnings]}
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data['errors'], data['warnings'])
+
+    def raise_for_errors(self):
+        if self.errors:
+            raise ValueError("The input files have errors: "
+                             + ' '.join(f"{sheet}: {message}" for sheet, message in self.errors))
+
+
+def _lines(mask):
+    # CSV line numbers (header is line 1) of the True rows, a few quoted
+    rows = np.flatnonzero(np.asarray(mask)) + 2
+    listed = ', '.join(str(row) for row in rows[:MAX_LISTED])
+    return f"line {listed}" if len(rows) == 1 else f"lines {listed}" + (' ...' if len(rows) > MAX_LISTED else '')
+
+
+def _examples(values):
+    values = list(itertools.islice(values, MAX_LISTED + 1))
+    return ', '.join(str(value) for value in values[:MAX_LISTED]) + (' ...' if len(values) > MAX_LISTED else '')
+
+
+def program_matches(rolls, programs):
+    # rolls x programs matrix: whether each program appears in the roll
+    # number, upper-cased (the program as written). A student only joins
+    # the sections of a course offered to such a program; see
+    # timetable_generator.build_student_courses.
+    roll_upper = pd.Series(rolls, dtype=object).fillna('').astype(str).str.upper()
+    matches = np.zeros((len(roll_upper), len(programs)), dtype=bool)
+    for j, program in enumerate(programs):
+        matches[:, j] = roll_upper.str.contains(program, regex=False).to_numpy()
+    return matches
+
+
+def read_course_sheet(source, grid, report, sheet='Instructors_Courses'):
+    # Instructors_Courses.csv as a typed frame of the COURSE_COLUMNS (text
+    # stripped, hours int64, flags bool), or None when it cannot be used.
+    # Also checks that every instructor's week and every session length fit
+    # the time grid.
+    df = pd.read_csv(source, dtype=str, keep_default_na=False)
+    missing = [column for column in COURSE_COLUMNS if column not in df.columns]
+    if missing:
+        report.error(sheet, f"Missing columns: {', '.join(missing)}.")
+        return None
+    df = pd.DataFrame({column: [value.strip() for value in df[column].tolist()] for column in COURSE_COLUMNS},
+                      dtype=str)
+    for column, (kind, required) in COURSE_COLUMNS.items():
+        values = df[column]
+        if required and (values == '').any():
+            report.error(sheet, f"{column} is blank on {_lines(values == '')}.")
+        if kind == 'hours':
+            hours = pd.to_numeric(values.replace('', '0'), errors='coerce')
+            bad = hours.isna() | (hours < 0) | (hours % 1 != 0)
+            if bad.any():
+                report.error(sheet, f"{column} must be a whole number of hours on {_lines(bad)} "
+                                    f"(found {_examples(values[bad].unique())}).")
+            df[column] = hours.where(~bad, 0).astype(np.int64)
+        elif kind == 'flag':
+            flags = values.str.lower()
+            odd = ~flags.isin(['true', 'false', ''])
+            if odd.any():
+                report.warning(sheet, f"{column} should be True or False on {_lines(odd)}; read as False.")
+            df[column] = flags == 'true'
+
+    odd_labs = df['Lab Hours'] % grid.lab_duration != 0
+    if odd_labs.any():
+        report.warning(sheet, f"Lab Hours are not a multiple of the {grid.lab_duration}-period lab on "
+                              f"{_lines(odd_labs)}; the extra hours are not scheduled.")
+    _check_workloads(df, grid, report, sheet)
+    return df
+
+
+def _check_workloads(df, grid, report, sheet):
+    # Sessions that fit nowhere on the grid, and instructors with more
+    # periods than the week has
+    open_slots = [t for t, slot in enumerate(grid.slots) if slot not in grid.reserved]
+    lab_starts = grid.lab_start_ok()
+    for kind, duration, needed in (('lecture', grid.lecture_duration, df['Lecture Hours'] > 0),
+                                   ('lab', grid.lab_duration, df['Lab Hours'] >= grid.lab_duration)):
+        fits = any(len(grid.block(t, duration)) == duration and (kind == 'lecture' or lab_starts[t])
+                   for t in open_slots)
+        if needed.any() and not fits:
+            report.error(sheet, f"No {duration}-period {kind} fits anywhere in the time grid "
+                                f"(needed on {_lines(needed)}).")
+
+    periods = df['Lecture Hours'] + df['Lab Hours'] // grid.lab_duration * grid.lab_duration
+    load = periods.groupby(df['Instructor-in-Charge']).sum()
+    for instructor, total in load[load > len(open_slots)].items():
+        report.error(sheet, f"{instructor} teaches {total} periods a week but the time grid has only "
+                            f"{len(open_slots)} open slots.")
+
+
+def read_student_sheet(source, courses, report, sheet):
+    # A backlog/elective sheet (RollNumber plus one 0/1 column per course
+    # number) with numeric marks, or None when it cannot be used. courses:
+    # the frame from read_course_sheet (None skips the checks against it).
+    df = pd.read_csv(source, dtype={ROLL_COLUMN: str}, engine=CSV_ENGINE)
+    if ROLL_COLUMN not in df.columns:
+        report.error(sheet, f"Missing column {ROLL_COLUMN}.")
+        return None
+    course_columns = [column for column in df.columns if column not in STUDENT_INFO_COLUMNS]
+    dtypes = df.dtypes
+    for column in course_columns:
+        if not pd.api.types.is_numeric_dtype(dtypes[column]):
+            marks = pd.to_numeric(df[column], errors='coerce')
+            bad = marks.isna() & df[column].notna() & (df[column].astype(str).str.strip() != '')
+            if bad.any():
+                report.error(sheet, f"Column {column} must hold 1 for enrolled students on {_lines(bad)} "
+                                    f"(found {_examples(df[column][bad].unique())}).")
+            df[column] = marks
+    marks = df[course_columns].to_numpy(dtype=np.float64)
+    odd = ~np.isnan(marks) & (marks != 0) & (marks != 1)
+    if odd.any():
+        report.warning(sheet, f"Marks other than 1 or 0 are ignored on {_lines(odd.any(axis=1))}.")
+    unnamed = df[ROLL_COLUMN].isna() & (marks == 1).any(axis=1)
+    if unnamed.any():
+        report.warning(sheet, f"Rows without a {ROLL_COLUMN} are ignored: {_lines(unnamed)}.")
+    if courses is not None:
+        _check_enrollments(df, course_columns, marks == 1, courses, report, sheet)
+    return df
+
+
+def _check_enrollments(df, course_columns, marked, courses, report, sheet):
+    # Columns that name no course, and marks the program filter drops: a
+    # student only joins the sections of a course whose Program appears in
+    # their roll number. marked: rows x course_columns enrollment flags.
+    offered = {}
+    for course, program in zip(courses['Course Number'], courses['Program']):
+        offered.setdefault(course, set()).add(program)
+    duplicated = [column for column in course_columns if '.' in column and column.rsplit('.', 1)[0] in offered
+                  and column.rsplit('.', 1)[1].isdigit()]
+    unknown = [column for column in course_columns if column not in offered and column not in duplicated]
+    if duplicated:
+        report.warning(sheet, f"Course columns listed twice, later copies ignored: "
+                              f"{_examples(column.rsplit('.', 1)[0] for column in duplicated)}.")
+    if unknown:
+        report.warning(sheet, f"Columns that match no course number are ignored: {_examples(unknown)}.")
+
+    known = [column for column in course_columns if column in offered]
+    rolls = df[ROLL_COLUMN].to_numpy()
+    marked = marked[:, [j for j, column in enumerate(course_columns) if column in offered]]
+    marked[df[ROLL_COLUMN].isna().to_numpy()] = False
+    # One substring test per (roll number, distinct program), then a
+    # program x course incidence product
+    programs = sorted(set(courses['Program']))
+    in_roll = program_matches(rolls, programs)
+    offered_to = np.zeros((len(programs), len(known)), dtype=np.int64)
+    for j, column in enumerate(known):
+        offered_to[[programs.index(program) for program in offered[column]], j] = 1
+    matched = in_roll.astype(np.int64) @ offered_to > 0
+    dropped = marked & ~matched
+    if dropped.any():
+        rows, cols = np.nonzero(dropped)
+        examples = (f"{rolls[row]} in {known[col]}" for row, col in zip(rows, cols))
+        report.warning(sheet, f"{len(rows)} enrollments match no section offered to the student's program "
+                              f"and are ignored ({_examples(examples)}).")
+    unmatched = marked.any(axis=1) & ~(marked & matched).any(axis=1)
+    if unmatched.any():
+        report.warning(sheet, f"{int(unmatched.sum())} roll numbers keep no enrollment at all: "
+                              f"{_examples(rolls[unmatched])}.")
+
+
+def read_inputs(instructors_courses, backlog, elective, grid):
+    # The three input files (paths or file objects) as
+    # ((courses, backlog, elective) frames, ValidationReport). A frame is
+    # None when its sheet could not be read; the report then has errors.
+    report = ValidationReport()
+    sheets = [('Instructors_Courses', instructors_courses), ('Backlog', backlog), ('Elective', elective)]
+    frames = []
+    for sheet, source in sheets:
+        try:
+            if sheet == 'Instructors_Courses':
+                frames.append(read_course_sheet(source, grid, report))
+            else:
+                frames.append(read_student_sheet(source, frames[0], report, sheet))
+        except ValueError as e:
+            # pandas' parser errors (malformed rows, empty files) and decoding
+            # errors are ValueErrors
+            report.error(sheet, f"Cannot read the file: {e}")
+            frames.append(None)
+    return tuple(frames), report
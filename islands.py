@@ -0,0 +1,137 @@
+import multiprocessing
+import queue
+import random
+import time
+import traceback
+from deap import creator, tools
+from fitness import SharedModel
+from ga import (make_toolbox, init_population, evolve, evaluate_invalid, evaluation_for, POPULATION_SIZE,
+                NUM_GENERATIONS)
+
+# Island model defaults
+NUM_ISLANDS = 4
+MIGRATION_INTERVAL = 5
+NUM_MIGRANTS = 5
+
+
+def _island_main(index, shared, population_size, num_generations, migration_interval, num_migrants,
+                 evaluation, reserved_slots, warm_start, evolve_options, seed, inbox, outbox, reports, stop):
+    # Runs in its own process: evolves one sub-population and exchanges its
+    # best individuals with the next island on the ring
+    outbox.cancel_join_thread()  # the neighbour may already be gone at exit
+    try:
+        random.seed(seed)
+        model = shared.load()
+        toolbox, evaluator = make_toolbox(model, evaluation, reserved_slots=reserved_slots, warm_start=warm_start)
+        pop = init_population(toolbox, population_size)
+
+        def on_generation(gen, pop, record):
+            if (gen + 1) % migration_interval == 0:
+                emigrants = tools.selBest(pop, k=num_migrants)
+                outbox.put([list(ind) for ind in emigrants])
+                immigrants = []
+                while True:
+                    try:
+                        immigrants.extend(inbox.get_nowait())
+                    except queue.Empty:
+                        break
+                if immigrants:
+                    # Immigrants replace the worst individuals of this island
+                    newcomers = [toolbox.repair(creator.Individual(genes)) for genes in immigrants[-len(pop):]]
+                    evaluate_invalid(evaluator, newcomers)
+                    pop.sort(key=lambda ind: ind.fitness, reverse=True)
+                    pop[len(pop) - len(newcomers):] = newcomers
+            reports.put(('generation', index, gen + 1, record['min']))
+            return stop.is_set()
+
+        pop = evolve(pop, toolbox, evaluator, num_generations, on_generation=on_generation, verbose=False,
+                     **evolve_options)
+        best = tools.selBest(pop, k=1)[0]
+        reports.put(('done', index, list(best), best.fitness.values, best.penalty_counters))
+    except Exception:
+        reports.put(('error', index, traceback.format_exc()))
+
+
+def run_islands(model, progress, num_islands=NUM_ISLANDS, population_size=POPULATION_SIZE,
+                num_generations=NUM_GENERATIONS, migration_interval=MIGRATION_INTERVAL,
+                num_migrants=NUM_MIGRANTS, evaluation='batch', reserved_slots=None, cancel_event=None,
+                on_report=None, warm_start=None, time_limit=None, evolve_options=None):
+    # Evolve num_islands sub-populations (population_size split between them)
+    # in separate processes, migrating along a ring every migration_interval
+    # generations. Progress is aggregated across islands; returns the best
+    # individual found on any island. Setting cancel_event makes every island
+    # finish its current generation and report back. on_report receives
+    # {'step': slowest island's generation, 'min': best penalty} per report;
+    # returning True stops the islands like cancel_event.
+    # warm_start seeds every island (see ga.make_toolbox); evolve_options
+    # configure each island's ga.evolve. After time_limit seconds the islands
+    # are stopped like on cancel_event.
+    ctx = multiprocessing.get_context()
+    inboxes = [ctx.Queue() for _ in range(num_islands)]
+    reports = ctx.Queue()
+    stop = ctx.Event()
+    island_size = max(population_size // num_islands, num_migrants + 1)
+    evaluation = evaluation_for(model, evaluation, island_size * num_islands)
+    # Islands map the model's arrays from one file rather than each getting a copy
+    shared = SharedModel(model)
+
+    processes = []
+    for index in range(num_islands):
+        process = ctx.Process(
+            target=_island_main,
+            args=(index, shared, island_size, num_generations, migration_interval, num_migrants,
+                  evaluation, reserved_slots, warm_start, evolve_options or {}, random.randrange(2 ** 32),
+                  inboxes[index], inboxes[(index + 1) % num_islands], reports, stop),
+            daemon=True,
+        )
+        process.start()
+        processes.append(process)
+
+    progress['message'] = f'Initializing genetic algorithm on {num_islands} islands...'
+    progress['percentage'] = 10
+
+    start = time.perf_counter()
+    generations = [0] * num_islands
+    best_penalty = None
+    results = []
+    try:
+        while len(results) < num_islands:
+            if cancel_event is not None and cancel_event.is_set():
+                stop.set()
+            if time_limit is not None and time.perf_counter() - start >= time_limit:
+                stop.set()
+            try:
+                message = reports.get(timeout=1)
+            except queue.Empty:
+                continue
+            kind, index = message[0], message[1]
+            if kind == 'error':
+                raise RuntimeError(f"Island {index} failed:\n{message[2]}")
+            if kind == 'done':
+                results.append(message)
+                generations[index] = num_generations
+                # One island reaching a perfect schedule ends the whole run
+                if message[3][0] == 0:
+                    stop.set()
+                continue
+            generations[index] = message[2]
+            if best_penalty is None or message[3] < best_penalty:
+                best_penalty = message[3]
+            if on_report is not None and on_report({'step': min(generations), 'min': float(best_penalty)}):
+                stop.set()
+            progress['message'] = (f'Generation {min(generations)} completed on {num_islands} islands '
+                                   f'(best penalty {best_penalty:g}).')
+            progress['percentage'] = int(sum(generations) / (num_islands * num_generations) * 80) + 10
+    finally:
+        stop.set()
+        for process in processes:
+            process.join(timeout=5)
+            if process.is_alive():
+                process.terminate()
+        shared.close()
+
+    _, _, genes, fitness, penalty_counters = min(results, key=lambda result: result[3])
+    best = creator.Individual(genes)
+    best.fitness.values = fitness
+    best.penalty_counters = penalty_counters
+    return best
@@ -0,0 +1,190 @@
+import json
+import os
+import shutil
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from events import EventBus, EVENT_INTERVAL
+from metrics import Metrics
+
+# Job subsystem defaults
+MAX_WORKERS = 2  # jobs generating at the same time; later submissions wait in the queue
+RETENTION_SECONDS = 24 * 3600  # finished jobs and their files are kept this long
+MAX_FINISHED_JOBS = 50  # ... and at most this many of them
+
+FINISHED_STATES = ('completed', 'error', 'cancelled', 'interrupted')
+RESUMABLE_STATES = ('error', 'cancelled', 'interrupted')  # 'interrupted': the process stopped mid-run
+
+JOB_FILE = 'job.json'  # job record kept in the job folder, so jobs outlive the process
+
+
+class Job:
+    # One timetable generation request with its own upload and output
+    # folders, progress record, cancellation flag, event bus (closed when
+    # the job finishes) and metrics recorder. The record is saved to job.json on every status
+    # change; Job.load reads it back.
+    def __init__(self, root, options, event_interval=EVENT_INTERVAL, job_id=None):
+        self.id = job_id or uuid.uuid4().hex
+        self.folder = os.path.join(root, self.id)
+        self.upload_folder = os.path.join(self.folder, 'uploads')
+        self.output_folder = os.path.join(self.folder, 'outputs')
+        self.options = options
+        self.progress = {'status': 'queued', 'message': 'Waiting for a free worker...', 'percentage': 0}
+        self.cancel_event = threading.Event()
+        self.events = EventBus(event_interval)
+        self.metrics = Metrics()
+        self.created = time.time()
+        self.finished = None
+        self.future = None
+        if job_id is None:
+            os.makedirs(self.upload_folder)
+            os.makedirs(self.output_folder)
+
+    @property
+    def done(self):
+        return self.progress['status'] in FINISHED_STATES
+
+    def save(self):
+        record = {'options': self.options, 'progress': self.progress, 'created': self.created,
+                  'finished': self.finished}
+        path = os.path.join(self.folder, JOB_FILE)
+        with open(path + '.tmp', 'w') as f:
+            json.dump(record, f)
+        os.replace(path + '.tmp', path)
+
+    @classmethod
+    def load(cls, root, job_id, event_interval=EVENT_INTERVAL):
+        with open(os.path.join(root, job_id, JOB_FILE)) as f:
+            record = json.load(f)
+        job = cls(root, record['options'], event_interval, job_id)
+        job.progress = record['progress']
+        job.created = record['created']
+        job.finished = record['finished']
+        return job
+
+
+class JobManager:
+    # Bounded pool of generation workers. run(job) does the actual work and
+    # raises on failure; the manager keeps each job's progress status in step
+    # and removes finished jobs after the retention period (calling
+    # on_remove(job) for each). Jobs found in root at startup are listed
+    # again; those that were still queued or running become 'interrupted' and
+    # can be resumed.
+    def __init__(self, root, run, max_workers=MAX_WORKERS, retention_seconds=RETENTION_SECONDS,
+                 max_finished_jobs=MAX_FINISHED_JOBS, event_interval=EVENT_INTERVAL, on_remove=None):
+        self.root = os.path.abspath(root)
+        self.run = run
+        self.retention_seconds = retention_seconds
+        self.max_finished_jobs = max_finished_jobs
+        self.event_interval = event_interval
+        self.on_remove = on_remove
+        self.jobs = {}
+        self.lock = threading.Lock()
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='timetable-job')
+        os.makedirs(self.root, exist_ok=True)
+        for name in os.listdir(self.root):
+            self._restore(name)
+
+    def _restore(self, job_id):
+        # Folders without a readable job record are leftovers; remove them
+        try:
+            job = Job.load(self.root, job_id, self.event_interval)
+        except (OSError, ValueError, KeyError):
+            shutil.rmtree(os.path.join(self.root, job_id), ignore_errors=True)
+            return
+        if not job.done:
+            self._finish(job, 'interrupted', 'Timetable generation was interrupted; resume to continue.')
+        else:
+            job.events.close()
+        self.jobs[job.id] = job
+
+    def create(self, **options):
+        # New job with empty upload/output folders; call start() once the
+        # inputs are in place
+        self.cleanup()
+        job = Job(self.root, options, self.event_interval)
+        job.save()
+        with self.lock:
+            self.jobs[job.id] = job
+        return job
+
+    def start(self, job):
+        job.future = self.executor.submit(self._run, job)
+
+    def get(self, job_id):
+        with self.lock:
+            return self.jobs.get(job_id)
+
+    def list(self):
+        with self.lock:
+            return sorted(self.jobs.values(), key=lambda job: job.created, reverse=True)
+
+    def cancel(self, job_id):
+        # Queued jobs never start; running ones stop at the solver's next check
+        job = self.get(job_id)
+        if job is None or job.done:
+            return job
+        job.cancel_event.set()
+        if job.future is None or job.future.cancel():
+            self._finish(job, 'cancelled', 'Timetable generation cancelled.')
+        else:
+            job.progress['message'] = 'Cancelling...'
+        return job
+
+    def resume(self, job_id):
+        # Queue a cancelled, failed or interrupted job again with its own
+        # inputs; run(job) sees options['resume'] and picks up the job's
+        # checkpoint. Other jobs are returned unchanged.
+        with self.lock:
+            job = self.jobs.get(job_id)
+            if job is None or job.progress['status'] not in RESUMABLE_STATES:
+                return job
+            job.options['resume'] = True
+            job.cancel_event = threading.Event()
+            job.events = EventBus(self.event_interval)
+            job.metrics = Metrics()
+            job.finished = None
+            job.progress.update(status='queued', message='Waiting for a free worker...', percentage=0)
+        job.save()
+        self.start(job)
+        return job
+
+    def _run(self, job):
+        if job.cancel_event.is_set():
+            self._finish(job, 'cancelled', 'Timetable generation cancelled.')
+            return
+        job.progress.update(status='running', message='Starting timetable generation...', percentage=0)
+        job.save()
+        try:
+            self.run(job)
+        except Exception as e:
+            self._finish(job, 'error', f"An error occurred: {str(e)}")
+            return
+        if job.cancel_event.is_set():
+            self._finish(job, 'cancelled', 'Timetable generation cancelled.')
+        else:
+            self._finish(job, 'completed', 'Timetable generation completed.', 100)
+
+    def _finish(self, job, status, message, percentage=0):
+        job.progress.update(status=status, message=message, percentage=percentage)
+        job.finished = time.time()
+        job.save()
+        job.events.close()
+
+    def cleanup(self):
+        # Drop finished jobs past the retention period, and the oldest ones
+        # beyond max_finished_jobs, together with their files
+        now = time.time()
+        with self.lock:
+            finished = sorted((job for job in self.jobs.values() if job.done and job.finished is not None),
+                              key=lambda job: job.finished, reverse=True)
+            expired = [job for count, job in enumerate(finished, 1)
+                       if count > self.max_finished_jobs or now - job.finished > self.retention_seconds]
+            for job in expired:
+                del self.jobs[job.id]
+        for job in expired:
+            if self.on_remove is not None:
+                self.on_remove(job)
+            shutil.rmtree(job.folder, ignore_errors=True)
+        return len(expired)
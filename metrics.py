@@ -0,0 +1,139 @@
+import cProfile
+import io
+import json
+import os
+import pstats
+import threading
+import time
+from contextlib import contextmanager
+
+METRICS_FILE = 'metrics.json'  # written next to every run's outputs
+PROFILE_FILE = 'profile.pstats'
+PROFILE_LINES = 40  # functions listed in the text summary of a profile
+
+# Recorder of the run executing on this thread (see recording)
+_local = threading.local()
+# Held by the one run being profiled: the profiler hooks are process-wide
+# (sys.monitoring from Python 3.12), so two cannot run at once
+_profile_lock = threading.Lock()
+
+
+class Metrics:
+    # Timed spans (count, total and longest duration per name) and counters
+    # of one run. Code records into whichever Metrics is active on its thread
+    # through the module functions span() and count(), so instrumented
+    # functions need no extra parameter and cost almost nothing when no run
+    # is recording.
+    def __init__(self):
+        self.spans = {}
+        self.counters = {}
+        self.started = time.time()
+        self.lock = threading.Lock()
+
+    def add_span(self, name, seconds):
+        with self.lock:
+            stats = self.spans.setdefault(name, {'count': 0, 'total_seconds': 0.0, 'max_seconds': 0.0})
+            stats['count'] += 1
+            stats['total_seconds'] += seconds
+            stats['max_seconds'] = max(stats['max_seconds'], seconds)
+
+    def count(self, name, value=1):
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def set(self, name, value):
+        with self.lock:
+            self.counters[name] = value
+
+    def snapshot(self):
+        # JSON-friendly copy, with evaluations per second of the GA's
+        # evaluation span when there was one
+        with self.lock:
+            spans = {name: dict(stats) for name, stats in self.spans.items()}
+            counters = dict(self.counters)
+        rates = {}
+        evaluation = spans.get('evaluation')
+        if evaluation and evaluation['total_seconds'] > 0 and 'evaluations' in counters:
+            rates['evaluations_per_second'] = counters['evaluations'] / evaluation['total_seconds']
+        return {'started': self.started, 'elapsed_seconds': time.time() - self.started, 'spans': spans,
+                'counters': counters, 'rates': rates}
+
+    def write(self, path):
+        tmp_path = f'{path}.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(self.snapshot(), f, indent=2)
+        os.replace(tmp_path, path)
+
+
+def active():
+    return getattr(_local, 'metrics', None)
+
+
+@contextmanager
+def recording(metrics):
+    # Make metrics the recorder of this thread for the duration of the block
+    previous = active()
+    _local.metrics = metrics
+    try:
+        yield metrics
+    finally:
+        _local.metrics = previous
+
+
+@contextmanager
+def span(name):
+    metrics = active()
+    if metrics is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        metrics.add_span(name, time.perf_counter() - start)
+
+
+def count(name, value=1):
+    metrics = active()
+    if metrics is not None:
+        metrics.count(name, value)
+
+
+def set_value(name, value):
+    metrics = active()
+    if metrics is not None:
+        metrics.set(name, value)
+
+
+@contextmanager
+def profiling(path):
+    # cProfile the block into path, plus a text summary of the most expensive
+    # functions next to it (path + '.txt'). Used around a job's run, on the
+    # job's thread, which does the whole search; work done in worker
+    # processes (island processes, fitness.ParallelEvaluator) is not
+    # profiled; from Python 3.12 the profile can also pick up other jobs'
+    # threads. Only one run is profiled at a time: while another is, the
+    # block runs unprofiled with a warning (counted as 'profile_skipped').
+    # No-op when path is None.
+    if path is None:
+        yield
+        return
+    if not _profile_lock.acquire(blocking=False):
+        print("Warning: another run is being profiled; this run is not.")
+        set_value('profile_skipped', 1)
+        yield
+        return
+    try:
+        profile = cProfile.Profile()
+        profile.enable()
+        try:
+            yield
+        finally:
+            profile.disable()
+            profile.dump_stats(path)
+            summary = io.StringIO()
+            pstats.Stats(profile, stream=summary).sort_stats('cumulative').print_stats(PROFILE_LINES)
+            with open(f'{path}.txt', 'w') as f:
+                f.write(summary.getvalue())
+    finally:
+        _profile_lock.release()
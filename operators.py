@@ -0,0 +1,51 @@
+import random
+
+
+def _mark_changed(individual, position):
+    # Remember which genes moved since the individual was last evaluated, so the
+    # incremental evaluator only has to revisit those sessions
+    changed = getattr(individual, 'changed_positions', None)
+    if changed is None:
+        changed = individual.changed_positions = set()
+    changed.add(position)
+
+
+def mut_domain(individual, domains, indpb):
+    # Like tools.mutUniformInt, but each gene is redrawn from its session's
+    # domain (see constraints.SessionDomains), so labs stay on valid starts
+    for i in range(len(individual)):
+        if random.random() < indpb:
+            individual[i] = random.choice(domains.slots[i])
+    return individual,
+
+
+def mut_domain_tracked(individual, domains, indpb):
+    # Same draws as mut_domain, but records the mutated positions
+    for i in range(len(individual)):
+        if random.random() < indpb:
+            value = random.choice(domains.slots[i])
+            if individual[i] != value:
+                individual[i] = value
+                _mark_changed(individual, i)
+    return individual,
+
+
+def repair(individual, domains, track=False):
+    # Move every gene that fell outside its domain (e.g. carried over from an
+    # older schedule or another island) back onto a random allowed slot
+    for i in domains.violations(individual):
+        individual[i] = domains.sample(i)
+        if track:
+            _mark_changed(individual, i)
+    return individual
+
+
+def cx_uniform_tracked(ind1, ind2, indpb):
+    # Same draws as tools.cxUniform, but records the swapped positions
+    for i in range(min(len(ind1), len(ind2))):
+        if random.random() < indpb:
+            if ind1[i] != ind2[i]:
+                ind1[i], ind2[i] = ind2[i], ind1[i]
+                _mark_changed(ind1, i)
+                _mark_changed(ind2, i)
+    return ind1, ind2
@@ -0,0 +1,142 @@
+import hashlib
+import json
+import os
+import tempfile
+import zipfile
+from collections import defaultdict
+import numpy as np
+from fitness import ConflictModel
+import metrics
+from sessions import SessionTable
+from timegrid import TimeGrid
+
+# Bump whenever load_problem or ConflictModel change what they build from the
+# same CSVs: entries written by another version are ignored and evicted
+CACHE_VERSION = 4
+
+# On-disk bounds; the least recently used entries are removed first
+MAX_ENTRIES = 16
+MAX_BYTES = 512 * 1024 * 1024
+
+
+def input_key(paths, settings=None):
+    # Content hash of the input files (names and timestamps do not matter),
+    # so re-uploading the same CSVs hits the cache, and of the JSON-friendly
+    # settings they are compiled with (the time grid)
+    digest = hashlib.sha256(f'v{CACHE_VERSION}'.encode())
+    digest.update(json.dumps(settings, sort_keys=True).encode() + b'\0')
+    for path in paths:
+        digest.update(str(os.path.getsize(path)).encode() + b'\0')
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b''):
+                digest.update(chunk)
+    return digest.hexdigest()
+
+
+def save_problem(path, problem, model):
+    # One .npz per problem: the model's and the session table's arrays plus
+    # everything else as a JSON metadata string. Written to a temporary file and renamed into place so
+    # concurrent runs never read a half-written entry.
+    arrays, model_meta = model.to_arrays()
+    session_arrays, session_labels = problem['course_sessions'].to_arrays()
+    meta = {
+        'version': CACHE_VERSION,
+        'model': model_meta,
+        'time_grid': problem['time_grid'].to_config(),
+        'session_labels': session_labels,
+        'student_courses': [[roll, list(sessions)] for roll, sessions in problem['student_courses'].items()],
+        'batch_students': [[list(key), students] for key, students in problem['batch_students'].items()],
+        'validation': problem['validation'],
+    }
+    folder = os.path.dirname(path) or '.'
+    fd, tmp_path = tempfile.mkstemp(dir=folder, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            np.savez(f, meta=np.array(json.dumps(meta)), **{f'model.{name}': a for name, a in arrays.items()},
+                     **{f'sessions.{name}': a for name, a in session_arrays.items()})
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+def read_problem(path):
+    # Inverse of save_problem: (problem, model), or None for an entry of
+    # another CACHE_VERSION
+    with np.load(path, allow_pickle=False) as data:
+        meta = json.loads(str(data['meta']))
+        if meta.get('version') != CACHE_VERSION:
+            return None
+        arrays = {name[len('model.'):]: data[name] for name in data.files if name.startswith('model.')}
+        session_arrays = {name[len('sessions.'):]: data[name] for name in data.files if name.startswith('sessions.')}
+    model = ConflictModel.from_arrays(arrays, meta['model'])
+
+    student_courses = {roll: set(sessions) for roll, sessions in meta['student_courses']}
+    course_students = defaultdict(set)
+    for student, courses in student_courses.items():
+        for course_id in courses:
+            course_students[course_id].add(student)
+    batch_students = defaultdict(list)
+    for key, students in meta['batch_students']:
+        batch_students[tuple(key)] = students
+
+    grid = TimeGrid.from_config(meta['time_grid'])
+    problem = {
+        'days': grid.days,
+        'times': grid.periods,
+        'time_grid': grid,
+        'time_slot_indices': model.time_slot_indices,
+        'num_time_slots': model.num_time_slots,
+        'course_sessions': SessionTable.from_arrays(session_arrays, meta['session_labels']),
+        'student_courses': student_courses,
+        'course_students': course_students,
+        'batch_students': batch_students,
+        'validation': meta['validation'],
+    }
+    return problem, model
+
+
+def evict(folder, max_entries=MAX_ENTRIES, max_bytes=MAX_BYTES):
+    # Remove least recently used entries (by mtime, refreshed on every hit)
+    # until at most max_entries files and max_bytes remain
+    entries = []
+    for name in os.listdir(folder):
+        if name.endswith('.npz'):
+            try:
+                stat = os.stat(os.path.join(folder, name))
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, name))
+    entries.sort(reverse=True)
+    total = 0
+    for count, (_, size, name) in enumerate(entries, 1):
+        total += size
+        if count > max_entries or total > max_bytes:
+            try:
+                os.remove(os.path.join(folder, name))
+            except FileNotFoundError:
+                pass
+
+
+def load_or_compile(paths, folder, compile_problem, max_entries=MAX_ENTRIES, max_bytes=MAX_BYTES, settings=None):
+    # (problem, model) for the given input files: read from the cache folder
+    # when these exact contents were compiled before with the same settings,
+    # otherwise built with compile_problem() and stored. Unreadable entries
+    # count as misses.
+    os.makedirs(folder, exist_ok=True)
+    path = os.path.join(folder, input_key(paths, settings) + '.npz')
+    if os.path.exists(path):
+        try:
+            cached = read_problem(path)
+        except (OSError, ValueError, KeyError, zipfile.BadZipFile):
+            cached = None
+        if cached is not None:
+            os.utime(path)
+            metrics.count('problem_cache_hits')
+            return cached
+
+    metrics.count('problem_cache_misses')
+    problem, model = compile_problem()
+    save_problem(path, problem, model)
+    evict(folder, max_entries, max_bytes)
+    return problem, model
@@ -0,0 +1,106 @@
+import math
+import random
+from deap import creator
+from constraints import conflict_graph, greedy_individual
+from solvers import LocalSearchSolver
+
+# Minimal-perturbation rescheduling defaults
+MOVE_PENALTY = 3  # per session placed away from its previous slot; above a room clash, below an instructor clash
+RESCHEDULE_ITERATIONS = 20000
+
+
+def blocked_slots(problem, blackouts):
+    # {session index: slot indices} for (instructor, day, time) blackouts:
+    # every session of that instructor is kept off that hour. Raises
+    # ValueError for instructors or hours the inputs do not have.
+    slot_by_day_time = {slot: idx for idx, slot in problem['time_slot_indices'].items()}
+    sessions_by_instructor = {}
+    for session, instructor in enumerate(problem['course_sessions'].column('instructor')):
+        sessions_by_instructor.setdefault(instructor, []).append(session)
+    blocked = {}
+    for instructor, day, time in blackouts:
+        if instructor not in sessions_by_instructor:
+            raise ValueError(f"Unknown instructor in blackouts: {instructor}")
+        if (day, time) not in slot_by_day_time:
+            raise ValueError(f"Unknown time slot in blackouts: {day} {time}")
+        for session in sessions_by_instructor[instructor]:
+            blocked.setdefault(session, set()).add(slot_by_day_time[(day, time)])
+    return blocked
+
+
+class RescheduleSolver(LocalSearchSolver):
+    # Repair an earlier schedule after a change instead of solving afresh.
+    # previous ({session: slot}, e.g. from checkpoint.remap_schedule) pins
+    # every session whose slot is still allowed; the affected ones (new
+    # sessions, and those whose slot is now blocked or reserved) are placed
+    # greedily around them. Annealing then moves only the affected sessions
+    # and their conflict neighbours, and every session left away from its
+    # previous slot costs move_penalty, so the rest of the timetable stays
+    # as it was. The returned individual is scored without that cost and
+    # carries the moved sessions as `moved`.
+    name = 'reschedule'
+    label = 'Minimal-perturbation rescheduling'
+    max_iterations = RESCHEDULE_ITERATIONS
+    initial_temperature = 5.0
+    final_temperature = 0.05
+
+    def __init__(self, model, previous, blocked=None, move_penalty=MOVE_PENALTY, **options):
+        super().__init__(model, blocked=blocked, **options)
+        self.previous = previous
+        self.move_penalty = move_penalty
+        self.neighbours = conflict_graph(model)
+        self.affected = [s for s in range(model.num_sessions)
+                         if not self.domains.mask[s, previous.get(s, model.num_time_slots)]]
+        free = set(self.affected)
+        for s in self.affected:
+            free |= self.neighbours[s]
+        self.movable = sorted(s for s in free if len(self.domains.slots[s]) > 1)
+
+    def _start_point(self):
+        affected = set(self.affected)
+        fixed = {s: slot for s, slot in self.previous.items() if s not in affected}
+        current = creator.Individual(greedy_individual(self.model, self.domains, self.neighbours, fixed=fixed))
+        self.evaluator.evaluate(current)
+        return current
+
+    def _moved(self, session, slot):
+        previous = self.previous.get(session)
+        return previous is not None and slot != previous
+
+    def solve(self, progress):
+        self._begin()
+        evaluator = self.evaluator
+        current = self._start_point()
+        moves = sum(self._moved(s, slot) for s, slot in enumerate(current))
+        penalty = evaluator.penalty(current)
+        cost = penalty + self.move_penalty * moves
+        best_genes, best_cost, best_penalty = list(current), cost, penalty
+        self._record(penalty)
+        cooling = (self.final_temperature / self.initial_temperature) ** (1.0 / self.max_iterations)
+        temperature = self.initial_temperature
+
+        for iteration in range(self.max_iterations):
+            if best_cost <= self.target_penalty or self._should_stop() or not self.movable:
+                break
+            session = random.choice(self.movable)
+            old = current[session]
+            new = self.domains.sample(session)
+            if new != old:
+                candidate = evaluator.move(current, session, new)
+                candidate_moves = moves - self._moved(session, old) + self._moved(session, new)
+                delta = candidate + self.move_penalty * candidate_moves - cost
+                if delta <= 0 or random.random() < math.exp(-delta / temperature):
+                    penalty, moves = candidate, candidate_moves
+                    cost = penalty + self.move_penalty * moves
+                    if cost < best_cost:
+                        best_genes, best_cost, best_penalty = list(current), cost, penalty
+                        self._record(best_penalty)
+                else:
+                    evaluator.move(current, session, old)
+            temperature *= cooling
+            if iteration % 1000 == 0:
+                self._report(progress, iteration, best_penalty, penalty, current)
+
+        best = self._individual(best_genes)
+        best.moved = [s for s, slot in enumerate(best_genes) if self._moved(s, slot)]
+        return best
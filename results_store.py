@@ -0,0 +1,149 @@
+import json
+import os
+import sqlite3
+import threading
+from collections import OrderedDict
+from contextlib import closing
+from export import named_timetables
+
+# File written next to the Excel exports of every run
+RESULTS_FILENAME = 'timetables.sqlite'
+
+# Rendered HTML tables kept in memory, across all jobs
+RENDER_CACHE_SIZE = 256
+
+SCHEMA = '''
+CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+CREATE TABLE timetables (id INTEGER PRIMARY KEY, kind TEXT NOT NULL, name TEXT NOT NULL, UNIQUE (kind, name));
+CREATE TABLE entries (
+    timetable_id INTEGER NOT NULL REFERENCES timetables (id),
+    position INTEGER NOT NULL,
+    session_id TEXT, course_id TEXT, course_name TEXT, instructor TEXT,
+    batch TEXT, program TEXT, section TEXT, day TEXT, time TEXT, room TEXT
+);
+CREATE INDEX entries_by_timetable ON entries (timetable_id, position);
+'''
+
+ENTRY_COLUMNS = ('session_id', 'course_id', 'course_name', 'instructor', 'batch', 'program', 'section', 'day',
+                 'room')
+# Keys of the entries build_timetables makes, per kind of timetable
+ENTRY_KEYS = {
+    'batch': ('course_id', 'session_id', 'course_name', 'instructor', 'day', 'times', 'room'),
+    'instructor': ('course_id', 'session_id', 'course_name', 'batch', 'program', 'section', 'day', 'times', 'room'),
+    'student': ('course_id', 'session_id', 'course_name', 'instructor', 'day', 'times', 'room'),
+}
+
+
+def write_results(path, batch_timetables, instructor_timetables, student_timetables, days, times):
+    # Store every timetable as rows of (timetable, session, day, time, room,
+    # ...), one row per occupied time, indexed by (kind, name): 'batch',
+    # 'instructor' or 'student' and the batch name, instructor or roll number.
+    # Built in a temporary file that then replaces any earlier results, so a
+    # rerun into the same folder works and readers never see a partial one.
+    timetables = named_timetables(batch_timetables, instructor_timetables, student_timetables)
+    tmp_path = path + '.tmp'
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+    with closing(sqlite3.connect(tmp_path)) as conn:
+        with conn:
+            conn.executescript(SCHEMA)
+            conn.executemany('INSERT INTO meta VALUES (?, ?)',
+                             [('days', json.dumps(list(days))), ('times', json.dumps(list(times)))])
+            rows = []
+            for timetable_id, (kind, name, schedule) in enumerate(timetables):
+                conn.execute('INSERT INTO timetables VALUES (?, ?, ?)', (timetable_id, kind, name))
+                for position, entry in enumerate(schedule):
+                    values = [entry.get(column) for column in ENTRY_COLUMNS]
+                    for time in entry['times']:
+                        rows.append((timetable_id, position, *values[:-1], time, values[-1]))
+            conn.executemany('INSERT INTO entries VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)', rows)
+    os.replace(tmp_path, path)
+
+
+class ResultStore:
+    # Read side of write_results; opened per request (read-only)
+    def __init__(self, path):
+        self.path = path
+
+    def _connect(self):
+        return closing(sqlite3.connect(f'file:{self.path}?mode=ro', uri=True))
+
+    def names(self, kind):
+        with self._connect() as conn:
+            return [name for (name,) in conn.execute('SELECT name FROM timetables WHERE kind = ? ORDER BY name',
+                                                     (kind,))]
+
+    def grid_parameters(self):
+        with self._connect() as conn:
+            meta = dict(conn.execute('SELECT key, value FROM meta'))
+        return json.loads(meta['days']), json.loads(meta['times'])
+
+    def entries(self, kind, name):
+        # Schedule entries of one timetable in the shape build_timetables
+        # produces ('times' regrouped per entry), or None if it does not exist
+        with self._connect() as conn:
+            row = conn.execute('SELECT id FROM timetables WHERE kind = ? AND name = ?', (kind, name)).fetchone()
+            if row is None:
+                return None
+            cursor = conn.execute(
+                'SELECT position, course_id, course_name, instructor, batch, program, section, day, time, room '
+                'FROM entries WHERE timetable_id = ? ORDER BY position, rowid', row)
+            entries = {}
+            for position, course_id, course_name, instructor, batch, program, section, day, time, room in cursor:
+                entry = entries.get(position)
+                if entry is None:
+                    entries[position] = {'course_id': course_id, 'course_name': course_name,
+                                         'instructor': instructor, 'batch': batch, 'program': program,
+                                         'section': section, 'day': day, 'times': [time], 'room': room}
+                else:
+                    entry['times'].append(time)
+            return list(entries.values())
+
+    def timetables(self):
+        # Every timetable with its entries as build_timetables made them, in
+        # the (batch, instructor, student) dicts export_timetables takes and
+        # the order they were written; batch timetables are keyed by name
+        with self._connect() as conn:
+            timetables = {kind: {} for kind in ENTRY_KEYS}
+            by_id = {}
+            for timetable_id, kind, name in conn.execute('SELECT id, kind, name FROM timetables ORDER BY id'):
+                by_id[timetable_id] = (ENTRY_KEYS[kind], timetables[kind].setdefault(name, {}))
+            cursor = conn.execute(f'SELECT timetable_id, position, {", ".join(ENTRY_COLUMNS)}, time '
+                                  'FROM entries ORDER BY timetable_id, position, rowid')
+            for timetable_id, position, *values, time in cursor:
+                keys, entries = by_id[timetable_id]
+                entry = entries.get(position)
+                if entry is None:
+                    row = dict(zip(ENTRY_COLUMNS, values), times=[])
+                    entries[position] = entry = {key: row[key] for key in keys}
+                entry['times'].append(time)
+        return tuple({name: list(entries.values()) for name, entries in timetables[kind].items()}
+                     for kind in ENTRY_KEYS)
+
+
+class RenderCache:
+    # Thread-safe LRU of rendered pages keyed by (job_id, ...); a job's
+    # entries are dropped together when the job goes away
+    def __init__(self, max_size=RENDER_CACHE_SIZE):
+        self.max_size = max_size
+        self.items = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            value = self.items.get(key)
+            if value is not None:
+                self.items.move_to_end(key)
+            return value
+
+    def put(self, key, value):
+        with self.lock:
+            self.items[key] = value
+            self.items.move_to_end(key)
+            while len(self.items) > self.max_size:
+                self.items.popitem(last=False)
+
+    def invalidate(self, job_id):
+        with self.lock:
+            for key in [key for key in self.items if key[0] == job_id]:
+                del self.items[key]
@@ -0,0 +1,105 @@
+import numpy as np
+import pandas as pd
+
+ROOM_KINDS = ('lecture', 'lab')  # values of the Type column; blank means the room suits both
+
+
+class RoomInventory:
+    # Rooms available to allocate, ordered by capacity (smallest first) so
+    # that in a bitset of rooms the lowest set bit is the tightest fit. Sets
+    # of rooms are Python ints with bit i standing for names[i].
+    def __init__(self, names, capacities, kinds):
+        order = sorted(range(len(names)), key=lambda i: capacities[i])
+        self.names = [names[i] for i in order]
+        self.capacity = np.array([capacities[i] for i in order], dtype=np.float64)
+        self.index = {name: i for i, name in enumerate(self.names)}
+        self.all = (1 << len(self.names)) - 1
+        # Rooms usable by lectures and by labs
+        kinds = [kinds[i] for i in order]
+        self.kind_mask = {kind: sum(1 << i for i, k in enumerate(kinds) if k in ('', kind)) for kind in ROOM_KINDS}
+
+    def __len__(self):
+        return len(self.names)
+
+    @classmethod
+    def from_csv(cls, path):
+        # Rooms.csv: Room, and optionally Capacity (blank: unlimited) and Type
+        # ('lecture', 'lab' or blank for both). Raises ValueError on bad rows.
+        df = pd.read_csv(path, dtype=str, keep_default_na=False)
+        if 'Room' not in df.columns:
+            raise ValueError("The room list needs a 'Room' column.")
+        names, capacities, kinds = [], [], []
+        for number, row in enumerate(df.to_dict('records'), 2):
+            name = row['Room'].strip()
+            if not name:
+                continue
+            if name in names:
+                raise ValueError(f"Room {name} is listed twice (line {number}).")
+            capacity = row.get('Capacity', '').strip()
+            try:
+                capacity = float(capacity) if capacity else np.inf
+            except ValueError:
+                raise ValueError(f"Capacity of room {name} is not a number (line {number}).")
+            kind = row.get('Type', '').strip().lower()
+            if kind and kind not in ROOM_KINDS:
+                raise ValueError(f"Type of room {name} must be one of {', '.join(ROOM_KINDS)} or blank "
+                                 f"(line {number}).")
+            names.append(name)
+            capacities.append(capacity)
+            kinds.append(kind)
+        return cls(names, capacities, kinds)
+
+    @classmethod
+    def from_sessions(cls, course_sessions):
+        # Without a room list: every room named in the course CSV, of
+        # unlimited capacity and suitable for anything
+        names = [room for room in course_sessions.labels['room'] if room]
+        return cls(names, [np.inf] * len(names), [''] * len(names))
+
+    def fitting(self, size):
+        # Rooms that seat at least size students
+        smaller = int(np.searchsorted(self.capacity, size, side='left'))
+        return self.all & ~((1 << smaller) - 1)
+
+
+def session_sizes(model):
+    # Students attending each session: the members of every student class
+    # (regular batch students and backlog/elective enrollments) it serves
+    return np.array([int(model.student_group_sizes[groups].sum()) for groups in model.session_groups],
+                    dtype=np.int64)
+
+
+def allocate_rooms(model, course_sessions, genes, inventory):
+    # Room label per session for the schedule genes, chosen slot by slot from
+    # per-slot bitsets of free rooms: the session's requested room when it is
+    # free, of the right kind and large enough, otherwise the smallest such
+    # room. Larger sessions go first within a slot; a session longer than one
+    # period needs the same room for all of them. Returns (labels, sessions left in their
+    # requested room because nothing fitted); unscheduled sessions keep
+    # their requested room too.
+    n_slots = model.num_time_slots
+    _, _, _, scheduled, first, cover = model.placements(np.asarray(genes, dtype=np.int64).reshape(1, -1))
+    scheduled, first, cover = scheduled[0], first[0].tolist(), np.stack(cover)[:, 0].T.tolist()
+    sizes = session_sizes(model)
+    requested = course_sessions.column('room')
+    labels = list(requested)
+    is_lab = model.is_lab.tolist()
+
+    free = [inventory.all] * n_slots
+    order = sorted(np.flatnonzero(scheduled).tolist(), key=lambda s: (first[s], -sizes[s]))
+    unplaced = []
+    for s in order:
+        slots = [t for t in cover[s] if t < n_slots]
+        candidates = inventory.kind_mask['lab' if is_lab[s] else 'lecture'] & inventory.fitting(sizes[s])
+        for t in slots:
+            candidates &= free[t]
+        if not candidates:
+            unplaced.append(s)
+            continue
+        room = inventory.index.get(requested[s])
+        if room is None or not candidates >> room & 1:
+            room = (candidates & -candidates).bit_length() - 1
+        for t in slots:
+            free[t] &= ~(1 << room)
+        labels[s] = inventory.names[room]
+    return labels, unplaced
@@ -0,0 +1,109 @@
+import numpy as np
+
+# Bits of SessionTable.flags
+LAB = 1
+COMBINED_PROGRAM = 2
+COMBINED_SECTION = 4
+
+# Text columns, each stored as int32 codes into a list of distinct values
+TEXT_COLUMNS = ('session_id', 'course_id', 'batch', 'name', 'program', 'instructor', 'room', 'section')
+
+
+class SessionTable:
+    # Course sessions as columns: an int32 code array per text column
+    # (values interned in order of first appearance, so codes double as the
+    # dense ids the conflict model uses), a duration array and a flag bitset.
+    # Indexing or iterating yields Session views onto the columns.
+    def __init__(self, codes, labels, duration, flags):
+        self.codes = codes
+        self.labels = labels
+        self.duration = duration
+        self.flags = flags
+
+    @classmethod
+    def from_records(cls, records):
+        # Build from session dicts with the TEXT_COLUMNS plus 'duration',
+        # 'is_lab', 'combined_program' and 'combined_section'
+        ids = {column: {} for column in TEXT_COLUMNS}
+        codes = {column: [] for column in TEXT_COLUMNS}
+        duration, flags = [], []
+        for record in records:
+            for column in TEXT_COLUMNS:
+                codes[column].append(ids[column].setdefault(record[column], len(ids[column])))
+            duration.append(record['duration'])
+            flags.append(LAB * bool(record['is_lab']) | COMBINED_PROGRAM * bool(record['combined_program'])
+                         | COMBINED_SECTION * bool(record['combined_section']))
+        return cls({column: np.array(values, dtype=np.int32) for column, values in codes.items()},
+                   {column: list(values) for column, values in ids.items()},
+                   np.array(duration, dtype=np.int8), np.array(flags, dtype=np.uint8))
+
+    def __len__(self):
+        return len(self.flags)
+
+    def __getitem__(self, index):
+        if not -len(self) <= index < len(self):
+            raise IndexError(index)
+        return Session(self, index % len(self))
+
+    def __iter__(self):
+        return (Session(self, index) for index in range(len(self)))
+
+    def column(self, name):
+        # Values of one text column, one per session
+        labels = self.labels[name]
+        return [labels[code] for code in self.codes[name].tolist()]
+
+    def with_column(self, name, values):
+        # Copy with one text column replaced by new values (one per session)
+        ids = {}
+        codes = dict(self.codes)
+        codes[name] = np.array([ids.setdefault(value, len(ids)) for value in values], dtype=np.int32)
+        labels = dict(self.labels)
+        labels[name] = list(ids)
+        return SessionTable(codes, labels, self.duration, self.flags)
+
+    @property
+    def is_lab(self):
+        return (self.flags & LAB) != 0
+
+    def to_arrays(self):
+        # (arrays, JSON-friendly labels), the form problem_cache stores
+        arrays = {column: codes for column, codes in self.codes.items()}
+        arrays.update(duration=self.duration, flags=self.flags)
+        return arrays, self.labels
+
+    @classmethod
+    def from_arrays(cls, arrays, labels):
+        return cls({column: arrays[column] for column in TEXT_COLUMNS}, labels, arrays['duration'],
+                   arrays['flags'])
+
+
+class Session:
+    # One row of a SessionTable, read through to the columns
+    __slots__ = ('table', 'index')
+
+    def __init__(self, table, index):
+        self.table = table
+        self.index = index
+
+    def _text(self, column):
+        return self.table.labels[column][self.table.codes[column][self.index]]
+
+    def _flag(self, bit):
+        return bool(self.table.flags[self.index] & bit)
+
+    session_id = property(lambda self: self._text('session_id'))
+    course_id = property(lambda self: self._text('course_id'))
+    batch = property(lambda self: self._text('batch'))
+    name = property(lambda self: self._text('name'))
+    program = property(lambda self: self._text('program'))
+    instructor = property(lambda self: self._text('instructor'))
+    room = property(lambda self: self._text('room'))
+    section = property(lambda self: self._text('section'))
+    duration = property(lambda self: int(self.table.duration[self.index]))
+    is_lab = property(lambda self: self._flag(LAB))
+    combined_program = property(lambda self: self._flag(COMBINED_PROGRAM))
+    combined_section = property(lambda self: self._flag(COMBINED_SECTION))
+
+    def __repr__(self):
+        return f'Session({self.session_id!r})'
@@ -0,0 +1,376 @@
+import math
+import random
+import time
+import numpy as np
+from deap import creator
+from checkpoint import CHECKPOINT_INTERVAL
+from constraints import SessionDomains, conflict_graph, greedy_individual
+from fitness import IncrementalEvaluator, PENALTY_KEYS, PENALTY_WEIGHTS
+from ga import (run_ga, population_size_for, NUM_GENERATIONS, CROSSOVER_PROB, MUTATION_PROB,
+                STAGNATION_GENERATIONS)
+from islands import run_islands
+
+
+class Solver:
+    # Common interface of the scheduling backends. Every solver works on the
+    # same compiled ConflictModel and returns a creator.Individual scored by it
+    # (fitness and penalty_counters set). history collects
+    # (seconds since start, best penalty so far) whenever the best improves.
+    # Setting cancel_event (a threading.Event) stops the search like the time
+    # limit does. With an events bus, convergence is published as 'generation'
+    # events: {'step', 'min', ...}. warm_start ({session: slot}, e.g. from
+    # checkpoint.remap_schedule) is an earlier schedule to start from.
+    name = None
+    label = None
+
+    def __init__(self, model, reserved_slots=None, time_limit=None, target_penalty=0, seed=None,
+                 cancel_event=None, events=None, warm_start=None):
+        self.model = model
+        self.reserved_slots = reserved_slots
+        self.time_limit = time_limit
+        self.cancel_event = cancel_event
+        self.events = events
+        self.warm_start = warm_start
+        self.target_penalty = target_penalty
+        self.seed = seed
+        self.history = []
+        self._start = None
+
+    def solve(self, progress):
+        raise NotImplementedError
+
+    def _begin(self):
+        if self.seed is not None:
+            random.seed(self.seed)
+        self._start = time.perf_counter()
+        self.history = []
+
+    def _elapsed(self):
+        return time.perf_counter() - self._start
+
+    def _out_of_time(self):
+        return self.time_limit is not None and self._elapsed() >= self.time_limit
+
+    def _should_stop(self):
+        return self._out_of_time() or (self.cancel_event is not None and self.cancel_event.is_set())
+
+    def _record(self, penalty):
+        if not self.history or penalty < self.history[-1][1]:
+            self.history.append((self._elapsed(), penalty))
+
+    def _publish(self, data):
+        if self.events is not None:
+            self.events.publish('generation', data)
+
+    def time_to_target(self):
+        # Seconds until target_penalty was first reached, None if it never was
+        for elapsed, penalty in self.history:
+            if penalty <= self.target_penalty:
+                return elapsed
+        return None
+
+    def _individual(self, genes):
+        best = creator.Individual(genes)
+        best.fitness.values = self.model.evaluate(best)
+        return best
+
+
+class GASolver(Solver):
+    # Run configuration: population_size (None: sized by the instance),
+    # num_generations, the base crossover/mutation rates,
+    # stagnation_generations (stop after that many generations without
+    # improvement; 0: never) and adaptive (rates follow population diversity).
+    # checkpoint_path/resume: periodic population checkpoints and resuming
+    # from them (single population only; island runs always start afresh)
+    name = 'ga'
+    label = 'Genetic algorithm'
+
+    def __init__(self, model, evaluation='batch', workers=1, islands=1,
+                 population_size=None, num_generations=NUM_GENERATIONS, crossover_prob=CROSSOVER_PROB,
+                 mutation_prob=MUTATION_PROB, stagnation_generations=STAGNATION_GENERATIONS, adaptive=True,
+                 checkpoint_path=None, checkpoint_interval=CHECKPOINT_INTERVAL, resume=False, **options):
+        super().__init__(model, **options)
+        self.evaluation = evaluation
+        self.workers = workers
+        self.islands = islands
+        self.population_size = population_size or population_size_for(model)
+        self.num_generations = num_generations
+        self.evolve_options = {
+            'crossover_prob': crossover_prob,
+            'mutation_prob': mutation_prob,
+            'stagnation_generations': stagnation_generations,
+            'adaptive': adaptive,
+        }
+        self.checkpoint_path = checkpoint_path
+        self.checkpoint_interval = checkpoint_interval
+        self.resume = resume
+
+    def solve(self, progress):
+        self._begin()
+        if self.islands > 1:
+            def on_report(data):
+                self._record(int(data['min']))
+                self._publish(data)
+                return data['min'] <= self.target_penalty or self._should_stop()
+
+            # Independent sub-populations in separate processes with ring migration
+            best = run_islands(self.model, progress, num_islands=self.islands, evaluation=self.evaluation,
+                               reserved_slots=self.reserved_slots, population_size=self.population_size,
+                               num_generations=self.num_generations, cancel_event=self.cancel_event,
+                               on_report=on_report, warm_start=self.warm_start, time_limit=self.time_limit,
+                               evolve_options=self.evolve_options)
+        else:
+            def on_generation(gen, pop, record):
+                self._record(int(record['min']))
+                data = {
+                    'step': gen + 1,
+                    'min': float(record['min']),
+                    'avg': float(record['avg']),
+                    'max': float(record['max']),
+                    'diversity': round(record['diversity'], 4),
+                }
+                if 'penalties' in record:
+                    data['penalties'] = {key: int(value) for key, value in record['penalties'].items()}
+                self._publish(data)
+                return record['min'] <= self.target_penalty or self._should_stop()
+
+            best = run_ga(self.model, progress, evaluation=self.evaluation, workers=self.workers,
+                          reserved_slots=self.reserved_slots, population_size=self.population_size,
+                          num_generations=self.num_generations, on_generation=on_generation,
+                          warm_start=self.warm_start, checkpoint_path=self.checkpoint_path,
+                          checkpoint_interval=self.checkpoint_interval, resume=self.resume,
+                          **self.evolve_options)
+        self._record(best.fitness.values[0])
+        return best
+
+
+class LocalSearchSolver(Solver):
+    # Shared machinery of the single-solution searches: a greedy start (built
+    # around the warm start, if any), the incremental evaluator for
+    # O(affected entities) moves, and progress reporting against the
+    # iteration budget. blocked ({session: slot indices}) is passed on to
+    # SessionDomains.
+    max_iterations = 200000
+
+    def __init__(self, model, max_iterations=None, blocked=None, **options):
+        super().__init__(model, **options)
+        if max_iterations is not None:
+            self.max_iterations = max_iterations
+        self.domains = SessionDomains(model, self.reserved_slots, blocked)
+        self.evaluator = IncrementalEvaluator(model)
+        # Only sessions with a choice of slot are worth moving
+        self.movable = [s for s, slots in enumerate(self.domains.slots) if len(slots) > 1]
+
+    def _start_point(self):
+        current = creator.Individual(greedy_individual(self.model, self.domains, conflict_graph(self.model),
+                                                       fixed=self.warm_start))
+        self.evaluator.evaluate(current)
+        return current
+
+    def _report(self, progress, iteration, best_penalty, penalty, current):
+        progress['message'] = f'Iteration {iteration} (best penalty {best_penalty}).'
+        progress['percentage'] = int(iteration / self.max_iterations * 80) + 10
+        self._publish({'step': iteration, 'min': int(best_penalty), 'current': int(penalty),
+                       'penalties': dict(zip(PENALTY_KEYS, current.occupancy.counters.tolist()))})
+
+
+class AnnealingSolver(LocalSearchSolver):
+    name = 'sa'
+    label = 'Simulated annealing'
+    initial_temperature = 20.0
+    final_temperature = 0.05
+
+    def solve(self, progress):
+        self._begin()
+        evaluator = self.evaluator
+        current = self._start_point()
+        penalty = evaluator.penalty(current)
+        best_genes, best_penalty = list(current), penalty
+        self._record(penalty)
+        cooling = (self.final_temperature / self.initial_temperature) ** (1.0 / self.max_iterations)
+        temperature = self.initial_temperature
+
+        for iteration in range(self.max_iterations):
+            if best_penalty <= self.target_penalty or self._should_stop() or not self.movable:
+                break
+            session = random.choice(self.movable)
+            old = current[session]
+            new = self.domains.sample(session)
+            if new != old:
+                candidate = evaluator.move(current, session, new)
+                delta = candidate - penalty
+                if delta <= 0 or random.random() < math.exp(-delta / temperature):
+                    penalty = candidate
+                    if penalty < best_penalty:
+                        best_genes, best_penalty = list(current), penalty
+                        self._record(best_penalty)
+                else:
+                    evaluator.move(current, session, old)
+            temperature *= cooling
+            if iteration % 1000 == 0:
+                self._report(progress, iteration, best_penalty, penalty, current)
+        return self._individual(best_genes)
+
+
+class TabuSolver(LocalSearchSolver):
+    name = 'tabu'
+    label = 'Tabu search'
+    max_iterations = 20000
+    candidates_per_iteration = 30
+    tenure = 15
+
+    def solve(self, progress):
+        self._begin()
+        evaluator = self.evaluator
+        current = self._start_point()
+        penalty = evaluator.penalty(current)
+        best_genes, best_penalty = list(current), penalty
+        self._record(penalty)
+        tabu = {}  # (session, slot) -> first iteration the move is allowed again
+
+        for iteration in range(self.max_iterations):
+            if best_penalty <= self.target_penalty or self._should_stop() or not self.movable:
+                break
+            # Sample a neighbourhood of single-session moves and take the best
+            # one that is not tabu, unless it beats the best schedule so far
+            best_move = None
+            for _ in range(self.candidates_per_iteration):
+                session = random.choice(self.movable)
+                old = current[session]
+                new = self.domains.sample(session)
+                if new == old:
+                    continue
+                candidate = evaluator.move(current, session, new)
+                evaluator.move(current, session, old)
+                allowed = tabu.get((session, new), 0) <= iteration or candidate < best_penalty
+                if allowed and (best_move is None or candidate < best_move[0]):
+                    best_move = (candidate, session, new)
+            if best_move is None:
+                continue
+            candidate, session, new = best_move
+            tabu[(session, current[session])] = iteration + self.tenure
+            penalty = evaluator.move(current, session, new)
+            if penalty < best_penalty:
+                best_genes, best_penalty = list(current), penalty
+                self._record(best_penalty)
+            if iteration % 100 == 0:
+                self._report(progress, iteration, best_penalty, penalty, current)
+        return self._individual(best_genes)
+
+
+class CPSatSolver(Solver):
+    # Exact backend on OR-Tools CP-SAT (optional dependency). Instructor
+    # clashes are hard constraints, as are the session domains (reserved
+    # slots, lab starts, sessions fitting the day); room and student clashes
+    # and same-day repeats of a course are minimised with their
+    # PENALTY_WEIGHTS, so the objective is the timetable's penalty. Fails
+    # only when no timetable keeps every instructor clash-free.
+    name = 'cpsat'
+    label = 'CP-SAT (OR-Tools)'
+
+    def __init__(self, model, workers=8, **options):
+        super().__init__(model, **options)
+        self.workers = workers
+
+    def solve(self, progress):
+        try:
+            from ortools.sat.python import cp_model
+        except ImportError:
+            raise RuntimeError("The CP-SAT solver requires OR-Tools: pip install ortools")
+
+        self._begin()
+        model = self.model
+        n_slots = model.num_time_slots
+        domains = SessionDomains(model, self.reserved_slots)
+        cp = cp_model.CpModel()
+
+        # x[s][t]: session s starts at slot t
+        x = [{t: cp.NewBoolVar(f'x{s}_{t}') for t in domains.slots[s]} for s in range(model.num_sessions)]
+        # cover[s][u]: literals that make session s occupy slot u
+        cover = [dict() for _ in range(model.num_sessions)]
+        for s, starts in enumerate(x):
+            cp.AddExactlyOne(starts.values())
+            for t, var in starts.items():
+                for u in model.cover[:, model.session_shape[s], t].tolist():
+                    if u < n_slots:
+                        cover[s].setdefault(u, []).append(var)
+
+        def slot_terms(sessions, multiplicity=None):
+            # Per slot, the (weight, literal) pairs occupying it (slots with
+            # more than one only)
+            for u in range(n_slots):
+                terms = []
+                for i, s in enumerate(sessions):
+                    weight = 1 if multiplicity is None else multiplicity[i]
+                    terms.extend((weight, var) for var in cover[s].get(u, ()))
+                if len(terms) > 1:
+                    yield u, terms
+
+        # Soft terms of the objective: (penalty per unit, integer variable)
+        objective = []
+
+        def excess_over_one(sessions, weight, name, multiplicity=None):
+            # Like ConflictModel.score: every extra occupant of a slot is one
+            # conflict
+            for u, terms in slot_terms(sessions, multiplicity):
+                extra = cp.NewIntVar(0, sum(w for w, _ in terms), f'{name}_{u}')
+                cp.Add(extra >= sum(w * var for w, var in terms) - 1)
+                objective.append((weight, extra))
+
+        for instructor in range(model.num_instructors):
+            for _, terms in slot_terms(np.flatnonzero(model.instructor_idx == instructor).tolist()):
+                cp.Add(sum(var for _, var in terms) <= 1)
+        for room in range(model.num_rooms):
+            excess_over_one(model.room_sessions[model.room_idx == room].tolist(),
+                            PENALTY_WEIGHTS['room_conflicts'], f'room{room}')
+        for group in range(model.num_student_groups):
+            sessions, counts = np.unique(model.student_sessions[model.student_group_idx == group],
+                                         return_counts=True)
+            # A class stands for student_group_sizes[group] identical students
+            excess_over_one(sessions.tolist(),
+                            PENALTY_WEIGHTS['student_conflicts'] * int(model.student_group_sizes[group]),
+                            f'group{group}', counts.tolist())
+
+        # Every extra session of a course on the same day
+        for course in range(model.num_courses):
+            sessions = np.flatnonzero(model.course_idx == course).tolist()
+            if len(sessions) < 2:
+                continue
+            for day in range(model.num_days):
+                on_day = [var for s in sessions for t, var in x[s].items() if model.slot_day[t] == day]
+                if len(on_day) > 1:
+                    extra = cp.NewIntVar(0, len(on_day), f'extra{course}_{day}')
+                    cp.Add(extra >= sum(on_day) - 1)
+                    objective.append((PENALTY_WEIGHTS['multiple_sessions_same_day'], extra))
+        cp.Minimize(sum(weight * var for weight, var in objective))
+        for s, t in (self.warm_start or {}).items():
+            if t in x[s]:
+                cp.AddHint(x[s][t], 1)
+
+        solver = cp_model.CpSolver()
+        solver.parameters.num_search_workers = self.workers
+        if self.time_limit is not None:
+            solver.parameters.max_time_in_seconds = float(self.time_limit)
+        progress['message'] = 'Solving with CP-SAT...'
+        progress['percentage'] = 10
+        status = solver.Solve(cp)
+        if status not in (cp_model.OPTIMAL, cp_model.FEASIBLE):
+            raise RuntimeError(f"CP-SAT found no timetable without instructor clashes "
+                               f"({solver.StatusName(status)}).")
+
+        genes = [next(t for t, var in starts.items() if solver.Value(var)) for starts in x]
+        best = self._individual(genes)
+        self._record(best.fitness.values[0])
+        return best
+
+
+SOLVERS = {cls.name: cls for cls in (GASolver, AnnealingSolver, TabuSolver, CPSatSolver)}
+
+
+def make_solver(name, model, **options):
+    # Build a solver by name ('ga', 'sa', 'tabu' or 'cpsat')
+    try:
+        cls = SOLVERS[name]
+    except KeyError:
+        raise ValueError(f"Unknown solver '{name}'. Choose from: {', '.join(SOLVERS)}")
+    return cls(model, **options)
@@ -0,0 +1,32 @@
+import os
+import sys
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# The modules live at the top of the repository, next to app.py
+sys.path.insert(0, ROOT)
+
+BUNDLED_INPUTS = tuple(os.path.join(ROOT, name)
+                       for name in ('Instructors_Courses.csv', 'Backlog.csv', 'Elective.csv'))
+
+
+@pytest.fixture(scope='session')
+def bundled_inputs():
+    return BUNDLED_INPUTS
+
+
+@pytest.fixture(scope='session')
+def synthetic_inputs(tmp_path_factory):
+    from benchmark import SIZES, write_synthetic_instance
+
+    return write_synthetic_instance(str(tmp_path_factory.mktemp('synthetic')), seed=0, **SIZES['small'])
+
+
+@pytest.fixture(scope='session', params=['bundled', 'synthetic'])
+def problem(request):
+    # Parsed problem on the default time grid: the bundled CSVs and a small
+    # synthetic instance
+    from timetable_generator import load_problem
+
+    inputs = request.getfixturevalue(f'{request.param}_inputs')
+    return load_problem(*inputs)
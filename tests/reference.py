@@ -0,0 +1,205 @@
+# Reference implementations ported from the original single-function
+# timetable_generator.generate_timetables: the behaviour the optimized code
+# must reproduce. Kept as close to the original loops as possible, so they
+# only know the default MIIT week (labs are two periods from 15:00).
+from collections import defaultdict
+
+
+def session_dicts(course_sessions):
+    # A SessionTable as the list of session dicts the original code used
+    return [{
+        'course_id': session.course_id,
+        'session_id': session.session_id,
+        'batch': session.batch,
+        'name': session.name,
+        'program': session.program,
+        'instructor': session.instructor,
+        'is_lab': session.is_lab,
+        'room': session.room,
+        'section': session.section,
+        'duration': session.duration,
+        'combined_program': session.combined_program,
+        'combined_section': session.combined_section,
+    } for session in course_sessions]
+
+
+def batch_members(session, batch_students):
+    # Regular students attending a session
+    batch = session['batch']
+    program = session['program']
+    section = session['section']
+    students_in_batch = batch_students.get((batch, program, section), [])
+    if session.get('combined_section', False):
+        students_in_batch = (batch_students.get((batch, program, 'Section 1'), [])
+                             + batch_students.get((batch, program, 'Section 2'), []))
+    elif session.get('combined_program', False):
+        students_in_batch = (batch_students.get((batch, 'CSE', section), [])
+                             + batch_students.get((batch, 'ECE', section), []))
+    return students_in_batch
+
+
+def evaluate(individual, course_sessions, batch_students, course_students, time_slot_indices):
+    # (penalty, penalty_counters) of one individual
+    num_time_slots = len(time_slot_indices)
+    penalty = 0
+    schedule = {}
+    instructor_schedule = defaultdict(lambda: defaultdict(set))
+    room_schedule = defaultdict(lambda: defaultdict(set))
+    student_schedule = defaultdict(lambda: defaultdict(set))
+    course_days = defaultdict(set)
+    penalty_counters = {
+        'invalid_time_slot': 0,
+        'lab_scheduling': 0,
+        'instructor_conflicts': 0,
+        'room_conflicts': 0,
+        'student_conflicts': 0,
+        'multiple_sessions_same_day': 0,
+        'missing_sessions': 0
+    }
+    for idx, session_time_slot_idx in enumerate(individual):
+        session = course_sessions[idx]
+        session_id = session['session_id']
+        course_id = session['course_id']
+        if session_time_slot_idx >= num_time_slots:
+            penalty += 20
+            penalty_counters['invalid_time_slot'] += 1
+            continue
+
+        day, time = time_slot_indices[session_time_slot_idx]
+        if session['is_lab']:
+            if time != '15:00':
+                penalty += 10
+                penalty_counters['lab_scheduling'] += 1
+                continue
+            next_time_slot_idx = session_time_slot_idx + 1
+            if (next_time_slot_idx >= num_time_slots or time_slot_indices[next_time_slot_idx][0] != day
+                    or time_slot_indices[next_time_slot_idx][1] != '16:00'):
+                penalty += 10
+                penalty_counters['lab_scheduling'] += 1
+            time_slots = [time, '16:00']
+        else:
+            time_slots = [time]
+
+        schedule[session_id] = (day, time_slots)
+
+        instructor = session['instructor']
+        for t in time_slots:
+            if t in instructor_schedule[instructor][day]:
+                penalty += 5
+                penalty_counters['instructor_conflicts'] += 1
+            instructor_schedule[instructor][day].add(t)
+
+        room = session['room']
+        if room:
+            for t in time_slots:
+                if t in room_schedule[room][day]:
+                    penalty += 2
+                    penalty_counters['room_conflicts'] += 1
+                room_schedule[room][day].add(t)
+
+        for students in (batch_members(session, batch_students), course_students.get(session_id, set())):
+            for student in students:
+                for t in time_slots:
+                    if t in student_schedule[student][day]:
+                        penalty += 5
+                        penalty_counters['student_conflicts'] += 1
+                    student_schedule[student][day].add(t)
+
+        if day in course_days[course_id]:
+            penalty += 1
+            penalty_counters['multiple_sessions_same_day'] += 1
+        course_days[course_id].add(day)
+
+    missing_sessions = len(course_sessions) - len(schedule)
+    if missing_sessions > 0:
+        penalty += missing_sessions * 20
+        penalty_counters['missing_sessions'] += missing_sessions
+    return penalty, penalty_counters
+
+
+def student_courses(course_sessions, backlog_students_df, elective_students_df):
+    # {roll number: session_ids} of the backlog and elective sheets
+    student_courses = {}
+    for idx, row in backlog_students_df.iterrows():
+        roll_number = row['RollNumber']
+        student_courses[roll_number] = set()
+        for course in course_sessions:
+            course_col = course['course_id'].split('_')[0]
+            program = course['program']
+            if course_col in row and row[course_col] == 1.0:
+                if program in roll_number.upper():
+                    student_courses[roll_number].add(course['session_id'])
+    for idx, row in elective_students_df.iterrows():
+        roll_number = row['RollNumber']
+        if roll_number not in student_courses:
+            student_courses[roll_number] = set()
+        for course in course_sessions:
+            course_col = course['course_id'].split('_')[0]
+            program = course['program']
+            if course_col in row and row[course_col] == 1.0:
+                if program in roll_number.upper():
+                    student_courses[roll_number].add(course['session_id'])
+    return student_courses
+
+
+def timetables(individual, course_sessions, student_courses, time_slot_indices):
+    # (batch, instructor, student) timetables of an individual, scanning every
+    # student's sessions for each scheduled session
+    num_time_slots = len(time_slot_indices)
+    best_schedule = {}
+    for idx, session in enumerate(course_sessions):
+        session_id = session['session_id']
+        if idx >= len(individual):
+            continue
+        time_slot_idx = individual[idx]
+        if time_slot_idx >= num_time_slots:
+            continue
+        day, time = time_slot_indices[time_slot_idx]
+        if session['is_lab']:
+            time_slots = [time, '16:00']
+        else:
+            time_slots = [time]
+        best_schedule[session_id] = (day, time_slots)
+
+    batch_timetables = defaultdict(list)
+    instructor_timetables = defaultdict(list)
+    student_timetables = defaultdict(list)
+    for session in course_sessions:
+        session_id = session['session_id']
+        if session_id in best_schedule:
+            day, time_slots = best_schedule[session_id]
+            course = session
+            key = (course['batch'], course['program'], course['section'])
+            batch_timetables[key].append({
+                'course_id': session['course_id'],
+                'session_id': session_id,
+                'course_name': course['name'],
+                'instructor': course['instructor'],
+                'day': day,
+                'times': time_slots,
+                'room': course['room']
+            })
+            instructor = course['instructor']
+            instructor_timetables[instructor].append({
+                'course_id': session['course_id'],
+                'session_id': session_id,
+                'course_name': course['name'],
+                'batch': course['batch'],
+                'program': course['program'],
+                'section': course['section'],
+                'day': day,
+                'times': time_slots,
+                'room': course['room']
+            })
+            for student, student_session_list in student_courses.items():
+                if session_id in student_session_list:
+                    student_timetables[student].append({
+                        'course_id': session['course_id'],
+                        'session_id': session_id,
+                        'course_name': course['name'],
+                        'instructor': course['instructor'],
+                        'day': day,
+                        'times': time_slots,
+                        'room': course['room']
+                    })
+    return batch_timetables, instructor_timetables, student_timetables
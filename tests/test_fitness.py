@@ -0,0 +1,139 @@
+import copy
+import random
+import types
+import numpy as np
+import pytest
+import fitness
+import reference
+from constraints import SessionDomains
+from fitness import ConflictModel, IncrementalEvaluator, PENALTY_KEYS
+from operators import cx_uniform_tracked, mut_domain_tracked
+from sessions import SessionTable
+from timegrid import TimeGrid
+from timetable_generator import load_problem
+
+
+class Individual(list):
+    # Stand-in for creator.Individual: a list that takes attributes
+    pass
+
+
+def random_population(model, rng, size):
+    # Genes anywhere on the grid (labs mostly off their 15:00 start), past its
+    # end (invalid), and on lab starts only, so every penalty term is hit
+    n_slots, n = model.num_time_slots, model.num_sessions
+    lab_starts = np.flatnonzero(model.lab_start_ok[:n_slots])
+    return np.concatenate([
+        rng.integers(0, n_slots, size=(size, n)),
+        rng.integers(0, n_slots + 3, size=(size, n)),
+        rng.choice(lab_starts, size=(size, n)),
+    ])
+
+
+def with_duplicates(course_sessions, count):
+    # Copy of the sessions with the first count repeated at the end, so their
+    # session_ids appear twice
+    records = reference.session_dicts(course_sessions)
+    return SessionTable.from_records(records + records[:count])
+
+
+@pytest.mark.parametrize('duplicates', [0, 5])
+def test_score_matches_reference_evaluate(problem, duplicates):
+    course_sessions = problem['course_sessions']
+    if duplicates:
+        course_sessions = with_duplicates(course_sessions, duplicates)
+    model = ConflictModel(course_sessions, problem['batch_students'], problem['course_students'],
+                          problem['time_grid'])
+    sessions = reference.session_dicts(course_sessions)
+    population = random_population(model, np.random.default_rng(duplicates), 40)
+
+    penalties, counters = model.score(population)
+    for genes, penalty, row in zip(population.tolist(), penalties.tolist(), counters.tolist()):
+        expected, expected_counters = reference.evaluate(genes, sessions, problem['batch_students'],
+                                                         problem['course_students'], problem['time_slot_indices'])
+        assert penalty == expected
+        assert dict(zip(PENALTY_KEYS, row)) == expected_counters
+
+        individual = Individual(genes)
+        assert model.evaluate(individual) == (expected,)
+        assert individual.penalty_counters == expected_counters
+
+
+def test_evaluate_population_matches_score(problem):
+    model = ConflictModel(problem['course_sessions'], problem['batch_students'], problem['course_students'],
+                          problem['time_grid'])
+    population = random_population(model, np.random.default_rng(7), 10)
+    individuals = [Individual(genes) for genes in population.tolist()]
+    penalties, counters = model.score(population)
+    assert model.evaluate_population(individuals) == [(penalty,) for penalty in penalties.tolist()]
+    assert [ind.penalty_counters for ind in individuals] == [dict(zip(PENALTY_KEYS, row)) for row in counters.tolist()]
+
+
+# A week unlike the default: two-period lectures (odd hours leave a
+# one-period session), several lab starts, a break labs can run across and a
+# reserved slot
+CUSTOM_GRID = {
+    'days': ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday'],
+    'periods': ['8:00', '9:00', '10:00', '11:00', '13:00', '14:00', '15:00', '16:00'],
+    'breaks': ['11:00'],
+    'reserved': [['Friday', '8:00']],
+    'lab_starts': ['10:00', '11:00', '14:00', '15:00'],
+    'lecture_duration': 2,
+    'lab_duration': 2,
+}
+
+
+@pytest.mark.parametrize('grid_config', [None, CUSTOM_GRID], ids=['default-grid', 'custom-grid'])
+def test_incremental_evaluation_tracks_full_score(bundled_inputs, grid_config):
+    # Tracked crossovers and mutations, evaluated incrementally from the
+    # parents' occupancy state (copied along as the GA's deepcopy clones do),
+    # must give the penalty and breakdown of a full rescore after every step
+    grid = TimeGrid.from_config(grid_config)
+    problem = load_problem(*bundled_inputs, grid=grid)
+    model = ConflictModel(problem['course_sessions'], problem['batch_students'], problem['course_students'], grid)
+    evaluator = IncrementalEvaluator(model)
+    n_slots = model.num_time_slots
+    # Draws over the whole grid and past it, and within the sessions' domains
+    wide = types.SimpleNamespace(slots=[list(range(n_slots + 2))] * model.num_sessions)
+    domains = SessionDomains(model)
+    rng = random.Random(3)
+    random.seed(3)
+
+    def check(individual):
+        penalties, counters = model.score([list(individual)])
+        assert evaluator.evaluate(individual) == (int(penalties[0]),)
+        assert individual.penalty_counters == dict(zip(PENALTY_KEYS, counters[0].tolist()))
+
+    population = [Individual(rng.randrange(n_slots + 2) for _ in range(model.num_sessions)) for _ in range(6)]
+    for individual in population:
+        check(individual)
+    for step in range(120):
+        first, second = (copy.deepcopy(individual) for individual in rng.sample(population, 2))
+        cx_uniform_tracked(first, second, 0.3)
+        mut_domain_tracked(first, wide if step % 2 else domains, 0.05)
+        if step % 5 == 0:
+            # Untracked change: the evaluator has to find the moved genes
+            second.changed_positions = None
+            second[rng.randrange(model.num_sessions)] = rng.randrange(n_slots + 2)
+        check(first)
+        check(second)
+        population[rng.randrange(len(population))] = first
+
+    # Local-search moves on an evaluated individual
+    individual = population[0]
+    for _ in range(50):
+        position, value = rng.randrange(model.num_sessions), rng.randrange(n_slots + 2)
+        penalty = evaluator.move(individual, position, value)
+        assert penalty == int(model.score([list(individual)])[0][0])
+
+
+def test_score_in_blocks_matches_single_pass(problem, monkeypatch):
+    # Populations too large for one pass are scored a few individuals at a time
+    model = ConflictModel(problem['course_sessions'], problem['batch_students'], problem['course_students'],
+                          problem['time_grid'])
+    population = random_population(model, np.random.default_rng(11), 10)
+    penalties, counters = model.score(population)
+    monkeypatch.setattr(fitness, 'MAX_SCORE_CELLS', 3 * model._cells_per_individual())
+    blocked_penalties, blocked_counters = model.score(population)
+    assert blocked_penalties.tolist() == penalties.tolist()
+    assert blocked_counters.tolist() == counters.tolist()
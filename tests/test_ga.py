@@ -0,0 +1,55 @@
+import random
+import numpy as np
+from deap import creator
+import ga
+from fitness import IncrementalEvaluator, occupancy_nbytes
+from ga import run_ga
+from timetable_generator import build_model, load_problem
+
+
+def test_resumed_run_matches_uninterrupted(bundled_inputs, tmp_path):
+    # A run stopped after a few generations and resumed from its checkpoint
+    # must go through the same generations, rates and stagnation stop as one
+    # that was never interrupted
+    model = build_model(load_problem(*bundled_inputs))
+    options = dict(population_size=60, num_generations=40, stagnation_generations=3, verbose=False,
+                   checkpoint_path=str(tmp_path / 'checkpoint.pkl'), checkpoint_interval=1)
+
+    def run(stop_after=None, resume=False):
+        history = []
+
+        def on_generation(gen, pop, record):
+            history.append((gen, float(record['min']), record['gene_mutation_prob']))
+            return gen + 1 == stop_after
+
+        random.seed(5)
+        np.random.seed(5)
+        best = run_ga(model, {}, on_generation=on_generation, resume=resume, **options)
+        return history, best
+
+    expected, expected_best = run()
+    # Interrupt once the best penalty has stalled, so the stagnation state matters
+    stop_after = len(expected) - 1
+    first, _ = run(stop_after=stop_after)
+    rest, best = run(resume=True)
+    assert first + rest == expected
+    assert list(best) == list(expected_best)
+
+    # Resuming a run that already stopped on stagnation does not start it again
+    again, _ = run(resume=True)
+    assert again == []
+
+
+def test_incremental_evaluation_falls_back_when_too_large(bundled_inputs, monkeypatch):
+    # The estimate is what an evaluated individual actually keeps
+    model = build_model(load_problem(*bundled_inputs))
+    individual = creator.Individual([0] * model.num_sessions)
+    IncrementalEvaluator(model).evaluate(individual)
+    state = individual.occupancy
+    kept = sum(getattr(state, name).nbytes for name in state.__slots__ if getattr(state, name) is not None)
+    assert occupancy_nbytes(model) == kept
+
+    assert ga.evaluation_for(model, 'incremental', 100) == 'incremental'
+    monkeypatch.setattr(ga, 'INCREMENTAL_MEMORY', 199 * kept)
+    assert ga.evaluation_for(model, 'incremental', 100) == 'batch'
+    assert ga.evaluation_for(model, 'batch', 100) == 'batch'
@@ -0,0 +1,46 @@
+import pandas as pd
+from ingest import read_inputs
+from timegrid import TimeGrid
+from timetable_generator import load_problem
+
+
+def write_inputs(folder, courses, backlog, elective):
+    paths = []
+    for name, rows in (('Instructors_Courses.csv', courses), ('Backlog.csv', backlog), ('Elective.csv', elective)):
+        path = str(folder / name)
+        pd.DataFrame(rows).to_csv(path, index=False)
+        paths.append(path)
+    return paths
+
+
+def course(number, program):
+    return {'Batch': 'BE-2019', 'Course Number': number, 'Course Name': number, 'Program': program,
+            'Instructor-in-Charge': f'Instructor {number}', 'Section Number': '', 'Lecture Hours': 2,
+            'Lab Hours': 0, 'ROOM': '', 'CombinedProgram': False, 'CombinedSection': False}
+
+
+def test_dropped_enrollments_match_generation(tmp_path):
+    # The report's dropped enrollments are exactly the marks generation
+    # ignores, including for a program code written in lower case (matched
+    # as written against the upper-cased roll number, so never)
+    courses = [course('CSE 101', 'Cse'), course('CSE 102', 'CSE'), course('ECE 201', 'ECE')]
+    backlog = [{'No': 1, 'RollNumber': '2019-MIIT-CSE-001', 'Name': 'a', 'CSE 101': 1.0, 'CSE 102': 1.0,
+                'ECE 201': None}]
+    elective = [{'No': 1, 'RollNumber': '2019-miit-ece-002', 'Name': 'b', 'CSE 101': None, 'CSE 102': 1.0,
+                 'ECE 201': 1.0}]
+    paths = write_inputs(tmp_path, courses, backlog, elective)
+
+    _, report = read_inputs(*paths, TimeGrid.from_config())
+    assert report.ok
+    dropped = [(sheet, message) for sheet, message in report.warnings if 'match no section' in message]
+    assert dropped == [
+        ('Backlog', "1 enrollments match no section offered to the student's program and are ignored "
+                    "(2019-MIIT-CSE-001 in CSE 101)."),
+        ('Elective', "1 enrollments match no section offered to the student's program and are ignored "
+                     "(2019-miit-ece-002 in CSE 102)."),
+    ]
+    problem = load_problem(*paths)
+    assert problem['student_courses'] == {
+        '2019-MIIT-CSE-001': {'CSE 102_CSE_L0', 'CSE 102_CSE_L1'},
+        '2019-miit-ece-002': {'ECE 201_ECE_L0', 'ECE 201_ECE_L1'},
+    }
@@ -0,0 +1,21 @@
+from constraints import SessionDomains
+from reschedule import blocked_slots
+from timetable_generator import build_model, load_problem
+
+
+def test_blackouts_that_leave_no_slot_are_reported(bundled_inputs):
+    # An instructor blacked out all week keeps their sessions' domains, and
+    # those sessions are listed; a single blackout hour just narrows them
+    problem = load_problem(*bundled_inputs)
+    model = build_model(problem)
+    instructors = problem['course_sessions'].column('instructor')
+    busy, other = instructors[0], next(name for name in instructors if name != instructors[0])
+    blackouts = [(busy, day, time) for day, time in problem['time_slot_indices'].values()]
+    blackouts.append((other, *problem['time_slot_indices'][0]))
+
+    unblocked = SessionDomains(model)
+    domains = SessionDomains(model, blocked=blocked_slots(problem, blackouts))
+    busy_sessions = [s for s, name in enumerate(instructors) if name == busy]
+    assert domains.unblockable == busy_sessions
+    assert all(domains.slots[s] == unblocked.slots[s] for s in busy_sessions)
+    assert all(0 not in domains.slots[s] for s, name in enumerate(instructors) if name == other)
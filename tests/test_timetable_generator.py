@@ -0,0 +1,89 @@
+import random
+from collections import defaultdict
+import numpy as np
+import pandas as pd
+import reference
+from sessions import SessionTable
+from timetable_generator import build_student_courses, build_timetables
+
+NaN = np.nan
+
+
+def session(course_id, program, number=0, is_lab=False):
+    return {'course_id': course_id, 'session_id': f"{course_id}_{'Lab' if is_lab else 'L'}{number}",
+            'batch': 'BE-2019', 'name': course_id, 'program': program, 'instructor': 'I', 'is_lab': is_lab,
+            'room': None, 'section': '', 'duration': 2 if is_lab else 1, 'combined_program': False,
+            'combined_section': False}
+
+
+def test_student_courses_match_reference():
+    # One course column serving several programs, a combined program no roll
+    # number contains, a program code inside another (CE in CSE and ECE), a
+    # course without a column and one column without a course
+    records = [
+        session('CSE 101_CSE', 'CSE'), session('CSE 101_CSE', 'CSE', 1), session('CSE 101_CSE', 'CSE', 0, True),
+        session('CSE 101_ECE', 'ECE'),
+        session('MATH 201_CSE and ECE', 'CSE and ECE'),
+        session('PHY 301_CE', 'CE'),
+        session('ENG 401_ECE', 'ECE'),
+    ]
+    course_sessions = SessionTable.from_records(records)
+    backlog = pd.DataFrame({
+        'No': [1, 2, 3, 4, 5],
+        'RollNumber': ['2019-MIIT-CSE-001', '2019-MIIT-ECE-002', '2019-miit-cse-003', '2019-MIIT-CSE-001',
+                       '2019-MIIT-ECE-004'],
+        'Name': ['a', 'b', 'c', 'a again', 'd'],
+        # The second row of 2019-MIIT-CSE-001 replaces the first one's marks
+        'CSE 101': [1.0, 1.0, NaN, NaN, 0.0],
+        'MATH 201': [1.0, 1.0, 1.0, NaN, NaN],
+        'PHY 301': [NaN, 1.0, 1.0, 1.0, 1.0],
+        'BIO 999': [1.0, NaN, NaN, NaN, 1.0],
+    })
+    elective = pd.DataFrame({
+        'No': [1, 2, 3, 4],
+        # Rolls also in the backlog sheet add to their backlog enrollments
+        'RollNumber': ['2019-MIIT-ECE-002', '2020-MIIT-CSE-010', '2019-MIIT-CSE-001', '2020-MIIT-CSE-010'],
+        'Name': ['b', 'e', 'a', 'e again'],
+        'CSE 101': [NaN, 1.0, NaN, NaN],
+        'ENG 401': [1.0, 1.0, 1.0, NaN],
+        'PHY 301': [NaN, NaN, 1.0, 1.0],
+    })
+
+    expected = reference.student_courses(records, backlog, elective)
+    actual = build_student_courses(course_sessions, backlog, elective)
+    assert actual == expected
+    assert list(actual) == list(expected)
+
+
+def test_build_timetables_match_reference(problem):
+    # Random schedules with unscheduled (past the grid) sessions. Labs start
+    # at 15:00, the only start the original code laid out correctly.
+    sessions = reference.session_dicts(problem['course_sessions'])
+    slots = problem['time_slot_indices']
+    lab_starts = [slot for slot, (_, time) in slots.items() if time == '15:00']
+    rng = random.Random(5)
+    for _ in range(5):
+        individual = [rng.choice(lab_starts) if session['is_lab'] else rng.randrange(len(slots))
+                      for session in sessions]
+        for position in rng.sample(range(len(individual)), 10):
+            individual[position] = len(slots) + rng.randrange(3)
+
+        batch, instructor, student = build_timetables(problem, individual)
+        expected_batch, expected_instructor, expected_student = reference.timetables(
+            individual, sessions, problem['student_courses'], slots)
+        assert list(batch.items()) == list(expected_batch.items())
+        assert list(instructor.items()) == list(expected_instructor.items())
+        # Backlog/elective students first, as before; then every regular
+        # student with the sessions of their batch
+        enrolled = [(name, entries) for name, entries in student.items() if name in problem['student_courses']]
+        assert enrolled == list(expected_student.items())
+        assert list(student)[:len(enrolled)] == [name for name, _ in enrolled]
+        scheduled = {session['session_id'] for session, slot in zip(sessions, individual) if slot < len(slots)}
+        expected_regular = defaultdict(list)
+        for session in sessions:
+            if session['session_id'] in scheduled:
+                for name in reference.batch_members(session, problem['batch_students']):
+                    expected_regular[name].append(session['session_id'])
+        regular = {name: [entry['session_id'] for entry in entries] for name, entries in student.items()
+                   if name not in problem['student_courses']}
+        assert regular == dict(expected_regular)
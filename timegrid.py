@@ -0,0 +1,141 @@
+import json
+import numpy as np
+
+# Teaching week used when no time-grid config is given: the MIIT hours, with
+# lunch after 11:00 and labs in the 15:00-17:00 block
+DEFAULT_GRID = {
+    'days': ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday'],
+    'periods': ['9:00', '10:00', '11:00', '13:00', '14:00', '15:00', '16:00'],
+    'breaks': ['11:00'],  # periods followed by a break that no session runs across
+    'reserved': [],  # [day, period] pairs no session may use
+    'lab_starts': ['15:00'],  # periods a lab may start at; empty means any
+    'lecture_duration': 1,  # periods per lecture session
+    'lab_duration': 2,  # periods per lab session
+}
+
+
+class TimeGrid:
+    # The week as a sequence of slots, day by day: slot i is
+    # (days[i // len(periods)], periods[i % len(periods)]). A session of
+    # duration d starting at slot i covers it and the next d - 1 slots, as
+    # long as the day does not end and no break comes first. Sets of slots
+    # are bitmasks with bit i standing for slot i: Python ints here, rows of
+    # uint64 words in the conflict model (see slot_words).
+    def __init__(self, days, periods, breaks=(), reserved=(), lab_starts=(), lecture_duration=1, lab_duration=2):
+        days, periods = [str(day) for day in days], [str(period) for period in periods]
+        if not days or not periods:
+            raise ValueError("The time grid needs at least one day and one period.")
+        for name, values in (('day', days), ('period', periods)):
+            repeated = sorted({value for value in values if values.count(value) > 1})
+            if repeated:
+                raise ValueError(f"Time grid {name}s are listed twice: {', '.join(repeated)}")
+        for name, duration in (('lecture_duration', lecture_duration), ('lab_duration', lab_duration)):
+            if not isinstance(duration, int) or isinstance(duration, bool) or duration < 1:
+                raise ValueError(f"Time grid {name} must be a positive whole number of periods.")
+        self.days = days
+        self.periods = periods
+        self.period_index = {period: i for i, period in enumerate(periods)}
+        self.breaks = [self._period(period, 'breaks') for period in breaks]
+        self.lab_starts = [self._period(period, 'lab_starts') for period in lab_starts]
+        self.lecture_duration = lecture_duration
+        self.lab_duration = lab_duration
+        self.slots = [(day, period) for day in days for period in periods]
+        self.index = {slot: i for i, slot in enumerate(self.slots)}
+        self.reserved = []
+        for day_period in reserved:
+            if not isinstance(day_period, (list, tuple)) or tuple(day_period) not in self.index:
+                raise ValueError(f"Reserved slot {day_period!r} is not a [day, period] of the time grid.")
+            self.reserved.append(tuple(day_period))
+
+        # Slots a session cannot run on from: the last of each day and those
+        # before a break
+        self.block_end = np.zeros(len(self.slots), dtype=bool)
+        ends = set(self.period_index[period] for period in self.breaks) | {len(periods) - 1}
+        for i, (_, period) in enumerate(self.slots):
+            self.block_end[i] = self.period_index[period] in ends
+
+    def _period(self, period, key):
+        if period not in self.period_index:
+            raise ValueError(f"Time grid {key} names {period}, which is not one of the periods.")
+        return period
+
+    @classmethod
+    def from_config(cls, config=None):
+        # Grid from a config dict; missing keys take their DEFAULT_GRID value
+        config = dict(config or {})
+        unknown = sorted(set(config) - set(DEFAULT_GRID))
+        if unknown:
+            raise ValueError(f"Unknown time grid settings: {', '.join(unknown)}. "
+                             f"Expected some of: {', '.join(DEFAULT_GRID)}")
+        config = dict(DEFAULT_GRID, **config)
+        for key in ('days', 'periods', 'breaks', 'reserved', 'lab_starts'):
+            if not isinstance(config[key], list):
+                raise ValueError(f"Time grid {key} must be a list.")
+        return cls(**config)
+
+    @classmethod
+    def loads(cls, text):
+        try:
+            config = json.loads(text)
+        except json.JSONDecodeError as e:
+            raise ValueError(f"The time grid is not valid JSON: {e}")
+        if not isinstance(config, dict):
+            raise ValueError("The time grid must be a JSON object.")
+        return cls.from_config(config)
+
+    @classmethod
+    def load(cls, path=None):
+        # Grid from a JSON config file, or the default grid for None
+        if path is None:
+            return cls.from_config()
+        with open(path) as f:
+            return cls.loads(f.read())
+
+    def to_config(self):
+        return {
+            'days': list(self.days),
+            'periods': list(self.periods),
+            'breaks': list(self.breaks),
+            'reserved': [list(slot) for slot in self.reserved],
+            'lab_starts': list(self.lab_starts),
+            'lecture_duration': self.lecture_duration,
+            'lab_duration': self.lab_duration,
+        }
+
+    @property
+    def num_slots(self):
+        return len(self.slots)
+
+    def slot_indices(self):
+        # {slot index: (day, period)}, the time_slot_indices of a problem
+        return dict(enumerate(self.slots))
+
+    def block(self, start, duration):
+        # Slots a session of this duration occupies from start; shorter than
+        # duration when the day ends or a break comes first
+        slots = [start]
+        while len(slots) < duration and not self.block_end[slots[-1]]:
+            slots.append(slots[-1] + 1)
+        return slots
+
+    def footprint(self, start, duration):
+        return mask_of(self.block(start, duration))
+
+    def lab_start_ok(self):
+        # Slots a lab may start at
+        if not self.lab_starts:
+            return np.ones(self.num_slots, dtype=bool)
+        return np.array([period in self.lab_starts for _, period in self.slots], dtype=bool)
+
+
+def mask_of(slots):
+    mask = 0
+    for slot in slots:
+        mask |= 1 << int(slot)
+    return mask
+
+
+def slot_words(mask, num_slots):
+    # A slot bitmask as a row of uint64 words (bit i of word k is slot 64k + i)
+    num_words = max(1, -(-num_slots // 64))
+    return np.array([(mask >> (64 * k)) & (2 ** 64 - 1) for k in range(num_words)], dtype=np.uint64)
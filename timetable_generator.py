@@ -1,60 +1,100 @@
 import pandas as pd
 import numpy as np
-import random
-from deap import base, creator, tools, algorithms
 from collections import defaultdict
-import textwrap
+from checkpoint import SCHEDULE_FILE, load_schedule, remap_schedule, save_schedule
+from export import export_timetables, timetable_cells
+from fitness import ConflictModel, session_students
+from ingest import ValidationReport, program_matches, read_inputs
+from metrics import METRICS_FILE, Metrics, profiling, recording, span, set_value
+from problem_cache import load_or_compile
+from reschedule import RescheduleSolver, blocked_slots
+from rooms import RoomInventory, allocate_rooms
+from results_store import RESULTS_FILENAME, write_results
+from sessions import SessionTable
+from solvers import make_solver
+from timegrid import TimeGrid
 import time, os
 
-def generate_timetables(instructors_courses_path, backlog_path, elective_path, output_folder, progress):
-    # Load data
-    instructors_courses_df = pd.read_csv(instructors_courses_path)
-    backlog_students_df = pd.read_csv(backlog_path)
-    elective_students_df = pd.read_csv(elective_path)
-    # Define time slots and days
-    days = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday']
-    times = ['9:00', '10:00', '11:00', '13:00', '14:00', '15:00', '16:00']
-    # reserved_slots = [('Monday', '9:00'), ('Friday', '9:00')]
-
-    # Create time slot indices
-    all_time_slots = [(day, time) for day in days for time in times]
-    time_slot_indices = {i: slot for i, slot in enumerate(all_time_slots)}
-    num_time_slots = len(all_time_slots)
-
-    # Create mappings for time slots
-    time_slots_by_day_time = defaultdict(dict)
-    for idx, (day, time) in time_slot_indices.items():
-        time_slots_by_day_time[day][time] = idx
+def _sheet_enrollments(students_df, sessions_df):
+    # (RollNumber, session_id) pairs for every 1.0 mark in a wide 0/1 student
+    # sheet, keeping only sessions whose program appears in the roll number
+    course_cols = [col for col in sessions_df['course_col'].unique() if col in students_df.columns]
+    marks = students_df[course_cols].to_numpy() == 1.0
+    rows, cols = np.nonzero(marks)
+    rolls = students_df['RollNumber'].to_numpy()
+    pairs = pd.DataFrame({
+        'row': rows,
+        'course_col': np.asarray(course_cols, dtype=object)[cols],
+    }).merge(sessions_df, on='course_col')
+
+    # Program filter: one substring test per (roll number, distinct program)
+    programs = pd.Index(pairs['program'].unique())
+    pair_rows = pairs['row'].to_numpy()
+    keep = program_matches(rolls, programs)[pair_rows, programs.get_indexer(pairs['program'])]
+    return rolls[pair_rows[keep]], pairs['session_id'].to_numpy()[keep]
+
+
+def build_student_courses(course_sessions, backlog_students_df, elective_students_df):
+    # Map every backlog/elective roll number to the set of session_ids it takes.
+    # The wide course columns are scanned once with NumPy and joined against a
+    # course column -> sessions index instead of testing every row against
+    # every session.
+    sessions_df = pd.DataFrame({
+        'course_col': [course_id.split('_')[0] for course_id in course_sessions.column('course_id')],
+        'session_id': course_sessions.column('session_id'),
+        'program': course_sessions.column('program'),
+    })
+    student_courses = {}
 
-    # Process courses
-    # Process courses
-    course_sessions = []
-    for idx, row in instructors_courses_df.iterrows():
-        batch = row['Batch'].strip()
-        course_number = row['Course Number'].strip()
-        course_name = row['Course Name'].strip()
-        program = row['Program'].strip()
-        instructor = row['Instructor-in-Charge'].strip()
-        section = row['Section Number'].strip() if not pd.isna(row['Section Number']) else ''
-        lecture_hours = int(row['Lecture Hours']) if not pd.isna(row['Lecture Hours']) else 0
-        lab_hours = int(row['Lab Hours']) if not pd.isna(row['Lab Hours']) else 0
-        room = str(row['ROOM']).strip() if not pd.isna(row['ROOM']) else None
-        combined_program = str(row['CombinedProgram']).strip().lower() == 'true'
-        combined_section = str(row['CombinedSection']).strip().lower() == 'true'
-
-        # Rest of the code remains the same...
+    # Backlog students: a repeated roll number keeps its first position but
+    # only the enrollments of its last row
+    backlog_students_df = backlog_students_df[backlog_students_df['RollNumber'].notna()]
+    for roll_number in backlog_students_df['RollNumber'].unique():
+        student_courses[roll_number] = set()
+    last_rows = backlog_students_df[~backlog_students_df['RollNumber'].duplicated(keep='last')]
+    for roll_number, session_id in zip(*_sheet_enrollments(last_rows, sessions_df)):
+        student_courses[roll_number].add(session_id)
+
+    # Elective students: enrollments add to any backlog ones
+    elective_students_df = elective_students_df[elective_students_df['RollNumber'].notna()]
+    for roll_number in elective_students_df['RollNumber'].unique():
+        student_courses.setdefault(roll_number, set())
+    for roll_number, session_id in zip(*_sheet_enrollments(elective_students_df, sessions_df)):
+        student_courses[roll_number].add(session_id)
+    return student_courses
+
+
+def session_records(instructors_courses_df, grid):
+    # One dict per lecture and per lab of every course row: lecture hours are
+    # split into sessions of the grid's lecture_duration periods (the
+    # remainder, if any, makes one shorter session), lab hours into labs of
+    # lab_duration periods. instructors_courses_df is the typed frame of
+    # ingest.read_course_sheet.
+    for row in instructors_courses_df.to_dict('records'):
+        batch = row['Batch']
+        course_number = row['Course Number']
+        course_name = row['Course Name']
+        program = row['Program']
+        instructor = row['Instructor-in-Charge']
+        section = row['Section Number']
+        lecture_hours = int(row['Lecture Hours'])
+        lab_hours = int(row['Lab Hours'])
+        room = row['ROOM'] or None
+        combined_program = bool(row['CombinedProgram'])
+        combined_section = bool(row['CombinedSection'])
 
         # Unique course ID including program and section
         course_id = f"{course_number}_{program}_{section}" if section else f"{course_number}_{program}"
 
         # Total sessions needed
-        lecture_sessions = lecture_hours
-        lab_sessions = lab_hours // 2  # Assuming labs are 2-hour sessions
+        lecture_sessions, lecture_remainder = divmod(lecture_hours, grid.lecture_duration)
+        lecture_durations = [grid.lecture_duration] * lecture_sessions + [lecture_remainder] * (lecture_remainder > 0)
+        lab_sessions = lab_hours // grid.lab_duration
 
         # Create lecture sessions
-        for session_num in range(lecture_sessions):
+        for session_num, duration in enumerate(lecture_durations):
             session_id = f"{course_id}_L{session_num}"
-            course_sessions.append({
+            yield {
                 'course_id': course_id,
                 'session_id': session_id,
                 'batch': batch,
@@ -64,15 +104,15 @@ def generate_timetables(instructors_courses_path, backlog_path, elective_path, o
                 'is_lab': False,
                 'room': room,
                 'section': section,
-                'duration': 1,  # 1-hour lectures
+                'duration': duration,
                 'combined_program': combined_program,
                 'combined_section': combined_section,
-            })
+            }
 
         # Create lab sessions
         for session_num in range(lab_sessions):
             session_id = f"{course_id}_Lab{session_num}"
-            course_sessions.append({
+            yield {
                 'course_id': course_id,
                 'session_id': session_id,
                 'batch': batch,
@@ -82,34 +122,32 @@ def generate_timetables(instructors_courses_path, backlog_path, elective_path, o
                 'is_lab': True,
                 'room': room,
                 'section': section,
-                'duration': 2,  # 2-hour labs
+                'duration': grid.lab_duration,
                 'combined_program': combined_program,
                 'combined_section': combined_section,
-            })
+            }
 
-    # Process students
-    student_courses = {}
-    # Backlog students
-    for idx, row in backlog_students_df.iterrows():
-        roll_number = row['RollNumber']
-        student_courses[roll_number] = set()
-        for course in course_sessions:
-            course_col = course['course_id'].split('_')[0]
-            program = course['program']
-            if course_col in row and row[course_col] == 1.0:
-                if program in roll_number.upper():
-                    student_courses[roll_number].add(course['session_id'])
-    # Elective students
-    for idx, row in elective_students_df.iterrows():
-        roll_number = row['RollNumber']
-        if roll_number not in student_courses:
-            student_courses[roll_number] = set()
-        for course in course_sessions:
-            course_col = course['course_id'].split('_')[0]
-            program = course['program']
-            if course_col in row and row[course_col] == 1.0:
-                if program in roll_number.upper():
-                    student_courses[roll_number].add(course['session_id'])
+
+def load_problem(instructors_courses_path, backlog_path, elective_path, grid=None):
+    # Parse the three input CSVs into the sessions and enrollments every
+    # solver works on, laid out on grid (a timegrid.TimeGrid; the default
+    # MIIT week when None). The inputs are validated first (see
+    # ingest.read_inputs): errors raise ValueError before anything is built,
+    # warnings travel with the problem as 'validation'.
+    grid = grid or TimeGrid.from_config()
+    # Load data
+    with span('ingest'):
+        (instructors_courses_df, backlog_students_df, elective_students_df), report = read_inputs(
+            instructors_courses_path, backlog_path, elective_path, grid)
+    report.raise_for_errors()
+
+    # Process courses
+    with span('sessions'):
+        course_sessions = SessionTable.from_records(session_records(instructors_courses_df, grid))
+
+    # Process students: backlog and elective enrollments
+    with span('enrollments'):
+        student_courses = build_student_courses(course_sessions, backlog_students_df, elective_students_df)
 
     course_students = defaultdict(set)
     for student, courses in student_courses.items():
@@ -142,407 +180,263 @@ def generate_timetables(instructors_courses_path, backlog_path, elective_path, o
                             if section == '':
                                 batch_students[batch_key].append(student_id)
 
-    # ... (rest of your timetable generation code)
-
-    creator.create("FitnessMin", base.Fitness, weights=(-1.0,))
-    creator.create("Individual", list, fitness=creator.FitnessMin)
-
-    toolbox = base.Toolbox()
-
-    # Attribute generator: Randomly assign time slot indices to each session
-    def create_individual():
-        individual = []
-        for session in course_sessions:
-            if session['is_lab']:
-                # Only consider valid lab starting slots (15:00)
-                lab_start_slots = [idx for idx, (day, time) in time_slot_indices.items() if time == '15:00']
-                individual.append(random.choice(lab_start_slots))
-            else:
-                individual.append(random.randint(0, num_time_slots - 1))
-        return individual
-
-    toolbox.register("individual", tools.initIterate, creator.Individual, create_individual)
-    toolbox.register("population", tools.initRepeat, list, toolbox.individual)
-
-    # Fitness function remains the same
-    def evaluate(individual):
-        penalty = 0
-        schedule = {}
-        instructor_schedule = defaultdict(lambda: defaultdict(set))
-        room_schedule = defaultdict(lambda: defaultdict(set))
-        student_schedule = defaultdict(lambda: defaultdict(set))
-        course_days = defaultdict(set)
-
-        # Initialize penalty counters
-        penalty_counters = {
-            'invalid_time_slot': 0,
-            'lab_scheduling': 0,
-            'instructor_conflicts': 0,
-            'room_conflicts': 0,
-            'student_conflicts': 0,
-            'multiple_sessions_same_day': 0,
-            'missing_sessions': 0
-        }
-        for idx, session_time_slot_idx in enumerate(individual):
-            session = course_sessions[idx]
-            session_id = session['session_id']
-            course_id = session['course_id']
-            if session_time_slot_idx >= num_time_slots:
-                penalty += 20  # Reduced from 50
-                penalty_counters['invalid_time_slot'] += 1
-                continue
-
-            time_slot = time_slot_indices[session_time_slot_idx]
-            day, time = time_slot
-            duration = session['duration']
-            program = session['program']
-
-            # For labs, ensure the next time slot is also available
-            if session['is_lab']:
-                if time != '15:00':
-                    penalty += 10  # Reduced from 20
-                    penalty_counters['lab_scheduling'] += 1
-                    continue
-                # Check if the next time slot (16:00) is available
-                next_time_slot_idx = session_time_slot_idx + 1
-                if next_time_slot_idx >= num_time_slots or time_slot_indices[next_time_slot_idx][0] != day or time_slot_indices[next_time_slot_idx][1] != '16:00':
-                    penalty += 10  # Reduced from 20
-                    penalty_counters['lab_scheduling'] += 1
-                time_slots = [time, '16:00']
-            else:
-                time_slots = [time]
-
-            schedule[session_id] = (day, time_slots)
-
-            # Instructor conflicts
-            instructor = session['instructor']
-            for t in time_slots:
-                if t in instructor_schedule[instructor][day]:
-                    penalty += 5  # Reduced from 10
-                    penalty_counters['instructor_conflicts'] += 1
-                instructor_schedule[instructor][day].add(t)
-
-            # Room conflicts
-            room = session['room']
-            if room:
-                for t in time_slots:
-                    if t in room_schedule[room][day]:
-                        penalty += 2  # Reduced from 5
-                        penalty_counters['room_conflicts'] += 1
-                    room_schedule[room][day].add(t)
-
-            # Student conflicts
-            # For batch students
-            batch = session['batch']
-            section = session['section']
-            key = (batch, program, section)
-            students_in_batch = batch_students.get(key, [])
-            combined_program = session.get('combined_program', False)
-            combined_section = session.get('combined_section', False)
-
-            # If the program is 'CSE and ECE', include students from both programs
-            if combined_section:
-                key_section1 = (batch, program, 'Section 1')
-                key_section2 = (batch, program, 'Section 2')
-                students_in_batch = batch_students.get(key_section1, []) + batch_students.get(key_section2, [])
-
-            elif combined_program:
-                key_cse = (batch, 'CSE', section)
-                key_ece = (batch, 'ECE', section)
-                students_in_batch = batch_students.get(key_cse, []) + batch_students.get(key_ece, [])
-
-            for student in students_in_batch:
-                for t in time_slots:
-                    if t in student_schedule[student][day]:
-                        penalty += 5  # Reduced from 10
-                        penalty_counters['student_conflicts'] += 1
-                    student_schedule[student][day].add(t)
-
-            # Conflict checking for elective and backlog students
-            # Get the set of students enrolled in this session
-            students_in_course = course_students.get(session_id, set())
-
-            for student in students_in_course:
-                for t in time_slots:
-                    if t in student_schedule[student][day]:
-                        penalty += 5  # Adjusted penalty
-                        penalty_counters['student_conflicts'] += 1
-                    student_schedule[student][day].add(t)
-
-            # For elective and backlog students
-            # for student, student_session_list in student_courses.items():
-            #
-            #     if session_id in student_session_list:
-            #         for t in time_slots:
-            #             if t in student_schedule[student][day]:
-            #                 penalty += 5  # Reduced from 10
-            #                 penalty_counters['student_conflicts'] += 1
-            #             student_schedule[student][day].add(t)
-
-            # Avoid scheduling multiple sessions of the same course on the same day
-            if day in course_days[course_id]:
-                penalty += 1  # Reduced from 2
-                penalty_counters['multiple_sessions_same_day'] += 1
-            course_days[course_id].add(day)
-
-        # Ensure all sessions are scheduled
-        # Missing sessions
-        missing_sessions = len(course_sessions) - len(schedule)
-        if missing_sessions > 0:
-            penalty += missing_sessions * 20  # Reduced from 50
-            penalty_counters['missing_sessions'] += missing_sessions
-
-        # Store penalty breakdown for analysis
-        individual.penalty_counters = penalty_counters
-        return (penalty,)
-
-
-    toolbox.register("evaluate", evaluate)
-    toolbox.register("mate", tools.cxUniform, indpb=0.7)
-    toolbox.register("mutate", tools.mutUniformInt, low=0, up=num_time_slots - 1, indpb=0.2)
-    toolbox.register("select", tools.selTournament, tournsize=3)
-
-    # Genetic Algorithm parameters
-    population_size = 1000
-    num_generations = 100
-    crossover_prob = 0.9
-    mutation_prob = 0.3
-
-    # Create initial population
-    pop = toolbox.population(n=population_size)
-
-    # Statistics
-    stats = tools.Statistics(lambda ind: ind.fitness.values)
-    stats.register("avg", np.mean)
-    stats.register("min", np.min)
-    stats.register("max", np.max)
-
-    # Initialize cumulative penalty counters
-    cumulative_penalties = {
-        'invalid_time_slot': 0,
-        'lab_scheduling': 0,
-        'instructor_conflicts': 0,
-        'room_conflicts': 0,
-        'student_conflicts': 0,
-        'multiple_sessions_same_day': 0,
-        'missing_sessions': 0
+    return {
+        'days': grid.days,
+        'times': grid.periods,
+        'time_grid': grid,
+        'time_slot_indices': grid.slot_indices(),
+        'num_time_slots': grid.num_slots,
+        'course_sessions': course_sessions,
+        'student_courses': student_courses,
+        'course_students': course_students,
+        'batch_students': batch_students,
+        'validation': report.to_dict(),
     }
 
-    # Throughout your code, update the progress dictionary
-    # For example:
-    progress['message'] = 'Initializing genetic algorithm...'
-    progress['percentage'] = 10
-
-    NELITISTS = int(0.05 * population_size)
-    # After each generation, update the progress
-    for gen in range(num_generations):
-        # ... existing code ...
-        offspring = algorithms.varAnd(pop, toolbox, cxpb=crossover_prob, mutpb=mutation_prob)
-        fits = toolbox.map(toolbox.evaluate, offspring)
-        for fit, ind in zip(fits, offspring):
-            ind.fitness.values = fit
-
-        # Combine population and offspring for elitism
-        combined_population = pop + offspring
-        # Evaluate individuals before accessing penalty_counters
-        for ind in combined_population:
-            if not hasattr(ind, 'penalty_counters'):
-                ind.penalty_counters = {}  # Ensure all individuals have the penalty_counters attribute
-
-        # Aggregate penalty data
-        for ind in combined_population:
-            for key in cumulative_penalties.keys():
-                cumulative_penalties[key] += ind.penalty_counters.get(key, 0)
 
-        # Select the next generation population
-        pop = tools.selBest(combined_population, k=population_size - NELITISTS)
-        elite = tools.selBest(combined_population, k=NELITISTS)
-        pop.extend(elite)
+def build_model(problem):
+    # Compiled conflict model: scores whole populations in one batched pass
+    with span('build_model'):
+        return ConflictModel(problem['course_sessions'], problem['batch_students'],
+                             problem['course_students'], problem['time_grid'])
 
 
-        record = stats.compile(pop)
-        print(f"Generation {gen + 1}: {record}")
-        print("Penalty Contributions:")
-        for key, value in cumulative_penalties.items():
-            print(f"  {key}: {value}")
+def compile_problem(instructors_courses_path, backlog_path, elective_path, cache_folder=None, grid=None):
+    # Parsed problem and its compiled model. With a cache_folder, inputs whose
+    # contents were compiled before (on the same time grid) are loaded from
+    # disk instead of re-parsed.
+    grid = grid or TimeGrid.from_config()
 
-        # Reset cumulative penalties for the next generation
-        cumulative_penalties = dict.fromkeys(cumulative_penalties, 0)
+    def compile_inputs():
+        problem = load_problem(instructors_courses_path, backlog_path, elective_path, grid)
+        return problem, build_model(problem)
 
-        # Early stopping if an acceptable solution is found
-        if record['min'] == 0:
-            print("Optimal solution found.")
-            break
+    if cache_folder is None:
+        return compile_inputs()
+    return load_or_compile((instructors_courses_path, backlog_path, elective_path), cache_folder, compile_inputs,
+                           settings=grid.to_config())
 
-        # Update progress
-        progress['message'] = f'Generation {gen + 1} completed.'
-        progress['percentage'] = int(((gen + 1) / num_generations) * 80) + 10  # Adjust percentage calculation as needed
-
-    # Get the best individual
-    best_individual = tools.selBest(pop, k=1)[0]
-
-    print("Best Individual Penalty Breakdown:")
-    for key, value in best_individual.penalty_counters.items():
-        print(f"  {key}: {value}")
 
+def build_timetables(problem, best_individual):
+    # Assemble per-batch, per-instructor and per-student session lists from
+    # the best individual's slot assignment. Student timetables cover both
+    # backlog/elective and regular batch students.
+    grid = problem['time_grid']
+    num_time_slots = problem['num_time_slots']
+    course_sessions = problem['course_sessions']
+    student_courses = problem['student_courses']
+    batch_students = problem['batch_students']
 
     best_schedule = {}
 
-    for idx, session in enumerate(course_sessions):
-        session_id = session['session_id']
+    session_id_column = course_sessions.column('session_id')
+    durations = course_sessions.duration.tolist()
+    for idx, session_id in enumerate(session_id_column):
         if idx >= len(best_individual):
             continue
         time_slot_idx = best_individual[idx]
         if time_slot_idx >= num_time_slots:
             continue
-        time_slot = time_slot_indices[time_slot_idx]
-        day, time = time_slot
-        duration = session['duration']
-        if session['is_lab']:
-            time_slots = [time, '16:00']
-        else:
-            time_slots = [time]
+        block = grid.block(time_slot_idx, durations[idx])
+        day = grid.slots[time_slot_idx][0]
+        time_slots = [grid.slots[slot][1] for slot in block]
         best_schedule[session_id] = (day, time_slots)
 
+    # Inverted index: session_id -> backlog/elective students taking it, in
+    # student_courses order
+    enrolled_students = defaultdict(list)
+    for student, session_ids in student_courses.items():
+        for session_id in session_ids:
+            enrolled_students[session_id].append(student)
+
     # Generate timetables
-    # Timetables for batches, instructors, and now students
+    # Timetables for batches, instructors, and students. Every session is
+    # visited once and handed to exactly the students attending it, so the
+    # cost is linear in the number of enrollments.
     batch_timetables = defaultdict(list)
     instructor_timetables = defaultdict(list)
     student_timetables = defaultdict(list)
+    regular_student_timetables = defaultdict(list)
 
-    for session in course_sessions:
-        session_id = session['session_id']
+    for session, session_id in zip(course_sessions, session_id_column):
         if session_id in best_schedule:
             day, time_slots = best_schedule[session_id]
-            course = session
-            batch = course['batch']
-            program = course['program']
-            section = course['section']
-            key = (batch, program, section)
+            course_id = session.course_id
+            course_name = session.name
+            instructor = session.instructor
+            room = session.room
+            key = (session.batch, session.program, session.section)
             # Add to batch timetables
             batch_timetables[key].append({
-                'course_id': session['course_id'],
+                'course_id': course_id,
                 'session_id': session_id,
-                'course_name': course['name'],
-                'instructor': course['instructor'],
+                'course_name': course_name,
+                'instructor': instructor,
                 'day': day,
                 'times': time_slots,
-                'room': course['room']
+                'room': room
             })
             # Add to instructor timetables
-            instructor = course['instructor']
             instructor_timetables[instructor].append({
-                'course_id': session['course_id'],
+                'course_id': course_id,
                 'session_id': session_id,
-                'course_name': course['name'],
-                'batch': course['batch'],
-                'program': course['program'],
-                'section': course['section'],
+                'course_name': course_name,
+                'batch': session.batch,
+                'program': session.program,
+                'section': session.section,
                 'day': day,
                 'times': time_slots,
-                'room': course['room']
+                'room': room
             })
-            # Add to student timetables (for elective and backlog students)
-            for student, student_session_list in student_courses.items():
-                if session_id in student_session_list:
-                    student_timetables[student].append({
-                        'course_id': session['course_id'],
-                        'session_id': session_id,
-                        'course_name': course['name'],
-                        'instructor': course['instructor'],
-                        'day': day,
-                        'times': time_slots,
-                        'room': course['room']
-                    })
-
-
-    # After completion
-    progress['message'] = 'Writing timetables to Excel files...'
-    progress['percentage'] = 95
-
-    # Write timetables to Excel files in the output_folder
-    # Adjust your code to save files in the specified output_folder
-    # Function to create a timetable grid
-    def create_timetable(schedule_entries):
-        df = pd.DataFrame('', index=times, columns=days)
-        for entry in schedule_entries:
-            day = entry['day']
-            for time in entry['times']:
-                content = f"{entry['course_id']}\n{entry['course_name']}\n{entry['room']}"
-                existing = df.at[time, day]
-                if existing:
-                    df.at[time, day] = existing + "\n" + content
-                else:
-                    df.at[time, day] = content
-        # Apply text wrapping
-        df = df.apply(lambda col: col.apply(lambda x: "\n".join(textwrap.wrap(x, width=30)) if x else x))
-        return df
-    # Example:
-    batch_timetable_path = os.path.join(output_folder, 'Batch_Timetables.xlsx')
-    instructor_timetable_path = os.path.join(output_folder, 'Instructor_Timetables.xlsx')
-    student_timetable_path = os.path.join(output_folder, 'Elective_Backlog_Timetables.xlsx')
-
-
-    # Write timetables to Excel files
-    with pd.ExcelWriter(batch_timetable_path, engine='xlsxwriter') as writer:
-        for key, schedule in batch_timetables.items():
-            batch, program, section = key
-            section_str = f"_Section_{section}" if section else ""
-            sheet_name = f"{batch}_{program}{section_str}"
-            sheet_name = sheet_name[:31]  # Sheet names can't be longer than 31 characters
-            df = create_timetable(schedule)
-            df.to_excel(writer, sheet_name=sheet_name)
-            # Get the xlsxwriter workbook and worksheet objects.
-            workbook  = writer.book
-            worksheet = writer.sheets[sheet_name]
-            # Adjust the column widths.
-            worksheet.set_column('A:H', 20)
-            # Set the format for wrapping text.
-            wrap_format = workbook.add_format({'text_wrap': True, 'align': 'center', 'valign': 'vcenter'})
-            worksheet.set_column('A:H', 20, wrap_format)
-            worksheet.set_row(0, None, wrap_format)
-            for idx in range(len(df)):
-                worksheet.set_row(idx + 1, 60, wrap_format)  # Adjust row height
-
-    with pd.ExcelWriter(instructor_timetable_path, engine='xlsxwriter') as writer:
-        for instructor, schedule in instructor_timetables.items():
-            sheet_name = instructor[:31]  # Sheet names can't be longer than 31 characters
-            df = create_timetable(schedule)
-            df.to_excel(writer, sheet_name=sheet_name)
-            # Get the xlsxwriter workbook and worksheet objects.
-            workbook  = writer.book
-            worksheet = writer.sheets[sheet_name]
-            # Adjust the column widths.
-            worksheet.set_column('A:H', 20)
-            # Set the format for wrapping text.
-            wrap_format = workbook.add_format({'text_wrap': True, 'align': 'center', 'valign': 'vcenter'})
-            worksheet.set_column('A:H', 20, wrap_format)
-            worksheet.set_row(0, None, wrap_format)
-            for idx in range(len(df)):
-                worksheet.set_row(idx + 1, 60, wrap_format)  # Adjust row height
-
-    # Write timetables for elective and backlog students
-    with pd.ExcelWriter(student_timetable_path, engine='xlsxwriter') as writer:
-        for student, schedule in student_timetables.items():
-            sheet_name = student[:31]  # Sheet names can't be longer than 31 characters
-            # Ensure sheet names are unique
-            if sheet_name in writer.sheets:
-                sheet_name = f"{sheet_name}_{random.randint(0, 9999)}"
-            df = create_timetable(schedule)
-            df.to_excel(writer, sheet_name=sheet_name)
-            # Get the xlsxwriter workbook and worksheet objects.
-            workbook  = writer.book
-            worksheet = writer.sheets[sheet_name]
-            # Adjust the column widths.
-            worksheet.set_column('A:H', 20)
-            # Set the format for wrapping text.
-            wrap_format = workbook.add_format({'text_wrap': True, 'align': 'center', 'valign': 'vcenter'})
-            worksheet.set_column('A:H', 20, wrap_format)
-            worksheet.set_row(0, None, wrap_format)
-            for idx in range(len(df)):
-                worksheet.set_row(idx + 1, 60, wrap_format)  # Adjust row height
-
-    print("Timetables have been written to 'Batch_Timetables.xlsx', 'Instructor_Timetables.xlsx', and 'Elective_Backlog_Timetables.xlsx'.")
-
-    progress['message'] = 'Timetable generation completed.'
-    progress['percentage'] = 100
+            # Add to student timetables: one shared (read-only) entry for
+            # the enrolled backlog/elective students and the regular students
+            # of the batch (or batches, for combined classes)
+            student_entry = {
+                'course_id': course_id,
+                'session_id': session_id,
+                'course_name': course_name,
+                'instructor': instructor,
+                'day': day,
+                'times': time_slots,
+                'room': room
+            }
+            for student in enrolled_students.get(session_id, ()):
+                student_timetables[student].append(student_entry)
+            for student in session_students(session, batch_students, {}):
+                regular_student_timetables[student].append(student_entry)
+
+    # Backlog/elective students first, then regular students (the two sets
+    # are disjoint: load_problem keeps enrolled students out of the batches)
+    student_timetables.update(regular_student_timetables)
+
+    return batch_timetables, instructor_timetables, student_timetables
+
+
+def timetable_grid(schedule_entries, days, times):
+    # Times x days DataFrame of wrapped cell texts for one timetable, the
+    # same cells the Excel export writes
+    return pd.DataFrame(timetable_cells(schedule_entries, days, times), index=times, columns=days)
+
+
+def write_timetables(batch_timetables, instructor_timetables, student_timetables, days, times, output_folder,
+                     formats=('xlsx',)):
+    # Write timetables to files in the output_folder: the three Excel
+    # workbooks and, on request, flat CSV/JSON exports
+    paths = export_timetables(batch_timetables, instructor_timetables, student_timetables, days, times,
+                              output_folder, formats)
+    print(f"Timetables have been written to {', '.join(repr(os.path.basename(path)) for path in paths)}.")
+
+
+def generate_timetables(instructors_courses_path, backlog_path, elective_path, output_folder, progress,
+                        evaluation='batch', workers=1, islands=1, reserved_slots=None,
+                        solver='ga', time_limit=None, cache_folder=None, cancel_event=None, events=None,
+                        export_formats=('xlsx',), warm_start=None, checkpoint_path=None, resume=False,
+                        ga_options=None, metrics=None, profile_path=None, reschedule=False, blackouts=None,
+                        room_allocation=False, rooms_path=None, time_grid_path=None):
+    # warm_start: best_schedule.json of an earlier run to start from; its
+    # sessions are matched by session_id, so it may come from slightly
+    # different inputs. checkpoint_path/resume: GA checkpoints (see ga.run_ga).
+    # ga_options: GA run configuration (see solvers.GASolver), e.g.
+    # {'population_size': 400, 'stagnation_generations': 30, 'adaptive': False}
+    # Timings and counters go to metrics (a fresh Metrics by default) and are
+    # written to metrics.json in output_folder, also when the run fails or is
+    # cancelled. profile_path: cProfile the run into this file.
+    # reschedule=True keeps the warm_start schedule wherever it still fits and
+    # only moves what the changes require (see reschedule.RescheduleSolver),
+    # instead of running solver; blackouts: (instructor, day, time) hours
+    # the rescheduled timetable must keep free for that instructor.
+    # room_allocation=True leaves rooms out of the search and assigns them
+    # afterwards (see rooms.allocate_rooms) from the rooms_path list (Room,
+    # Capacity, Type), or from the rooms the course CSV names without one.
+    # time_grid_path: JSON time-grid config (see timegrid.DEFAULT_GRID) for
+    # other days, periods, breaks, reserved slots or session durations.
+    if reschedule and warm_start is None:
+        raise ValueError("Rescheduling needs the earlier schedule (warm_start).")
+    metrics = metrics or Metrics()
+    with recording(metrics), profiling(profile_path):
+        try:
+            with span('compile_problem'):
+                problem, conflict_model = compile_problem(instructors_courses_path, backlog_path, elective_path,
+                                                          cache_folder, TimeGrid.load(time_grid_path))
+            # Input warnings (errors already stopped the run in compile_problem)
+            warnings = ValidationReport.from_dict(problem['validation']).warnings
+            for sheet, message in warnings:
+                print(f"Warning: {sheet}: {message}")
+            set_value('input_warnings', len(warnings))
+            days = problem['days']
+            times = problem['times']
+            search_model = conflict_model.without_rooms() if room_allocation else conflict_model
+
+            # Every backend searches the same model; the GA takes extra tuning options.
+            # reserved_slots: (day, time) pairs no session may use, e.g. [('Monday', '9:00'), ('Friday', '9:00')]
+            solver_options = {'reserved_slots': reserved_slots, 'time_limit': time_limit,
+                              'cancel_event': cancel_event, 'events': events}
+            if warm_start is not None:
+                solver_options['warm_start'] = remap_schedule(load_schedule(warm_start), problem)
+            if reschedule:
+                previous = solver_options.pop('warm_start')
+                search = RescheduleSolver(search_model, previous, blocked_slots(problem, blackouts or ()),
+                                          **solver_options)
+                # Blackouts that leave a session no start at all cannot be kept
+                unblockable = search.domains.unblockable
+                session_ids = problem['course_sessions'].column('session_id')
+                for session in unblockable:
+                    print(f"Warning: blackouts leave {session_ids[session]} no time slot; "
+                          "they are ignored for it.")
+                set_value('blackouts_ignored', len(unblockable))
+            else:
+                if solver == 'ga':
+                    solver_options.update(evaluation=evaluation, workers=workers, islands=islands,
+                                          checkpoint_path=checkpoint_path, resume=resume, **(ga_options or {}))
+                search = make_solver(solver, search_model, **solver_options)
+            with span('solve'):
+                best_individual = search.solve(progress)
+            if cancel_event is not None and cancel_event.is_set():
+                return
+            if reschedule:
+                print(f"Rescheduled {len(search.affected)} affected sessions, moving {len(best_individual.moved)} "
+                      f"of {len(previous)} previously placed.")
+                set_value('affected_sessions', len(search.affected))
+                set_value('moved_sessions', len(best_individual.moved))
+            if room_allocation:
+                with span('room_allocation'):
+                    inventory = (RoomInventory.from_csv(rooms_path) if rooms_path
+                                 else RoomInventory.from_sessions(problem['course_sessions']))
+                    room_labels, unplaced = allocate_rooms(conflict_model, problem['course_sessions'],
+                                                           best_individual, inventory)
+                    problem = dict(problem, course_sessions=problem['course_sessions'].with_column('room',
+                                                                                                 room_labels))
+                    # Score again with the allocated rooms
+                    best_individual.fitness.values = build_model(problem).evaluate(best_individual)
+                print(f"Allocated rooms from {len(inventory)} rooms; {len(unplaced)} sessions found no free room "
+                      f"and keep their requested one.")
+                set_value('rooms_unplaced', len(unplaced))
+
+            print("Best Individual Penalty Breakdown:")
+            set_value('best_penalty', int(best_individual.fitness.values[0]))
+            for key, value in best_individual.penalty_counters.items():
+                print(f"  {key}: {value}")
+                set_value(f'penalty_{key}', int(value))
+
+            with span('build_timetables'):
+                batch_timetables, instructor_timetables, student_timetables = build_timetables(problem,
+                                                                                               best_individual)
+
+            # After completion
+            progress['message'] = 'Writing timetables to Excel files...'
+            progress['percentage'] = 95
+
+            with span('export'):
+                write_timetables(batch_timetables, instructor_timetables, student_timetables, days, times,
+                                 output_folder, export_formats)
+            # Slot per session_id, for warm-starting later runs
+            save_schedule(os.path.join(output_folder, SCHEDULE_FILE), problem, best_individual)
+            # Structured copy the web views query instead of the workbooks
+            with span('write_results'):
+                write_results(os.path.join(output_folder, RESULTS_FILENAME), batch_timetables,
+                              instructor_timetables, student_timetables, days, times)
+
+            progress['message'] = 'Timetable generation completed.'
+            progress['percentage'] = 100
+        finally:
+            metrics.write(os.path.join(output_folder, METRICS_FILE))